@@ -0,0 +1,161 @@
+"""Throughput benchmark of the frame decoding hot path.
+
+Run from the repository root:
+
+    python benchmarks/bench_decoders.py [--output results.json] [--compare baseline.json]
+
+Times decode_packet, the decoder of every (protocol, infoType) pair in the
+registry, every infoType decoder and packet_events, on a synthetic corpus
+covering every protocol and infotype (rflib.rfpcorpus). Reports frames/s,
+us/frame and, from tracemalloc, peak bytes allocated per frame and blocks
+still held by each frame's result.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "custom_components", "rfplayer")
+)
+
+from rflib.infotypes import INFOTYPE_DECODERS  # noqa: E402
+from rflib.rfpcorpus import synthetic_corpus  # noqa: E402
+from rflib.rfpparser import (  # noqa: E402
+    PacketHeader,
+    decode_packet,
+    json_backend,
+    load_json,
+    packet_events,
+)
+from rflib.rfpregistry import DECODERS  # noqa: E402
+
+MIN_TIME = 0.2
+
+
+def measure(func, inputs):
+    """Return timing and allocation figures of func over inputs."""
+
+    def run():
+        for args in inputs:
+            func(*args)
+
+    number = 1
+    while timeit.timeit(run, number=number) < MIN_TIME:
+        number *= 2
+    seconds = min(timeit.repeat(run, number=number, repeat=3)) / number
+    frames = len(inputs)
+
+    tracemalloc.start()
+    peak = 0
+    for args in inputs:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func(*args)
+        peak += tracemalloc.get_traced_memory()[1] - base
+    before = tracemalloc.take_snapshot()
+    kept = [func(*args) for args in inputs]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del kept
+
+    return {
+        "frames": frames,
+        "frames_per_second": frames / seconds,
+        "us_per_frame": seconds / frames * 1e6,
+        "peak_bytes_per_frame": peak / frames,
+        "blocks_per_frame": blocks / frames,
+    }
+
+
+def benchmarks(corpus):
+    """Yield (name, func, inputs) of every benchmark."""
+    node = PacketHeader.gateway.name
+    raw = [(frame,) for _, _, frame in corpus]
+    yield "decode_packet", decode_packet, raw
+
+    messages = {}
+    for protocol, info_type, frame in corpus:
+        messages.setdefault((protocol, info_type), []).append(
+            load_json(frame, 5)["frame"]
+        )
+    for (protocol, info_type), frames in sorted(messages.items()):
+        decoder = DECODERS.lookup(protocol, info_type)
+        yield (
+            f"protocol {protocol} infoType {info_type}",
+            decoder,
+            [(message, node) for message in frames],
+        )
+
+    infos = {}
+    for (_, info_type), frames in messages.items():
+        infos.setdefault(info_type, []).extend(message["infos"] for message in frames)
+    for info_type, frames in sorted(infos.items(), key=lambda item: int(item[0])):
+        yield (
+            f"infoType {info_type}",
+            INFOTYPE_DECODERS[info_type],
+            [(frame,) for frame in frames],
+        )
+
+    packets = [
+        (packet,) for (frame,) in raw for packet in decode_packet(frame) if packet
+    ]
+    yield "packet_events", lambda packet: list(packet_events(packet)), packets
+
+
+def compare(results, baseline):
+    """Print the throughput ratio of results against a saved run."""
+    previous = baseline["results"]
+    for name, figures in results.items():
+        if name in previous:
+            ratio = figures["frames_per_second"] / previous[name]["frames_per_second"]
+            print(f"{name:<32} x{ratio:5.2f}")
+
+
+def main():
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--devices", type=int, default=8, help="frames per infoType")
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    corpus = synthetic_corpus(args.devices)
+    results = {}
+    print(f"{'benchmark':<32} {'frames/s':>10} {'us/frame':>9} {'peak B':>8} {'blocks':>7}")
+    for name, func, inputs in benchmarks(corpus):
+        figures = results[name] = measure(func, inputs)
+        print(
+            f"{name:<32} {figures['frames_per_second']:10.0f}"
+            f" {figures['us_per_frame']:9.2f} {figures['peak_bytes_per_frame']:8.0f}"
+            f" {figures['blocks_per_frame']:7.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "json_backend": json_backend,
+                    "corpus_frames": len(corpus),
+                    "results": results,
+                },
+                output,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Micro-benchmark of packet_events, dict events versus slotted events.
+
+Run from the repository root:
+
+    python benchmarks/bench_packet_events.py
+
+Compares the former implementation (field_abbrev rebuilt on each call, one
+dict per event) with rflib.rfpparser.packet_events on a decoded Oregon
+temperature/hygrometry packet.
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "custom_components", "rfplayer")
+)
+
+from rflib.rfpparser import (  # noqa: E402
+    PACKET_FIELDS,
+    PACKET_ID_SEP,
+    decode_packet,
+    packet_events,
+    serialize_packet_id,
+)
+
+FRAME = (
+    'ZIA33{ "frame" :{"header": {"frameType": "0", "cluster": "0", "dataFlag": "0",'
+    ' "rfLevel": "-91", "floorNoise": "-107", "rfQuality": "4", "protocol": "5",'
+    ' "protocolMeaning": "OREGON", "infoType": "4", "frequency": "433920"},'
+    '"infos": {"subType": "0", "id_PHY": "0x1A2D", "id_PHYMeaning": "THGR122/228/238/268",'
+    ' "adr_channel": "22274",  "adr": "87",  "channel": "2",  "qualifier": "33",'
+    '  "lowBatt": "1", "measures" : [{"type" : "temperature", "value" : "+21.3",'
+    ' "unit" : "Celsius"}, {"type" : "hygrometry", "value" : "58", "unit" : "%"}]}}}'
+)
+
+ROUNDS = 20000
+
+
+def legacy_packet_events(packet):
+    """packet_events as it was before the slotted events."""
+    platform = None
+    field_abbrev = {
+        v: k
+        for k, v in sorted(
+            PACKET_FIELDS.items(), key=lambda x: (x[1], x[0]), reverse=True
+        )
+    }
+    packet_id = serialize_packet_id(packet)
+    events = {f: v for f, v in packet.items() if f in field_abbrev}
+    forceid = None
+    for f, v in packet.items():
+        if f == "platform":
+            platform = v
+        if f == "protocol":
+            protocol = v
+        if f == "forceid":
+            forceid = v
+    for sensor, value in events.items():
+        unit = packet.get(sensor + "_unit", None)
+        if forceid is None:
+            id = packet_id + field_abbrev[sensor] + PACKET_ID_SEP + field_abbrev[sensor]
+        else:
+            id = forceid
+        yield {
+            "id": id,
+            sensor: value,
+            "value": value,
+            "unit": unit,
+            "platform": platform,
+            "protocol": protocol,
+        }
+
+
+def measure(name, events_func, packet):
+    """Print time and memory per packet for one implementation."""
+    seconds = timeit.timeit(lambda: list(events_func(packet)), number=ROUNDS)
+
+    tracemalloc.start()
+    kept = [list(events_func(packet)) for _ in range(1000)]
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    events = len(kept[0])
+    del kept
+
+    print(
+        f"{name:<8} {seconds / ROUNDS * 1e6:8.2f} us/packet"
+        f" {retained / 1000:8.0f} B retained/packet"
+        f" {retained / 1000 / events:6.0f} B/event ({events} events)"
+    )
+
+
+def main():
+    """Run the benchmark."""
+    packet = decode_packet(FRAME)[0]
+    measure("before", legacy_packet_events, packet)
+    measure("after", packet_events, packet)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 """Support for Rfplayer devices."""
 import asyncio
 from collections import defaultdict
-import copy
+from datetime import timedelta
+from functools import partial
 import logging
+import os
+import time
 import async_timeout
 from serial import SerialException
 from homeassistant.util import slugify
@@ -14,7 +17,6 @@ from homeassistant.const import (
     CONF_COMMAND,
     CONF_DEVICE,
     CONF_DEVICE_ID,
-    CONF_DEVICES,
     CONF_PROTOCOL,
     EVENT_HOMEASSISTANT_STOP,
 )
@@ -29,13 +31,25 @@ from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.restore_state import RestoreEntity
 
 from .const import (
+    CAPTURE_DIRECTORY,
+    CONF_ADDITIONAL_DEVICES,
     CONF_AUTOMATIC_ADD,
+    CONF_CAPTURE,
+    CONF_DECODE_CACHE,
     CONF_DEVICE_ADDRESS,
+    CONF_FRAME_FORMAT,
+    CONF_LATENCY_TRACING,
     CONF_RECONNECT_INTERVAL,
+    CONF_REPEAT_WINDOW,
+    CONF_TRACE_SAMPLING,
     CONF_ENTITY_TYPE,
     CONF_ID,
     CONNECTION_TIMEOUT,
+    DEFAULT_REPEAT_WINDOW,
+    DEFAULT_TRACE_SAMPLING,
+    DATA_CAPTURES,
     DATA_DEVICE_REGISTER,
+    DATA_DEVICE_STORE,
     DATA_ENTITY_LOOKUP,
     DOMAIN,
     EVENT_BUTTON_PRESSED,
@@ -53,7 +67,16 @@ from .const import (
     SIGNAL_HANDLE_EVENT,
     TEST_FRAME,
 )
-from .rflib.rfpprotocol import create_rfplayer_connection
+from .rflib.rfpcapture import CODEC_ZLIB, FrameRecorder
+from .rflib.rfpcommand import PRIORITY_INTERACTIVE
+from .rflib.rfperrors import ERRORS
+from .rflib.rfplog import TRACE
+from .rflib.rfpmetrics import METRICS
+from .rflib.rfpmulti import ReceiverGroup
+from .rflib.rfpparser import DECODE_CACHE_SIZE, KnownDevices, event_frame_id
+from .rflib.rfpprotocol import DEFAULT_FRAME_FORMAT, create_rfplayer_connection
+from .rflib.rfptrace import TRACER
+from .store import RfplayerDeviceStore
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -78,6 +101,51 @@ TEST_FRAME_SCHEMA = vol.Schema(
 TMP_ENTITY = "tmp.{}"
 
 
+def device_frame_id(device):
+    """Return the frame id (protocol_id) of a configured device.
+
+    Async friendly.
+    """
+    device_id = device.get(CONF_DEVICE_ID) or device.get(CONF_DEVICE_ADDRESS)
+    if device_id and device.get(CONF_PROTOCOL):
+        return f"{device[CONF_PROTOCOL]}_{device_id}"
+    return event_frame_id(device)
+
+
+def command_priority(context):
+    """Return the priority of a command triggered in context.
+
+    Commands a user triggered (dashboard, developer tools) are interactive,
+    others get the default priority of their protocol.
+
+    Async friendly.
+    """
+    if context is not None and context.user_id is not None:
+        return PRIORITY_INTERACTIVE
+    return None
+
+
+def open_captures(directory, ports):
+    """Return a frame recorder writing under directory for each gateway port.
+
+    Opens files, run it in an executor.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return {
+        port: FrameRecorder(os.path.join(directory, slugify(port)), CODEC_ZLIB)
+        for port in ports
+    }
+
+
+def close_captures(recorders):
+    """Write pending frames and close the recorders.
+
+    Waits for the writer threads, run it in an executor.
+    """
+    for recorder in recorders.values():
+        recorder.close()
+
+
 def identify_event_type(event):
     """Look at event to determine type of device.
     
@@ -96,16 +164,17 @@ async def async_setup_entry(hass, entry):
 
     async def async_send_command(call):
         """Send Rfplayer command."""
-        _LOGGER.debug("Rfplayer send command for %s", str(call.data))
+        _LOGGER.debug("Rfplayer send command for %s", call.data)
         if not await hass.data[DOMAIN][RFPLAYER_PROTOCOL].send_command_ack(
             call.data[CONF_PROTOCOL],
             call.data[CONF_COMMAND],
             device_address=call.data.get(CONF_DEVICE_ADDRESS),
             device_id=call.data.get(CONF_DEVICE_ID),
+            priority=command_priority(call.context),
         ):
             _LOGGER.error("Failed Rfplayer command")
         if call.data[CONF_AUTOMATIC_ADD] is True:
-            _LOGGER.debug("Add device for %s", str(call.data))
+            _LOGGER.debug("Add device for %s", call.data)
             event_id = "_".join(
                 [
                     call.data[CONF_PROTOCOL],
@@ -136,7 +205,10 @@ async def async_setup_entry(hass, entry):
                 await hass.data[DOMAIN][DATA_DEVICE_REGISTER][EVENT_KEY_COMMAND](device)
             
             
-            _add_device_to_base_config(device, event_id)
+            device_store.async_add(event_id, device)
+            known_devices = hass.data[DOMAIN][RFPLAYER_PROTOCOL].known_devices
+            if known_devices is not None:
+                known_devices.add(device_frame_id(device))
     
     async def async_test_frame(call):
         """Test Rfplayer frame."""
@@ -166,7 +238,7 @@ async def async_setup_entry(hass, entry):
 
         ## Don't propagate non entity events (eg: version string, ack response)
         if event_type not in hass.data[DOMAIN][DATA_ENTITY_LOOKUP]:
-            _LOGGER.debug("unhandled event of type: %s", event_type)
+            TRACE.debug(_LOGGER, "unhandled event of type: %s", event_type)
             return
 
         ## Lookup entities who registered this device id as device id or alias
@@ -180,58 +252,62 @@ async def async_setup_entry(hass, entry):
         if entity_id:
            # # Propagate event to every entity matching the device id
            # #_LOGGER.debug("passing event to %s", entity_id)
+            started = time.monotonic_ns()
             async_dispatcher_send(
                 hass, SIGNAL_HANDLE_EVENT.format(entity_id), event)
+            if TRACER.enabled:
+                TRACER.record("dispatch", started)
         else:
             ## If device is not yet known, register with platform (if loaded)
             if event_type in hass.data[DOMAIN][DATA_DEVICE_REGISTER]:
                 
-                _LOGGER.debug("device_id not known, adding new device")
-                _LOGGER.debug("event_type: %s",str(event_type))
-                _LOGGER.debug("event_id: %s",str(event_id))
-                _LOGGER.debug("event: %s",str(event))
-                _LOGGER.debug("device_id not known, adding new device")
-                _LOGGER.debug(str(hass.data[DOMAIN][DATA_DEVICE_REGISTER]))
-                _LOGGER.debug(str(hass.data[DOMAIN][DATA_DEVICE_REGISTER][event_type]))
+                _LOGGER.debug(
+                    "device_id not known, adding new device %s of type %s: %s",
+                    event_id,
+                    event_type,
+                    event,
+                )
                 
                 hass.data[DOMAIN][DATA_ENTITY_LOOKUP][event_type][event_id] = event
-                _add_device_to_base_config(event, event_id)
+                device_store.async_add(event_id, event)
                 hass.async_create_task(
                     hass.data[DOMAIN][DATA_DEVICE_REGISTER][event_type](event)
                 )
             else:
-                _LOGGER.debug("device_id not known and automatic add disabled")
-
-    @callback
-    def _add_device_to_base_config(event, event_id):
-        """Add a device to config entry."""
-        data = entry.data.copy()
-        data[CONF_DEVICES] = copy.deepcopy(entry.data[CONF_DEVICES])
-        data[CONF_DEVICES][event_id] = event
-        hass.config_entries.async_update_entry(entry=entry, data=data)
+                TRACE.debug(
+                    _LOGGER, "device_id %s not known and automatic add disabled", event_id
+                )
+                METRICS.unknown_device_events += 1
 
     @callback
-    def reconnect(exc=None):
+    def reconnect(port, exc=None):
         """Schedule reconnect after connection has been unexpectedly lost."""
         ## Reset protocol binding before starting reconnect
-        hass.data[DOMAIN][RFPLAYER_PROTOCOL] = None
+        group.remove(port)
+        METRICS.reconnects += 1
 
-        async_dispatcher_send(hass, SIGNAL_AVAILABILITY, False)
+        if not group:
+            async_dispatcher_send(hass, SIGNAL_AVAILABILITY, False)
 
-        ## If HA is not stopping, initiate new connection
-        if hass.state != CoreState.stopping:
-            _LOGGER.warning("Disconnected from Rfplayer, reconnecting")
-            hass.async_create_task(connect())
+        ## If HA is not stopping and the entry is loaded, initiate new connection
+        if hass.state != CoreState.stopping and DOMAIN in hass.data:
+            _LOGGER.warning("Disconnected from Rfplayer %s, reconnecting", port)
+            hass.async_create_task(connect(port))
 
-    async def connect():
+    async def connect(port):
         """Set up connection and hook it into HA for reconnect/shutdown."""
-        _LOGGER.info("Initiating Rfplayer connection")
+        _LOGGER.info("Initiating Rfplayer connection to %s", port)
+        frame_format = config.get(CONF_FRAME_FORMAT, DEFAULT_FRAME_FORMAT)
         connection = create_rfplayer_connection(
-            port=config[CONF_DEVICE],
+            port=port,
             event_callback=event_callback,
-            disconnect_callback=reconnect,
+            disconnect_callback=partial(reconnect, port),
             loop=hass.loop,
-            init_options={'START_COMMANDS':["1 FORMAT JSON . RECEIVER + *. SENSITIVITY L 0. SENSITIVITY H 0. SELECTIVITY L 0. SELECTIVITY H 0. RFLINK 1. RFLINKTRIGGER L 0. RFLINKTRIGGER H 0. LBT 16. STATUS"]
+            frame_format=frame_format,
+            recorder=recorders.get(port),
+            repeat_window=repeat_window,
+            decode_cache_size=DECODE_CACHE_SIZE if options.get(CONF_DECODE_CACHE) else 0,
+            init_options={'START_COMMANDS':["1 FORMAT " + frame_format + " . RECEIVER + *. SENSITIVITY L 0. SENSITIVITY H 0. SELECTIVITY L 0. SELECTIVITY H 0. RFLINK 1. RFLINKTRIGGER L 0. RFLINKTRIGGER H 0. LBT 16. STATUS"]
             },
         )
 
@@ -246,41 +322,86 @@ async def async_setup_entry(hass, entry):
         ) as exc:
             reconnect_interval = config[CONF_RECONNECT_INTERVAL]
             _LOGGER.exception(
-                "Error connecting to Rfplayer, reconnecting in %s", reconnect_interval
+                "Error connecting to Rfplayer %s, reconnecting in %s", port, reconnect_interval
             )
             ## Connection to Rfplayer device is lost, make entities unavailable
-            async_dispatcher_send(hass, SIGNAL_AVAILABILITY, False)
+            if not group:
+                async_dispatcher_send(hass, SIGNAL_AVAILABILITY, False)
 
-            hass.loop.call_later(reconnect_interval, reconnect, exc)
+            hass.loop.call_later(reconnect_interval, reconnect, port, exc)
             return
 
         # # There is a valid connection to a Rfplayer device now so
         # # mark entities as available
+        group.add(port, protocol)
         async_dispatcher_send(hass, SIGNAL_AVAILABILITY, True)
 
-        hass.data[DOMAIN] = {
-            RFPLAYER_PROTOCOL: protocol,
-            CONF_DEVICE: config[CONF_DEVICE],
-            DATA_ENTITY_LOOKUP: {
-                EVENT_KEY_COMMAND: defaultdict(list),
-                EVENT_KEY_SENSOR: defaultdict(list),
-                EVENT_KEY_COVER: defaultdict(list),
-            },
-            DATA_DEVICE_REGISTER: {},
-        }
-
-        if options.get(CONF_AUTOMATIC_ADD, config[CONF_AUTOMATIC_ADD]) is True:
-            for device_type in "sensor", "command", "cover":
-                hass.data[DOMAIN][DATA_DEVICE_REGISTER][device_type] = {}
-
         # # handle shutdown of Rfplayer asyncio transport
         hass.bus.async_listen_once(
             EVENT_HOMEASSISTANT_STOP, lambda x: transport.close()
         )
 
-        _LOGGER.info("Connected to Rfplayer")
+        _LOGGER.info("Connected to Rfplayer %s", port)
+
+    ## Debug records of the receive path: one frame in N per protocol
+    TRACE.sample_every = options.get(CONF_TRACE_SAMPLING, DEFAULT_TRACE_SAMPLING)
+
+    ## Latency histograms of the receive pipeline, off unless enabled
+    TRACER.enabled = options.get(CONF_LATENCY_TRACING, False)
+
+    ## Summary of repeated decoding errors, even when they stop coming
+    ERRORS.start(hass.loop)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, lambda event: ERRORS.stop())
+
+    ## All gateways feed one event pipeline, commands go to the best one
+    repeat_window = timedelta(
+        milliseconds=options.get(CONF_REPEAT_WINDOW, DEFAULT_REPEAT_WINDOW)
+    )
+    group = ReceiverGroup(hass.loop, repeat_window=repeat_window)
+    METRICS.register_gauge("command_queue_depth", lambda: group.command_queue_depth)
+    METRICS.register_gauge("connected_receivers", lambda: len(group))
+
+    ## Devices added automatically or by send_command are saved apart
+    device_store = RfplayerDeviceStore(hass, entry)
+    await device_store.async_load()
+
+    ## Raw frames of every gateway, recorded by writer threads
+    ports = [config[CONF_DEVICE], *config.get(CONF_ADDITIONAL_DEVICES, [])]
+    recorders = {}
+    if options.get(CONF_CAPTURE, False):
+        recorders = await hass.async_add_executor_job(
+            open_captures, hass.config.path(CAPTURE_DIRECTORY), ports
+        )
+
+        async def async_close_captures(event):
+            await hass.async_add_executor_job(close_captures, recorders)
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_captures)
+
+    hass.data[DOMAIN] = {
+        RFPLAYER_PROTOCOL: group,
+        CONF_DEVICE: config[CONF_DEVICE],
+        DATA_DEVICE_STORE: device_store,
+        DATA_CAPTURES: recorders,
+        DATA_ENTITY_LOOKUP: {
+            EVENT_KEY_COMMAND: defaultdict(list),
+            EVENT_KEY_SENSOR: defaultdict(list),
+            EVENT_KEY_COVER: defaultdict(list),
+        },
+        DATA_DEVICE_REGISTER: {},
+    }
+
+    if options.get(CONF_AUTOMATIC_ADD, config[CONF_AUTOMATIC_ADD]) is True:
+        for device_type in "sensor", "command", "cover":
+            hass.data[DOMAIN][DATA_DEVICE_REGISTER][device_type] = {}
+    else:
+        ## Only known devices: drop other frames before decoding them
+        group.known_devices = KnownDevices(
+            filter(None, map(device_frame_id, device_store.devices.values()))
+        )
 
-    hass.async_create_task(connect())
+    for port in ports:
+        hass.async_create_task(connect(port))
 
     async_dispatcher_connect(hass, SIGNAL_EVENT, event_callback)
 
@@ -290,6 +411,28 @@ async def async_setup_entry(hass, entry):
     return True
 
 
+async def async_unload_entry(hass, entry):
+    """Unload a config entry, writing devices not saved yet."""
+    if not await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        return False
+    data = hass.data.pop(DOMAIN)
+    for service in SERVICE_SEND_COMMAND, SERVICE_TEST_FRAME:
+        hass.services.async_remove(DOMAIN, service)
+    METRICS.unregister_gauge("command_queue_depth")
+    METRICS.unregister_gauge("connected_receivers")
+    ERRORS.stop()
+    for protocol in data[RFPLAYER_PROTOCOL].receivers.values():
+        protocol.transport.close()
+    await data[DATA_DEVICE_STORE].async_flush()
+    await hass.async_add_executor_job(close_captures, data[DATA_CAPTURES])
+    return True
+
+
+async def async_remove_entry(hass, entry):
+    """Remove the devices storage file of a deleted config entry."""
+    await RfplayerDeviceStore(hass, entry).async_remove_storage()
+
+
 class RfplayerDevice(RestoreEntity):
     """Representation of a Rfplayer device.
 
@@ -333,6 +476,7 @@ class RfplayerDevice(RestoreEntity):
             protocol=self._protocol,
             device_id=self._device_id,
             device_address=self._device_address,
+            priority=command_priority(self._context),
         )
 
     async def async_test_frame(self, frame, *args):
@@ -344,11 +488,16 @@ class RfplayerDevice(RestoreEntity):
     @callback
     def handle_event_callback(self, event):
         """Handle incoming event for device type."""
+        started = time.monotonic_ns()
         # # Call platform specific event handler
         self._handle_event(event)
+        written = time.monotonic_ns()
 
         # # Propagate changes through ha
         self.async_write_ha_state()
+        if TRACER.enabled:
+            TRACER.record("entity", started)
+            TRACER.record("state_write", written)
 
         # # Put command onto bus for user to subscribe to
         if identify_event_type(event) == EVENT_KEY_COMMAND:
@@ -427,7 +576,7 @@ class RfplayerDevice(RestoreEntity):
     async def async_will_remove_from_hass(self):
         """Clean when entity removed."""
         await super().async_will_remove_from_hass()
-        device_registry = dr.async_get(hass)
+        device_registry = dr.async_get(self.hass)
         device = device_registry.async_get_device(
             (DOMAIN, self.hass.data[DOMAIN]
              [CONF_DEVICE] + "_" + self._attr_unique_id)
@@ -7,13 +7,25 @@ import voluptuous as vol
 from homeassistant import config_entries, exceptions
 from homeassistant.const import CONF_DEVICE, CONF_DEVICES
 from homeassistant.core import callback
+import homeassistant.helpers.config_validation as cv
 
 from .const import (
+    CONF_ADDITIONAL_DEVICES,
     CONF_AUTOMATIC_ADD,
+    CONF_CAPTURE,
+    CONF_DECODE_CACHE,
+    CONF_DIAGNOSTIC_SENSORS,
+    CONF_FRAME_FORMAT,
+    CONF_LATENCY_TRACING,
     CONF_RECONNECT_INTERVAL,
+    CONF_REPEAT_WINDOW,
+    CONF_TRACE_SAMPLING,
     DEFAULT_RECONNECT_INTERVAL,
+    DEFAULT_REPEAT_WINDOW,
+    DEFAULT_TRACE_SAMPLING,
     DOMAIN,
 )
+from .rflib.rfpprotocol import DEFAULT_FRAME_FORMAT, FRAME_FORMATS
 
 
 @config_entries.HANDLERS.register(DOMAIN)
@@ -32,6 +44,11 @@ class RfplayerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             user_input[CONF_DEVICE] = await self.hass.async_add_executor_job(
                 get_serial_by_id, user_input[CONF_DEVICE]
             )
+            user_input[CONF_ADDITIONAL_DEVICES] = [
+                await self.hass.async_add_executor_job(get_serial_by_id, device)
+                for device in user_input.get(CONF_ADDITIONAL_DEVICES, [])
+                if device != user_input[CONF_DEVICE]
+            ]
 
             if not errors:
                 return self.async_create_entry(
@@ -53,6 +70,12 @@ class RfplayerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Required(
                 CONF_RECONNECT_INTERVAL, default=DEFAULT_RECONNECT_INTERVAL
             ): int,
+            vol.Required(CONF_FRAME_FORMAT, default=DEFAULT_FRAME_FORMAT): vol.In(
+                FRAME_FORMATS
+            ),
+            vol.Optional(CONF_ADDITIONAL_DEVICES, default=[]): cv.multi_select(
+                list_of_ports
+            ),
         }
         return self.async_show_form(
             step_id="user",
@@ -80,15 +103,43 @@ class RfPlayerOptionsFlowHandler(config_entries.OptionsFlow):
             config = self.config_entry.data
             options = self.config_entry.options
             auto_add = options.get(CONF_AUTOMATIC_ADD, config[CONF_AUTOMATIC_ADD])
+            diagnostic_sensors = options.get(CONF_DIAGNOSTIC_SENSORS, False)
+            trace_sampling = options.get(CONF_TRACE_SAMPLING, DEFAULT_TRACE_SAMPLING)
+            repeat_window = options.get(CONF_REPEAT_WINDOW, DEFAULT_REPEAT_WINDOW)
+            decode_cache = options.get(CONF_DECODE_CACHE, False)
+            latency_tracing = options.get(CONF_LATENCY_TRACING, False)
+            capture = options.get(CONF_CAPTURE, False)
 
             return self.async_show_form(
                 step_id="init",
                 data_schema=vol.Schema(
-                    {vol.Required(CONF_AUTOMATIC_ADD, default=auto_add): bool}
+                    {
+                        vol.Required(CONF_AUTOMATIC_ADD, default=auto_add): bool,
+                        vol.Required(
+                            CONF_DIAGNOSTIC_SENSORS, default=diagnostic_sensors
+                        ): bool,
+                        vol.Required(
+                            CONF_TRACE_SAMPLING, default=trace_sampling
+                        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                        vol.Required(
+                            CONF_REPEAT_WINDOW, default=repeat_window
+                        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                        vol.Required(CONF_DECODE_CACHE, default=decode_cache): bool,
+                        vol.Required(
+                            CONF_LATENCY_TRACING, default=latency_tracing
+                        ): bool,
+                        vol.Required(CONF_CAPTURE, default=capture): bool,
+                    }
                 ),
             )
         data = self.config_entry.data.copy()
         data[CONF_AUTOMATIC_ADD] = user_input[CONF_AUTOMATIC_ADD]
+        data[CONF_DIAGNOSTIC_SENSORS] = user_input[CONF_DIAGNOSTIC_SENSORS]
+        data[CONF_TRACE_SAMPLING] = user_input[CONF_TRACE_SAMPLING]
+        data[CONF_REPEAT_WINDOW] = user_input[CONF_REPEAT_WINDOW]
+        data[CONF_DECODE_CACHE] = user_input[CONF_DECODE_CACHE]
+        data[CONF_LATENCY_TRACING] = user_input[CONF_LATENCY_TRACING]
+        data[CONF_CAPTURE] = user_input[CONF_CAPTURE]
         return self.async_create_entry(title=data[CONF_DEVICE], data=data)
 
 
@@ -6,8 +6,27 @@ CONF_AUTOMATIC_ADD = "automatic_add"
 
 CONF_RECONNECT_INTERVAL = "reconnect_interval"
 
+CONF_FRAME_FORMAT = "frame_format"
+
+CONF_ADDITIONAL_DEVICES = "additional_devices"
+
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+
+CONF_TRACE_SAMPLING = "trace_sampling"
+
+CONF_LATENCY_TRACING = "latency_tracing"
+
+CONF_REPEAT_WINDOW = "repeat_window"
+
+CONF_DECODE_CACHE = "decode_cache"
+
+CONF_CAPTURE = "capture"
+
 DEFAULT_RECONNECT_INTERVAL = 10
 DEFAULT_SIGNAL_REPETITIONS = 1
+DEFAULT_METRICS_INTERVAL = 60
+DEFAULT_TRACE_SAMPLING = 1
+DEFAULT_REPEAT_WINDOW = 500
 
 PLATFORMS = ["sensor", "switch", "number","cover"]
 
@@ -25,9 +44,17 @@ CONF_PLATFORM = "platform"
 
 DATA_DEVICE_REGISTER = "device_register"
 DATA_ENTITY_LOOKUP = "entity_lookup"
+DATA_DEVICE_STORE = "device_store"
+DATA_CAPTURES = "captures"
+
+DEVICES_STORAGE_KEY = "rfplayer.{}.devices"
+DEVICES_STORAGE_VERSION = 1
+DEVICES_SAVE_DELAY = 10
 
 CONNECTION_TIMEOUT = 10
 
+CAPTURE_DIRECTORY = "rfplayer_capture"
+
 EVENT_BUTTON_PRESSED = "button_pressed"
 EVENT_KEY_COMMAND = "command"
 EVENT_KEY_ID = "id"
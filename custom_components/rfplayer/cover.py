@@ -10,7 +10,7 @@ from homeassistant.components.cover import (
 )
 
 
-from homeassistant.const import CONF_DEVICE_ID, CONF_DEVICES, CONF_PROTOCOL
+from homeassistant.const import CONF_DEVICE_ID, CONF_PROTOCOL
 #from homeassistant.helpers.entity import EntityCategory
 from homeassistant.core import callback
 
@@ -47,6 +47,7 @@ from .const import (
     CONF_AUTOMATIC_ADD,
     CONF_DEVICE_ADDRESS,
     CONF_ENTITY_TYPE,
+    DATA_DEVICE_STORE,
     DATA_ENTITY_LOOKUP,
     DOMAIN,
     EVENT_KEY_ID,
@@ -116,9 +117,10 @@ async def async_setup_entry(hass, entry, async_add_entities):
             _LOGGER.error("Cover creation error : ",str(device_info))
         
 
-    if CONF_DEVICES in config:
+    device_store = hass.data[DOMAIN][DATA_DEVICE_STORE]
+    if device_store.devices:
         items_to_delete=[]
-        for device_id, device_info in config[CONF_DEVICES].items():
+        for device_id, device_info in device_store.devices.items():
             if EVENT_KEY_COVER in device_info:
                 if device_info.get("entity_type"):
                     device_info["platform"]=device_info.get("entity_type")
@@ -128,7 +130,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
                     _LOGGER.warning("Cover entity not created %s %s", device_id, device_info)
                     items_to_delete.append(device_id)
         for item in items_to_delete:
-            config[CONF_DEVICES].pop(item)
+            device_store.async_remove(item)
 
     if options.get(CONF_AUTOMATIC_ADD, config[CONF_AUTOMATIC_ADD]):
         hass.data[DOMAIN][DATA_DEVICE_REGISTER][EVENT_KEY_COVER] = add_new_device
@@ -0,0 +1,54 @@
+"""Diagnostics support for Rfplayer."""
+from homeassistant.const import CONF_DEVICES
+
+from .const import DATA_DEVICE_STORE, DOMAIN, RFPLAYER_PROTOCOL
+from .rflib.rfperrors import ERRORS
+from .rflib.rfpmetrics import METRICS
+from .rflib.rfptrace import TRACER
+
+
+def entry_settings(settings):
+    """Return config entry settings with the number of devices, not the devices."""
+    settings = dict(settings)
+    if CONF_DEVICES in settings:
+        settings[CONF_DEVICES] = len(settings[CONF_DEVICES])
+    return settings
+
+
+def receiver_diagnostics(protocol):
+    """Return statistics of one connected gateway."""
+    decode_cache = protocol.decode_cache
+    return {
+        "frame_format": protocol.frame_format,
+        "frames_prefiltered": protocol.frames_prefiltered,
+        "decode_cache": {
+            "size": len(decode_cache),
+            "hits": decode_cache.hits,
+            "misses": decode_cache.misses,
+        }
+        if decode_cache is not None
+        else None,
+        "commands": protocol.command_stats.as_dict(),
+        "command_queue": protocol.command_queue.as_dict(),
+        "write_queue": protocol.write_queue.as_dict(),
+        "transmit_budget": protocol.scheduler.as_dict(),
+        "transmit_coalesced": protocol.scheduler.coalesced,
+    }
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Return diagnostics for a config entry."""
+    group = hass.data[DOMAIN][RFPLAYER_PROTOCOL]
+    return {
+        "config": entry_settings(entry.data),
+        "options": entry_settings(entry.options),
+        "devices": len(hass.data[DOMAIN][DATA_DEVICE_STORE].devices),
+        "metrics": METRICS.as_dict(),
+        "errors": ERRORS.as_dict(),
+        "latency": TRACER.as_dict() if TRACER.enabled else None,
+        "group": group.as_dict(),
+        "receivers": {
+            name: receiver_diagnostics(protocol)
+            for name, protocol in group.receivers.items()
+        },
+    }
@@ -79,7 +79,7 @@ def infoType_1_decode(infos:list,allowEmptyID:bool=False) -> list:
         return fields_found
 
 def infoType_2_decode(infos:list,allowEmptyID:bool=False) -> list:
-    if infotypes_debug: log.debug("Decode InfoType 2: %s",str(infos))
+    if infotypes_debug: log.debug("Decode InfoType 2: %s", infos)
     fields_found = {}
     binQualifier=int(infos["qualifier"])
     try:
@@ -98,8 +98,8 @@ def infoType_2_decode(infos:list,allowEmptyID:bool=False) -> list:
                 fields_found["button3"]=binQualifier==0x20
                 fields_found["button4"]=binQualifier==0x40
     except Exception as ex:
-        log.debug("Erreur décodage infotype2 - qualifier : %s => %s",str(binQualifier),ex)    
-        log.debug("infos : %s",str(infos)) 
+        log.debug("Erreur décodage infotype2 - qualifier : %s => %s", binQualifier, ex)
+        log.debug("infos : %s", infos)
     fields_found["id"]=infos["id"]
 
     if fields_found["id"]!="0" or allowEmptyID:
@@ -336,7 +336,7 @@ def infoType_10_decode(infos:list,allowEmptyID:bool=False) -> list:
         return fields_found
 
 def infoType_11_decode(infos:list,allowEmptyID:bool=False) -> list:
-    if infotypes_debug: log.debug("Decode InfoType 11 : %d",infos)
+    if infotypes_debug: log.debug("Decode InfoType 11 : %s", infos)
     fields_found = {}
     
     fields_found["subType"]=infos.get("subTypeMeaning")
@@ -360,7 +360,7 @@ def infoType_11_decode(infos:list,allowEmptyID:bool=False) -> list:
         return fields_found
     
 def infoType_13_decode(infos:list,allowEmptyID:bool=False) -> list:
-    if infotypes_debug: log.debug("Decode InfoType 13: %d",infos)
+    if infotypes_debug: log.debug("Decode InfoType 13: %s", infos)
     fields_found = {}
     
     fields_found["subType"]=infos.get("subTypeMeaning")
@@ -380,7 +380,7 @@ def infoType_13_decode(infos:list,allowEmptyID:bool=False) -> list:
         return fields_found
     
 def infoType_15_decode(infos:list,allowEmptyID:bool=False) -> list:
-    if infotypes_debug: log.debug("Decode InfoType 15 : %d",infos)
+    if infotypes_debug: log.debug("Decode InfoType 15 : %s", infos)
     fields_found = {}
    
     fields_found["subType"]=infos.get("subTypeMeaning")
@@ -507,3 +507,20 @@ def infoType_15_decode(infos:list,allowEmptyID:bool=False) -> list:
 # #
     if fields_found["id"]!="0" or allowEmptyID:
         return fields_found
+
+INFOTYPE_DECODERS = {
+    "0": infoType_0_decode,
+    "1": infoType_1_decode,
+    "2": infoType_2_decode,
+    "3": infoType_3_decode,
+    "4": infoType_4_decode,
+    "5": infoType_5_decode,
+    "6": infoType_6_decode,
+    "7": infoType_7_decode,
+    "8": infoType_8_decode,
+    "9": infoType_9_decode,
+    "10": infoType_10_decode,
+    "11": infoType_11_decode,
+    "13": infoType_13_decode,
+    "15": infoType_15_decode,
+}
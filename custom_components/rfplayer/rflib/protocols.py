@@ -1,6 +1,7 @@
 import logging
 from .infotypes import *
-from typing import Any, Callable, Dict, Generator, cast
+from .rfplog import TRACE
+from typing import Any, Callable, Dict, Generator, NamedTuple, Optional, cast
 import json
 
 #Debogage des protocoles
@@ -20,7 +21,7 @@ def alldecode(message:list) -> list:
     else:
         elements=message
 
-    log.debug("Avant for : %s",str(elements))
+    TRACE.debug(log, "Avant for : %s", elements)
     for element in elements:
         if protocols_debug: log.debug("Dans for - Type %s",type(element).__name__)
         match type(element).__name__:
@@ -29,23 +30,25 @@ def alldecode(message:list) -> list:
                 fields_found.append(alldecode(element))
             case 'list':
                 for subelement, value in element:
-                    if protocols_debug: log.debug("Element %s = %s", str(subelement),str(value))
+                    if protocols_debug: log.debug("Element %s = %s", subelement, value)
                     fields_found.append({subelement:value})
             case _:
                 if len(element)>1:
-                    if protocols_debug: log.debug("Element %s = %s", str(element[0]),str(element[1]))
+                    if protocols_debug: log.debug("Element %s = %s", element[0], element[1])
                     fields_found.append({element[0]:element[1]})
                 else :
-                    log.debug("Element non géré %s",str(element))
+                    log.debug("Element non géré %s", element)
                 
             
     
     return fields_found
 
-def header_decode(header:dict):
-    if protocols_debug: log.debug("Decode Header: Type=%s , datas=%s",type(header).__name__,str(header))
-    headers_found = {}
-    elements=['frameType','cluster','dataFlag','rfLevel','floorNoise','rfQuality','infoType','frequency']
+HEADER_FIELDS = ('frameType','cluster','dataFlag','rfLevel','floorNoise','rfQuality','infoType','frequency')
+
+def header_decode(header:dict, headers_found:dict=None) -> dict:
+    if protocols_debug: log.debug("Decode Header: Type=%s , datas=%s", type(header).__name__, header)
+    if headers_found is None:
+        headers_found = {}
     """
     frameType			0 : Regular Decoder, 1 : RF Frames
 	cluster				Reserved
@@ -58,338 +61,72 @@ def header_decode(header:dict):
 	infoType			Data Structure
 	frequency			Reception Frequency
     """
-    for element in elements:
+    for element in HEADER_FIELDS:
         headers_found[element]= header.get(element)
     headers_found['protocol']=header.get('protocolMeaning')
     return headers_found
 
-#X10 : Infotypes : 0,1
-def X10_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode X10")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-
-    #log.warn('Shadow Message, no id found !')
-
-#VISONIC : Infotypes : 2
-def VISONIC_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode VISONIC")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-            #decoding['sensor']=decoding["qualifier"]
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-#X10 : Infotypes : 0,1
-def BLYSS_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode BLYSS")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def CHACON_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode CHACON")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
+class ProtocolSpec(NamedTuple):
+    """Declarative description of a protocol decoder.
 
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def OREGON_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode OREGON")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def DOMIA_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode DOMIA")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def OWL_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode OWL")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
+    platform        platform set on every decoded packet (None: left to post)
+    forceid         event id forced for every measure of the packet
+    allowEmptyID    accept frames whose id is "0"
+    post            hook called with the decoded packet, may complete it
+    """
 
-def X2D_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode X2D")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
+    platform: Optional[str] = "sensor"
+    forceid: Optional[str] = None
+    allowEmptyID: bool = False
+    post: Optional[Callable[[PacketType], None]] = None
+
+def decode_frame(spec:ProtocolSpec,info_decode:Callable,message:dict,node) -> Optional[PacketType]:
+    """Decode one frame with its protocol spec into a single packet dict."""
+    decoding=info_decode(message['infos'],spec.allowEmptyID)
+    if protocols_debug: log.debug("decoding:%s", decoding)
+    if not decoding:
+        #log.warn('Shadow Message, no id found !')
+        return None
     decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if protocols_debug: log.debug("decoding:%s",str(decoding))
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def RTS_decode(data:list,message:list,node) -> list:
+    header_decode(message['header'],decoded_items)
+    decoded_items.update(decoding)
+    if spec.platform is not None:
+        decoded_items["platform"] = spec.platform
+    if spec.forceid is not None:
+        decoded_items["forceid"] = spec.forceid
+    if spec.post is not None:
+        spec.post(decoded_items)
+    return decoded_items
+
+def RTS_post(decoded_items:PacketType) -> None:
     """
     RTS uses Infotypes 3
     """
-    if protocols_debug: log.debug("Decode RTS")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-
-    if decoding != None:
-        if len(decoding)>0:
-            match decoding["subType"]:
-                case "Shutter":
-                    decoding["platform"] = "cover"
-                case "Portal":
-                    decoding["platform"] = "cover"
-
-            decoding['cover']=decoding["qualifier"]
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no address found !')
-
-def KD101_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode KD101")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def PARROT_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode PARROT")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
+    match decoded_items["subType"]:
+        case "Shutter":
+            decoded_items["platform"] = "cover"
+        case "Portal":
+            decoded_items["platform"] = "cover"
 
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def TIC_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode TIC")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
+    decoded_items['cover']=decoded_items["qualifier"]
 
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def FS20_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode FS20")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def JAMMING_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode JAMMING")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'],True)
-    if protocols_debug: log.debug("decoding:%s",str(decoding))
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-            decoding["forceid"] = "jamming_detection"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
-
-def EDISIO_decode(data:list,message:list,node) -> list:
-    if protocols_debug: log.debug("Decode EDISIO")
-    if protocols_debug: log.debug("data:%s",str(data))
-    if protocols_debug: log.debug("message:%s",str(message))
-    decoded_items = cast(PacketType, {"node": node})
-    decoding=header_decode(message['header'])
-    if protocols_debug: log.debug("decoding: datas=%s",str(decoding))
-    for element,value in decoding.items():
-        decoded_items[element]=value
-    decoding=globals()["_".join(["infoType",decoded_items["infoType"],"decode"])](message['infos'])
-    if decoding != None:
-        if len(decoding)>0:
-            decoding["platform"] = "sensor"
-
-            for element,value in decoding.items():
-                decoded_items[element]=value
-            
-            return decoded_items
-    
-    #log.warn('Shadow Message, no id found !')
+#X10 : Infotypes : 0,1
+#VISONIC : Infotypes : 2
+#RTS : Infotypes : 3
+PROTOCOL_SPECS = {
+    "X10": ProtocolSpec(),
+    "VISONIC": ProtocolSpec(),
+    "BLYSS": ProtocolSpec(),
+    "CHACON": ProtocolSpec(),
+    "OREGON": ProtocolSpec(),
+    "DOMIA": ProtocolSpec(),
+    "OWL": ProtocolSpec(),
+    "X2D": ProtocolSpec(),
+    "RTS": ProtocolSpec(platform=None, post=RTS_post),
+    "KD101": ProtocolSpec(),
+    "PARROT": ProtocolSpec(),
+    "TIC": ProtocolSpec(),
+    "FS20": ProtocolSpec(),
+    "JAMMING": ProtocolSpec(forceid="jamming_detection", allowEmptyID=True),
+    "EDISIO": ProtocolSpec(),
+}
@@ -0,0 +1,314 @@
+"""Decoding engine for the binary and hex frame formats.
+
+With `FORMAT BINARY` the gateway sends each received RF frame as:
+
+    'Z' 'I' SourceDestQualifier QualifierOrLen(lsb, msb)   5 bytes
+    frameType cluster dataFlag rfLevel floorNoise rfQuality protocol infoType
+    infos                                                   int16 words
+
+With `FORMAT HEX` the same bytes are sent as an hexadecimal text line.
+ASCII frames (`ZIA--`, `ZIA33`) use 'A' as SourceDestQualifier, binary
+frames any other value followed by the payload length.
+
+The header and infos are unpacked with struct into the same header/infos
+layout as the JSON frames, then go through the JSON decoders, so sensors,
+switches and covers get identical packets. Fields the binary format does
+not carry are rebuilt (protocolMeaning, subTypeMeaning, frequency from
+dataFlag, Oregon id_PHYMeaning) or left out. Infotypes 13 (TIC) and 15
+(EDISIO) carry text in JSON only and are not decoded here.
+"""
+
+import logging
+from struct import Struct, error as StructError
+from typing import Any, Dict, List, Optional
+
+from .infotypes import id_PHY_OREGON
+from .rfperrors import ERRORS
+from .rfpmetrics import METRICS, UNPARSED_PROTOCOL
+from .rfpregistry import DECODERS
+
+log = logging.getLogger(__name__)
+
+SYNC = b"ZI"
+HEX_SYNC = "5A49"
+ASCII_QUALIFIER = ord("A")
+
+frame_header = Struct("<2sBH")
+rf_header = Struct("<BBBbbBBB")
+
+FRAME_HEADER_SIZE = frame_header.size
+RF_HEADER_SIZE = rf_header.size
+
+PROTOCOL_NUMBERS = {
+    1: "X10",
+    2: "VISONIC",
+    3: "BLYSS",
+    4: "CHACON",
+    5: "OREGON",
+    6: "DOMIA",
+    7: "OWL",
+    8: "X2D",
+    9: "RTS",
+    10: "KD101",
+    11: "PARROT",
+    12: "DIGIMAX",
+    13: "TIC",
+    14: "FS20",
+    15: "JAMMING",
+    16: "EDISIO",
+}
+
+FREQUENCIES = {
+    0: "433920",
+    1: "868350",
+}
+
+SUBTYPE_MEANINGS = {
+    "1": {0: "OFF", 1: "ON", 4: "ALL_OFF", 5: "ALL_ON"},
+    "3": {0: "Shutter", 1: "Portal"},
+}
+
+
+def is_binary_frame(frame: memoryview) -> bool:
+    """Check if a frame is binary (not an ASCII ZIA frame)."""
+    return len(frame) > 2 and frame[0:2] == SYNC and frame[2] != ASCII_QUALIFIER
+
+
+def binary_frame_protocol(frame: memoryview) -> str:
+    """Return the protocol of a binary frame, without unpacking it."""
+    offset = FRAME_HEADER_SIZE + 6
+    if len(frame) <= offset:
+        return "BINARY"
+    return PROTOCOL_NUMBERS.get(frame[offset], str(frame[offset]))
+
+
+def _id32(lsb: int, msb: int) -> str:
+    """Build a 32 bits id as JSON prints it."""
+    return str(lsb | msb << 16)
+
+
+def _tenth(value: int, signed: bool = False) -> str:
+    """Format a value in tenths like the JSON measures."""
+    return f"{value / 10:+.1f}" if signed else f"{value / 10:.1f}"
+
+
+def _signed(value: int) -> int:
+    """Reinterpret an unsigned 16 bits word as signed."""
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _oregon_infos(words: List[int], measures: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build infos common to the Oregon infotypes (4 to 9)."""
+    subtype, id_phy, id_channel, qualifier = words[:4]
+    return {
+        "subType": str(subtype),
+        "id_PHY": f"0x{id_phy:04X}",
+        "id_PHYMeaning": id_PHY_OREGON.get(id_phy, ""),
+        "adr_channel": str(id_channel),
+        "id_channel": str(id_channel),
+        "qualifier": str(qualifier),
+        "lowBatt": str(qualifier & 0x01),
+        "measures": measures,
+    }
+
+
+def _infos_0(words: List[int]) -> Dict[str, Any]:
+    return {"subType": str(words[0]), "id": str(words[1])}
+
+
+def _infos_1(words: List[int]) -> Dict[str, Any]:
+    return {
+        "subType": str(words[0]),
+        "subTypeMeaning": SUBTYPE_MEANINGS["1"].get(words[0], ""),
+        "id": _id32(words[1], words[2]),
+    }
+
+
+def _infos_2(words: List[int]) -> Dict[str, Any]:
+    return {
+        "subType": str(words[0]),
+        "id": _id32(words[1], words[2]),
+        "qualifier": str(words[3]),
+    }
+
+
+def _infos_3(words: List[int]) -> Dict[str, Any]:
+    return {
+        "subType": str(words[0]),
+        "subTypeMeaning": SUBTYPE_MEANINGS["3"].get(words[0], ""),
+        "id": _id32(words[1], words[2]),
+        "qualifier": str(words[3]),
+    }
+
+
+def _infos_4(words: List[int]) -> Dict[str, Any]:
+    return _oregon_infos(
+        words,
+        [
+            {"type": "temperature", "value": _tenth(_signed(words[4]), True)},
+            {"type": "hygrometry", "value": str(words[5])},
+        ],
+    )
+
+
+def _infos_5(words: List[int]) -> Dict[str, Any]:
+    return _oregon_infos(
+        words,
+        [
+            {"type": "temperature", "value": _tenth(_signed(words[4]), True)},
+            {"type": "hygrometry", "value": str(words[5])},
+            {"type": "pressure", "value": str(words[6])},
+        ],
+    )
+
+
+def _infos_6(words: List[int]) -> Dict[str, Any]:
+    return _oregon_infos(
+        words,
+        [
+            {"type": "speed", "value": _tenth(words[4])},
+            {"type": "direction", "value": str(words[5])},
+        ],
+    )
+
+
+def _infos_7(words: List[int]) -> Dict[str, Any]:
+    return _oregon_infos(words, [{"type": "UV", "value": _tenth(words[4])}])
+
+
+def _infos_8(words: List[int]) -> Dict[str, Any]:
+    return _oregon_infos(
+        words,
+        [
+            {"type": "energy", "value": _id32(words[4], words[5])},
+            {"type": "power", "value": str(words[6])},
+            {"type": "P1", "value": str(words[7])},
+            {"type": "P2", "value": str(words[8])},
+            {"type": "P3", "value": str(words[9])},
+        ],
+    )
+
+
+def _infos_9(words: List[int]) -> Dict[str, Any]:
+    return _oregon_infos(
+        words,
+        [
+            {"type": "TotalRain", "value": _tenth(words[4] | words[5] << 16)},
+            {"type": "Rain", "value": _tenth(words[6])},
+        ],
+    )
+
+
+def _infos_10(words: List[int]) -> Dict[str, Any]:
+    return {
+        "subType": str(words[0]),
+        "id": _id32(words[1], words[2]),
+        "qualifier": str(words[3]),
+        "qualifierMeaning": {},
+        "functionMeaning": str(words[4]),
+        "modeMeaning": str(words[5]),
+        "d0": str(words[6]),
+        "d1": str(words[7]),
+        "d2": str(words[8]),
+        "d3": str(words[9]),
+    }
+
+
+# infoType: (number of int16 words, infos builder)
+INFOS_LAYOUTS: Dict[str, tuple] = {
+    "0": (2, _infos_0),
+    "1": (3, _infos_1),
+    "2": (4, _infos_2),
+    "3": (4, _infos_3),
+    "4": (6, _infos_4),
+    "5": (7, _infos_5),
+    "6": (6, _infos_6),
+    "7": (5, _infos_7),
+    "8": (10, _infos_8),
+    "9": (7, _infos_9),
+    "10": (10, _infos_10),
+    "11": (10, _infos_10),
+}
+
+_infos_structs = {
+    info_type: Struct("<%dH" % count) for info_type, (count, _) in INFOS_LAYOUTS.items()
+}
+
+
+def binary_message(frame: memoryview) -> Optional[Dict[str, Any]]:
+    """Unpack a binary frame into the JSON frame header/infos layout."""
+    sync, _, length = frame_header.unpack_from(frame)
+    payload = frame[FRAME_HEADER_SIZE:FRAME_HEADER_SIZE + length]
+    (
+        frame_type,
+        cluster,
+        data_flag,
+        rf_level,
+        floor_noise,
+        rf_quality,
+        protocol,
+        info_type,
+    ) = rf_header.unpack_from(payload)
+    info_type = str(info_type)
+    layout = INFOS_LAYOUTS.get(info_type)
+    if sync != SYNC or layout is None:
+        return None
+    _, build_infos = layout
+    words = list(_infos_structs[info_type].unpack_from(payload, RF_HEADER_SIZE))
+    return {
+        "header": {
+            "frameType": str(frame_type),
+            "cluster": str(cluster),
+            "dataFlag": str(data_flag),
+            "rfLevel": str(rf_level),
+            "floorNoise": str(floor_noise),
+            "rfQuality": str(rf_quality),
+            "protocol": str(protocol),
+            "protocolMeaning": PROTOCOL_NUMBERS.get(protocol, str(protocol)),
+            "infoType": info_type,
+            "frequency": FREQUENCIES.get(data_flag, ""),
+        },
+        "infos": build_infos(words),
+    }
+
+
+def decode_binary_packet(frame: memoryview, node: str) -> list:
+    """Decode one binary frame into packet dicts."""
+    try:
+        message = binary_message(frame)
+    except StructError:
+        log.warning("truncated binary frame: %s", bytes(frame).hex())
+        METRICS.decode_failed(UNPARSED_PROTOCOL)
+        return []
+    if message is None:
+        log.debug("binary frame not decoded: %s", bytes(frame).hex())
+        return []
+    header = message["header"]
+    decoder = DECODERS.lookup(header["protocolMeaning"], header["infoType"])
+    if decoder is None:
+        return []
+    try:
+        return [decoder(message, node)]
+    except Exception as e:
+        METRICS.decode_failed(header["protocolMeaning"])
+        ERRORS.report(
+            log,
+            header["protocolMeaning"],
+            type(e).__name__,
+            "Protocol %s binary decoding failed : %s, message: %s",
+            header["protocolMeaning"],
+            e,
+            message,
+            exc_info=e,
+        )
+        return []
+
+
+def decode_hex_packet(packet: str, node: str) -> list:
+    """Decode one hex text frame into packet dicts."""
+    try:
+        frame = bytes.fromhex(packet)
+    except ValueError:
+        log.warning("invalid hex frame: %s", packet)
+        return []
+    return decode_binary_packet(memoryview(frame), node)
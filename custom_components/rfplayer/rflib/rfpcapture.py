@@ -0,0 +1,323 @@
+"""Append-only capture of the raw frames received from the gateway.
+
+A capture is a series of segment files `<base>.<number>.rfpcap`, rotated
+once a segment reaches `segment_size` bytes; only the last `max_segments`
+are kept. A segment is:
+
+    header   magic "RFPC", version, codec, wall clock start time
+    blocks   count, payload size, first and last timestamp, then payload
+
+The payload of a block is the concatenation of its records, compressed as
+a whole with zlib or lzma when a codec is set:
+
+    record   monotonic timestamp (float64), frame length, frame bytes
+
+Frames are stored without their `\\n\\r` terminator. Every block also
+appends its first timestamp and offset to the segment seek index
+`<segment>.idx`, so readers can jump close to a point in time without
+decompressing the blocks before it.
+"""
+
+from bisect import bisect_right
+import glob
+import logging
+import lzma
+import mmap
+import os
+import queue
+from struct import Struct, error as StructError
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple, Union
+import zlib
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"RFPC"
+VERSION = 1
+SEGMENT_SUFFIX = ".rfpcap"
+INDEX_SUFFIX = ".idx"
+
+CODEC_NONE = "none"
+CODEC_ZLIB = "zlib"
+CODEC_LZMA = "lzma"
+CODECS = [CODEC_NONE, CODEC_ZLIB, CODEC_LZMA]
+
+segment_header = Struct("<4sBBxxd")
+block_header = Struct("<IIdd")
+record_header = Struct("<dI")
+index_entry = Struct("<dQ")
+
+SEGMENT_SIZE = 64 * 1024 * 1024
+MAX_SEGMENTS = 16
+BLOCK_RECORDS = 256
+BLOCK_INTERVAL = 1.0
+
+
+def compress(codec: str, data: bytes) -> bytes:
+    """Compress a block payload."""
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data)
+    if codec == CODEC_LZMA:
+        return lzma.compress(data)
+    return data
+
+
+def decompress(codec: str, data: Union[bytes, memoryview]) -> Union[bytes, memoryview]:
+    """Decompress a block payload."""
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_LZMA:
+        return lzma.decompress(data)
+    return data
+
+
+def segment_path(base: str, number: int) -> str:
+    """Return the path of one capture segment."""
+    return f"{base}.{number:06d}{SEGMENT_SUFFIX}"
+
+
+def capture_segments(base: str) -> List[str]:
+    """Return the segment paths of a capture, oldest first."""
+    return sorted(glob.glob(glob.escape(base) + ".[0-9]*" + SEGMENT_SUFFIX))
+
+
+class FrameRecorder:
+    """Record raw frames into a rotating, append-only capture.
+
+    `record` only appends to a block in memory, so it can be called from
+    the event loop. A block is handed to a writer thread when it holds
+    `block_records` records or spans `block_interval` seconds, and on
+    `flush`/`close`; the thread compresses and writes it, rotates segments
+    and removes the old ones.
+    """
+
+    def __init__(
+        self,
+        base: str,
+        codec: str = CODEC_NONE,
+        segment_size: int = SEGMENT_SIZE,
+        max_segments: int = MAX_SEGMENTS,
+        block_records: int = BLOCK_RECORDS,
+        block_interval: float = BLOCK_INTERVAL,
+    ) -> None:
+        """Start the writer thread, which opens a segment after the existing ones."""
+        if codec not in CODECS:
+            raise ValueError(f"unknown capture codec {codec}")
+        self.base = base
+        self.codec = codec
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.block_records = block_records
+        self.block_interval = block_interval
+        self.records = 0
+        self.blocks = 0
+        self.bytes_written = 0
+        self._block = bytearray()
+        self._count = 0
+        self._first = 0.0
+        self._last = 0.0
+        self._closed = False
+        self._file = None
+        self._index = None
+        self._number = 0
+        self._queue = queue.SimpleQueue()  # type: queue.SimpleQueue
+        self._writer = threading.Thread(
+            target=self._write_blocks, name=f"capture {base}", daemon=True
+        )
+        self._writer.start()
+
+    def _write_blocks(self) -> None:
+        """Write the blocks handed over until close, in the writer thread."""
+        try:
+            segments = capture_segments(self.base)
+            self._number = (
+                int(segments[-1][len(self.base) + 1:-len(SEGMENT_SUFFIX)]) + 1
+                if segments
+                else 0
+            )
+            self._open_segment()
+        except OSError as err:
+            log.error("cannot open capture %s: %s", self.base, err)
+        while True:
+            block = self._queue.get()
+            if block is None:
+                break
+            if self._file is None:
+                continue
+            try:
+                self._write_block(*block)
+            except OSError as err:
+                log.error("capture %s stopped: %s", self.base, err)
+                self._close_segment()
+        if self._file is not None:
+            self._close_segment()
+
+    def _open_segment(self) -> None:
+        path = segment_path(self.base, self._number)
+        self._file = open(path, "wb")
+        self._index = open(path + INDEX_SUFFIX, "wb")
+        self._file.write(
+            segment_header.pack(MAGIC, VERSION, CODECS.index(self.codec), time.time())
+        )
+        self._number += 1
+        segments = capture_segments(self.base)
+        for old in segments[: max(len(segments) - self.max_segments, 0)]:
+            log.debug("removing capture segment %s", old)
+            for stale in (old, old + INDEX_SUFFIX):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def _write_block(self, block: bytes, count: int, first: float, last: float) -> None:
+        payload = compress(self.codec, block)
+        offset = self._file.tell()
+        self._file.write(block_header.pack(count, len(payload), first, last))
+        self._file.write(payload)
+        self._file.flush()
+        self._index.write(index_entry.pack(first, offset))
+        self._index.flush()
+        self.blocks += 1
+        self.bytes_written += block_header.size + len(payload)
+        if self._file.tell() >= self.segment_size:
+            self._close_segment()
+            self._open_segment()
+
+    def _close_segment(self) -> None:
+        for file in (self._file, self._index):
+            if file is not None:
+                file.close()
+        self._file = self._index = None
+
+    def record(self, frame: Union[bytes, memoryview], timestamp: Optional[float] = None) -> None:
+        """Add one frame, with its monotonic reception time."""
+        if self._closed:
+            return
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if not self._count:
+            self._first = timestamp
+        self._block += record_header.pack(timestamp, len(frame))
+        self._block += frame
+        self._count += 1
+        self._last = timestamp
+        self.records += 1
+        if (
+            self._count >= self.block_records
+            or timestamp - self._first >= self.block_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the pending block to the writer thread."""
+        if not self._count or self._closed:
+            return
+        self._queue.put((bytes(self._block), self._count, self._first, self._last))
+        self._block.clear()
+        self._count = 0
+
+    def close(self) -> None:
+        """Write the pending block and close the capture.
+
+        Waits for the writer thread: from the event loop, run it in an
+        executor.
+        """
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+
+class CaptureReader:
+    """Read the records of a capture through memory maps.
+
+    Segments are mapped one at a time and uncompressed records are handed
+    out as memoryview slices of the map, so a capture of any size is read
+    without loading it in memory. Compressed blocks are decompressed one
+    at a time.
+    """
+
+    def __init__(self, base: str) -> None:
+        """Find the segments of a capture."""
+        self.base = base
+        self.segments = capture_segments(base)
+        self.blocks = 0
+        self.records = 0
+
+    @staticmethod
+    def index(segment: str) -> List[tuple]:
+        """Return the (first timestamp, offset) seek index of a segment."""
+        try:
+            with open(segment + INDEX_SUFFIX, "rb") as index:
+                return list(index_entry.iter_unpack(index.read()))
+        except (OSError, StructError):
+            return []
+
+    def _start_offset(self, segment: str, start: Optional[float]) -> int:
+        """Return offset of the last block starting before start."""
+        if start is None:
+            return segment_header.size
+        entries = self.index(segment)
+        position = bisect_right([first for first, _ in entries], start) - 1
+        return entries[position][1] if position >= 0 else segment_header.size
+
+    def __iter__(self) -> Iterator[Tuple[float, memoryview]]:
+        """Iterate over (timestamp, frame) records."""
+        return self.read()
+
+    def read(self, start: Optional[float] = None) -> Iterator[Tuple[float, memoryview]]:
+        """Iterate over records, from monotonic timestamp start if given."""
+        for segment in self.segments:
+            with open(segment, "rb") as file:
+                if os.fstat(file.fileno()).st_size < segment_header.size:
+                    continue
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        yield from self._read_segment(segment, view, start)
+                    finally:
+                        view.release()
+
+    def _read_segment(
+        self, segment: str, view: memoryview, start: Optional[float]
+    ) -> Iterator[Tuple[float, memoryview]]:
+        magic, version, codec, _ = segment_header.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            log.warning("not a capture segment: %s", segment)
+            return
+        codec = CODECS[codec]
+        offset = self._start_offset(segment, start)
+        size = len(view)
+        while offset + block_header.size <= size:
+            count, length, _, last = block_header.unpack_from(view, offset)
+            offset += block_header.size
+            if offset + length > size:
+                log.warning("truncated block in %s", segment)
+                return
+            block = view[offset:offset + length]
+            offset += length
+            if start is not None and last < start:
+                block.release()
+                continue
+            payload = memoryview(decompress(codec, block))
+            self.blocks += 1
+            try:
+                position = 0
+                for _ in range(count):
+                    timestamp, frame_size = record_header.unpack_from(payload, position)
+                    position += record_header.size
+                    frame = payload[position:position + frame_size]
+                    position += frame_size
+                    if start is not None and timestamp < start:
+                        continue
+                    self.records += 1
+                    try:
+                        yield timestamp, frame
+                    finally:
+                        frame.release()
+            finally:
+                payload.release()
+                block.release()
@@ -0,0 +1,619 @@
+"""Outbound command pipeline primitives."""
+
+import asyncio
+from collections import deque
+from datetime import timedelta
+from itertools import count
+import time
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+# Commands the gateway answers with a ZIA-- line, other commands are silent.
+RESPONSE_COMMANDS = frozenset(["HELLO", "PING", "STATUS"])
+
+# Start of the ZIA-- reply of each command: PONG, the HELLO banner, then the
+# STATUS output in text, JSON or XML format
+RESPONSE_PREFIXES = (
+    ("PONG", "PING"),
+    ("Welcome", "HELLO"),
+    ("Ziblue", "HELLO"),
+    ("Status", "STATUS"),
+    ('{"systemStatus"', "STATUS"),
+    ('{"radioStatus"', "STATUS"),
+    ('{"transcoderStatus"', "STATUS"),
+    ('{"parrotStatus"', "STATUS"),
+    ('{"alarmStatus"', "STATUS"),
+    ("<systemStatus", "STATUS"),
+    ("<radioStatus", "STATUS"),
+    ("<transcoderStatus", "STATUS"),
+    ("<parrotStatus", "STATUS"),
+    ("<alarmStatus", "STATUS"),
+)
+
+DEFAULT_COMMAND_WINDOW = 1
+
+# Command priority classes, lowest value served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_AUTOMATION = 1
+PRIORITY_MAINTENANCE = 2
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_AUTOMATION, PRIORITY_MAINTENANCE)
+
+# Commands waiting longer are served before fresher higher priority ones
+STARVATION_TIMEOUT = timedelta(seconds=2)
+
+BAND_433 = "433"
+BAND_868 = "868"
+
+# Share of airtime allowed per band (ETSI EN 300 220), over DUTY_CYCLE_WINDOW
+DUTY_CYCLES = {BAND_433: 0.10, BAND_868: 0.01}
+DUTY_CYCLE_WINDOW = timedelta(hours=1)
+
+# Protocols the gateway transmits on 868 MHz, others on 433 MHz
+PROTOCOL_BANDS = {
+    "VISONIC": BAND_868,
+    "X2D": BAND_868,
+    "FS20": BAND_868,
+    "EDISIO": BAND_868,
+    "EDISIOFRAME": BAND_868,
+}
+
+# Estimated airtime in seconds of one command, repeats included
+PROTOCOL_AIRTIME = {
+    "X10": 0.25,
+    "VISONIC": 0.2,
+    "BLYSS": 0.3,
+    "CHACON": 0.4,
+    "DOMIA": 0.2,
+    "X2D": 0.2,
+    "RTS": 0.6,
+    "KD101": 0.2,
+    "PARROT": 0.3,
+    "FS20": 0.2,
+    "EDISIO": 0.1,
+    "EDISIOFRAME": 0.1,
+}
+
+# Gap kept between two transmissions on the same band
+TRANSMIT_GUARD = timedelta(milliseconds=50)
+
+
+def command_keyword(packet: str) -> str:
+    """Return the first word of a raw ZIA++ command line."""
+    keyword = packet[5:].split(" ", 1)[0]
+    return keyword.upper()
+
+
+def expects_response(packet: str) -> bool:
+    """Check if the gateway will answer this raw command."""
+    return command_keyword(packet) in RESPONSE_COMMANDS
+
+
+def response_keywords(packet: str) -> list:
+    """Return the commands answered by the gateway in a raw command line.
+
+    A line may chain several commands separated by '.', each one answered
+    in turn.
+    """
+    keywords = []
+    for command in packet[5:].split("."):
+        words = command.split()
+        if words and words[0].isdigit():
+            words = words[1:]
+        if words and words[0].upper() in RESPONSE_COMMANDS:
+            keywords.append(words[0].upper())
+    return keywords
+
+
+def response_keyword(message: str) -> Optional[str]:
+    """Return the command a ZIA-- reply answers, None if not a known reply."""
+    message = message.lstrip()
+    for prefix, keyword in RESPONSE_PREFIXES:
+        if message.startswith(prefix):
+            return keyword
+    return None
+
+
+def default_priority(protocol: str) -> int:
+    """Return priority of a command sent without one."""
+    if protocol in PROTOCOL_AIRTIME:
+        return PRIORITY_AUTOMATION
+    return PRIORITY_MAINTENANCE
+
+
+def command_target(
+    protocol: str, device_address: Optional[str], device_id: Optional[str]
+) -> Optional[Tuple[str, str]]:
+    """Return the device an RF command drives, None for other commands."""
+    device = device_id if device_id is not None else device_address
+    if device is None or protocol not in PROTOCOL_AIRTIME:
+        return None
+    return (protocol, str(device))
+
+
+class PendingCommand:
+    """One outbound command and the future resolved by its acknowledgement."""
+
+    __slots__ = (
+        "sequence",
+        "packet",
+        "future",
+        "priority",
+        "target",
+        "response",
+        "created",
+        "sent",
+        "deadline",
+    )
+
+    def __init__(
+        self,
+        sequence: int,
+        packet: str,
+        future: asyncio.Future,
+        priority: int = PRIORITY_AUTOMATION,
+        target: Optional[Tuple[str, str]] = None,
+        response: Optional[str] = None,
+    ) -> None:
+        """Initialize command, response is the keyword of the expected reply."""
+        self.sequence = sequence
+        self.packet = packet
+        self.future = future
+        self.priority = priority
+        self.target = target
+        self.response = response
+        self.created = time.monotonic()
+        self.sent: Optional[float] = None
+        self.deadline: Optional[float] = None
+
+    def __repr__(self) -> str:
+        """Return debug representation."""
+        return f"<PendingCommand #{self.sequence} p{self.priority} {self.packet!r}>"
+
+    def resolve(self, result: bool) -> None:
+        """Complete the command future, once."""
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class CommandStatistics:
+    """Counters and latency of the command pipeline."""
+
+    __slots__ = (
+        "sent",
+        "acknowledged",
+        "timeouts",
+        "failed",
+        "unsolicited",
+        "last_latency",
+        "max_latency",
+        "_latency_sum",
+    )
+
+    def __init__(self) -> None:
+        """Initialize counters."""
+        self.sent = 0
+        self.acknowledged = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.unsolicited = 0
+        self.last_latency: Optional[float] = None
+        self.max_latency = 0.0
+        self._latency_sum = 0.0
+
+    def record_ack(self, latency: float) -> None:
+        """Account an acknowledged command."""
+        self.acknowledged += 1
+        self.last_latency = latency
+        self._latency_sum += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return statistics as a plain dict."""
+        return {
+            "sent": self.sent,
+            "acknowledged": self.acknowledged,
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+            "unsolicited": self.unsolicited,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+            "average_latency": (
+                self._latency_sum / self.acknowledged if self.acknowledged else None
+            ),
+        }
+
+
+class BandBudget:
+    """Airtime reservations and counters of one frequency band."""
+
+    __slots__ = (
+        "duty_cycle",
+        "limit",
+        "next_free",
+        "transmissions",
+        "delayed",
+        "total_delay",
+        "_used",
+        "_reservations",
+    )
+
+    def __init__(self, duty_cycle: float, window: float) -> None:
+        """Initialize band with its airtime limit per window."""
+        self.duty_cycle = duty_cycle
+        self.limit = duty_cycle * window
+        self.next_free = 0.0
+        self.transmissions = 0
+        self.delayed = 0
+        self.total_delay = 0.0
+        self._used = 0.0
+        self._reservations = deque()  # type: Deque[Tuple[float, float]]
+
+    def expire(self, now: float, window: float) -> None:
+        """Forget reservations older than the duty cycle window."""
+        reservations = self._reservations
+        while reservations and reservations[0][0] <= now - window:
+            self._used -= reservations.popleft()[1]
+
+    def available_at(self, now: float, airtime: float, window: float) -> float:
+        """Return start time of the earliest slot for airtime."""
+        start = max(now, self.next_free)
+        used = self._used
+        # skip past the oldest reservations until the new one fits the budget
+        for reserved, reserved_airtime in self._reservations:
+            if used + airtime <= self.limit:
+                break
+            start = max(start, reserved + window)
+            used -= reserved_airtime
+        return start
+
+    def reserve(self, now: float, airtime: float, window: float, guard: float) -> float:
+        """Reserve the earliest slot for airtime, return its start time."""
+        start = self.available_at(now, airtime, window)
+        self._reservations.append((start, airtime))
+        self._used += airtime
+        self.next_free = start + airtime + guard
+        self.transmissions += 1
+        if start > now:
+            self.delayed += 1
+            self.total_delay += start - now
+        return start
+
+    def release(self, start: float, airtime: float) -> None:
+        """Give back the airtime of a reservation that was not transmitted."""
+        try:
+            self._reservations.remove((start, airtime))
+        except ValueError:
+            return
+        self._used -= airtime
+        self.transmissions -= 1
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        """Return budget of the band as a plain dict."""
+        return {
+            "duty_cycle": self.duty_cycle,
+            "limit": self.limit,
+            "used": self._used,
+            "remaining": max(self.limit - self._used, 0.0),
+            "next_free": max(self.next_free - now, 0.0),
+            "transmissions": self.transmissions,
+            "delayed": self.delayed,
+            "total_delay": self.total_delay,
+        }
+
+
+class Reservation(NamedTuple):
+    """Transmit slot granted to one command, none if replaced by a newer one."""
+
+    band: str
+    start: float
+    airtime: float
+    delay: float
+    replaced: bool = False
+
+
+class TransmitScheduler:
+    """Space RF transmissions and keep each band within its duty cycle.
+
+    Every RF command reserves its estimated airtime on the band of its
+    protocol. The slot starts once the previous transmission of the band is
+    expected to be over (plus `guard`), and later when the airtime used
+    within `window` would exceed the band duty cycle. Commands of unknown
+    protocols (gateway configuration) are not RF transmissions and are
+    never delayed.
+
+    Bands are independent: a band out of budget only holds its own
+    commands. Commands waiting for a band are granted their slot when it
+    comes, highest priority class first, unless one waited longer than
+    `starvation_timeout`, then oldest first. A waiter cancelled before its
+    slot reserves nothing; `release` gives back a slot not used.
+
+    Latest wins per device: a command waiting for the same target as a new
+    one is replaced, without a slot, and the new command takes its place
+    when both have the same priority.
+    """
+
+    def __init__(
+        self,
+        duty_cycles: Optional[Dict[str, float]] = None,
+        window: timedelta = DUTY_CYCLE_WINDOW,
+        guard: timedelta = TRANSMIT_GUARD,
+        starvation_timeout: timedelta = STARVATION_TIMEOUT,
+    ) -> None:
+        """Initialize one budget per band."""
+        self.window = window.total_seconds()
+        self.guard = guard.total_seconds()
+        self.starvation_timeout = starvation_timeout.total_seconds()
+        self.bands = {
+            band: BandBudget(duty_cycle, self.window)
+            for band, duty_cycle in (duty_cycles or DUTY_CYCLES).items()
+        }
+        # per band: (priority, sequence, enqueued, airtime, future, target)
+        self._waiters = {band: [] for band in self.bands}  # type: Dict[str, List[tuple]]
+        self._timers = {}  # type: Dict[str, asyncio.TimerHandle]
+        self._sequence = count()
+        self.coalesced = 0
+
+    @staticmethod
+    def band(protocol: str) -> str:
+        """Return the band a protocol transmits on."""
+        return PROTOCOL_BANDS.get(protocol, BAND_433)
+
+    @staticmethod
+    def airtime(protocol: str) -> float:
+        """Return estimated airtime of one command, 0 if not RF."""
+        return PROTOCOL_AIRTIME.get(protocol, 0.0)
+
+    def reserve(self, protocol: str, now: Optional[float] = None) -> float:
+        """Reserve a transmit slot, return seconds to wait before sending."""
+        airtime = self.airtime(protocol)
+        budget = self.bands.get(self.band(protocol))
+        if not airtime or budget is None:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        budget.expire(now, self.window)
+        return budget.reserve(now, airtime, self.window, self.guard) - now
+
+    async def wait(
+        self,
+        protocol: str,
+        priority: int = PRIORITY_AUTOMATION,
+        target: Optional[Tuple[str, str]] = None,
+    ) -> Optional[Reservation]:
+        """Wait for the transmit slot of one command to target, None if not RF."""
+        band = self.band(protocol)
+        airtime = self.airtime(protocol)
+        budget = self.bands.get(band)
+        if not airtime or budget is None:
+            return None
+        now = time.monotonic()
+        budget.expire(now, self.window)
+        waiters = self._waiters[band]
+        if not waiters and budget.available_at(now, airtime, self.window) <= now:
+            return Reservation(
+                band, budget.reserve(now, airtime, self.window, self.guard), airtime, 0.0
+            )
+        waiter = asyncio.get_running_loop().create_future()
+        self._enqueue(band, (priority, next(self._sequence), now, airtime, waiter, target))
+        self._schedule(band)
+        try:
+            start = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result() is not None:
+                # slot granted while being cancelled, give it back
+                budget.release(waiter.result(), airtime)
+            self._schedule(band)
+            raise
+        if start is None:
+            return Reservation(band, 0.0, 0.0, time.monotonic() - now, replaced=True)
+        return Reservation(band, start, airtime, time.monotonic() - now)
+
+    def _enqueue(self, band: str, entry: tuple) -> None:
+        """Add a waiter to band, replacing the waiting one for the same target."""
+        waiters = self._waiters[band]
+        target = entry[5]
+        if target is not None:
+            for index, waiter in enumerate(waiters):
+                if waiter[5] == target and not waiter[4].done():
+                    if waiter[0] == entry[0]:
+                        # take the place of the replaced command
+                        waiters[index] = entry[:1] + waiter[1:3] + entry[3:]
+                    else:
+                        del waiters[index]
+                        waiters.append(entry)
+                    self.coalesced += 1
+                    waiter[4].set_result(None)
+                    return
+        waiters.append(entry)
+
+    def waiting(self, band: Optional[str] = None) -> int:
+        """Return number of commands waiting for band, or for any band."""
+        bands = self._waiters if band is None else [band]
+        return sum(
+            1 for band in bands for waiter in self._waiters[band] if not waiter[4].done()
+        )
+
+    def release(self, reservation: Optional[Reservation]) -> None:
+        """Give back a slot the command was not transmitted in."""
+        if reservation is not None:
+            self.bands[reservation.band].release(reservation.start, reservation.airtime)
+
+    def _next_waiter(self, band: str, now: float) -> Optional[tuple]:
+        """Return the waiter served next on band, dropping cancelled ones."""
+        waiters = self._waiters[band]
+        waiters[:] = [waiter for waiter in waiters if not waiter[4].done()]
+        if not waiters:
+            return None
+        oldest = min(waiters, key=lambda waiter: waiter[1])
+        if now - oldest[2] > self.starvation_timeout:
+            return oldest
+        return min(waiters, key=lambda waiter: waiter[:2])
+
+    def _schedule(self, band: str) -> None:
+        """Wake up when the next waiter of band can get its slot."""
+        timer = self._timers.pop(band, None)
+        if timer is not None:
+            timer.cancel()
+        now = time.monotonic()
+        waiter = self._next_waiter(band, now)
+        if waiter is None:
+            return
+        budget = self.bands[band]
+        budget.expire(now, self.window)
+        delay = budget.available_at(now, waiter[3], self.window) - now
+        self._timers[band] = asyncio.get_running_loop().call_later(
+            max(delay, 0.0), self._grant, band
+        )
+
+    def _grant(self, band: str) -> None:
+        """Reserve the slot of the next waiter of band if it has come."""
+        self._timers.pop(band, None)
+        now = time.monotonic()
+        waiter = self._next_waiter(band, now)
+        if waiter is not None:
+            budget = self.bands[band]
+            budget.expire(now, self.window)
+            if budget.available_at(now, waiter[3], self.window) <= now:
+                self._waiters[band].remove(waiter)
+                waiter[4].set_result(
+                    budget.reserve(now, waiter[3], self.window, self.guard)
+                )
+        self._schedule(band)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return budget of every band."""
+        now = time.monotonic()
+        for budget in self.bands.values():
+            budget.expire(now, self.window)
+        return {
+            band: dict(budget.as_dict(now), waiting=self.waiting(band))
+            for band, budget in self.bands.items()
+        }
+
+
+class CommandQueue:
+    """Grant a bounded number of send slots in priority order.
+
+    Commands wait in one FIFO per priority class and the highest class is
+    served first. A command waiting longer than `starvation_timeout` is
+    served before fresher commands of higher classes, oldest first, so a
+    long automation burst delays maintenance commands but never blocks
+    them.
+
+    Latest wins per device: a waiting command for the same target as a new
+    one is dropped, the new command takes its place when both have the
+    same priority.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        window: int = DEFAULT_COMMAND_WINDOW,
+        starvation_timeout: timedelta = STARVATION_TIMEOUT,
+    ) -> None:
+        """Initialize empty queue."""
+        self.loop = loop
+        self.window = window
+        self.starvation_timeout = starvation_timeout.total_seconds()
+        self.active = 0
+        self.promoted = 0
+        self.coalesced = 0
+        self.served = {priority: 0 for priority in PRIORITIES}
+        self._queues = {
+            priority: deque() for priority in PRIORITIES
+        }  # type: Dict[int, Deque[Tuple[PendingCommand, asyncio.Future]]]
+        self._targets = {}  # type: Dict[Tuple[str, str], Tuple[PendingCommand, asyncio.Future]]
+
+    def __len__(self) -> int:
+        """Return number of waiting commands."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def acquire(self, command: PendingCommand) -> bool:
+        """Wait for a send slot, False if a newer command replaced this one."""
+        if self.active < self.window and not len(self):
+            self.active += 1
+            self.served[command.priority] += 1
+            return True
+        entry = (command, self.loop.create_future())
+        self._enqueue(entry)
+        try:
+            return await entry[1]
+        except asyncio.CancelledError:
+            waiter = entry[1]
+            if waiter.done() and not waiter.cancelled():
+                if waiter.result():
+                    # slot granted while being cancelled, hand it over
+                    self.release()
+            else:
+                self._discard(entry)
+            raise
+
+    def _enqueue(self, entry: Tuple[PendingCommand, asyncio.Future]) -> None:
+        """Queue a command, replacing the waiting one for the same target."""
+        command = entry[0]
+        queue = self._queues[command.priority]
+        if command.target is not None:
+            replaced = self._targets.get(command.target)
+            self._targets[command.target] = entry
+            if replaced is not None:
+                self.coalesced += 1
+                replaced_queue = self._queues[replaced[0].priority]
+                if replaced_queue is queue:
+                    queue[queue.index(replaced)] = entry
+                else:
+                    replaced_queue.remove(replaced)
+                    queue.append(entry)
+                replaced[1].set_result(False)
+                return
+        queue.append(entry)
+
+    def _discard(self, entry: Tuple[PendingCommand, asyncio.Future]) -> None:
+        """Forget a waiting command."""
+        command = entry[0]
+        queue = self._queues[command.priority]
+        if entry in queue:
+            queue.remove(entry)
+        if command.target is not None and self._targets.get(command.target) is entry:
+            del self._targets[command.target]
+
+    def release(self) -> None:
+        """Free a send slot and grant it to the next command."""
+        self.active -= 1
+        while self.active < self.window:
+            entry = self._next()
+            if entry is None:
+                return
+            command, waiter = entry
+            if command.target is not None and self._targets.get(command.target) is entry:
+                del self._targets[command.target]
+            if waiter.done():
+                continue
+            self.active += 1
+            self.served[command.priority] += 1
+            waiter.set_result(True)
+
+    def _next(self) -> Optional[Tuple[PendingCommand, asyncio.Future]]:
+        """Pop the next command: oldest starving one, else highest class."""
+        heads = [queue for queue in self._queues.values() if queue]
+        if not heads:
+            return None
+        oldest = min(heads, key=lambda queue: queue[0][0].created)
+        if (
+            oldest is not heads[0]
+            and time.monotonic() - oldest[0][0].created > self.starvation_timeout
+        ):
+            self.promoted += 1
+            return oldest.popleft()
+        return heads[0].popleft()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return queue statistics as a plain dict."""
+        return {
+            "active": self.active,
+            "waiting": {
+                priority: len(queue) for priority, queue in self._queues.items()
+            },
+            "served": dict(self.served),
+            "promoted": self.promoted,
+            "coalesced": self.coalesced,
+        }
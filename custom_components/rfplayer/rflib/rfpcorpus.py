@@ -0,0 +1,205 @@
+"""Synthetic gateway frames for every protocol and infotype.
+
+Builds `ZIA33` JSON frames shaped like the ones the RFPlayer sends, for
+the emulator (rfpemulator) and the decoder benchmarks.
+"""
+
+import json
+import random
+from typing import Any, Dict, List, Tuple
+
+# infoTypes each protocol is received with
+PROTOCOL_INFOTYPES = {
+    "X10": ["0"],
+    "VISONIC": ["2"],
+    "BLYSS": ["1"],
+    "CHACON": ["1"],
+    "OREGON": ["4", "5", "6", "7", "9"],
+    "DOMIA": ["0"],
+    "OWL": ["8"],
+    "X2D": ["10", "11"],
+    "RTS": ["3"],
+    "KD101": ["1"],
+    "PARROT": ["0"],
+    "TIC": ["13"],
+    "FS20": ["1"],
+    "JAMMING": ["0"],
+    "EDISIO": ["15"],
+}
+
+PROTOCOL_NUMBERS = {
+    "X10": 1,
+    "VISONIC": 2,
+    "BLYSS": 3,
+    "CHACON": 4,
+    "OREGON": 5,
+    "DOMIA": 6,
+    "OWL": 7,
+    "X2D": 8,
+    "RTS": 9,
+    "KD101": 10,
+    "PARROT": 11,
+    "TIC": 13,
+    "FS20": 14,
+    "JAMMING": 15,
+    "EDISIO": 16,
+}
+
+FREQUENCIES = {"VISONIC": "868950", "X2D": "868350", "FS20": "868350", "EDISIO": "868300"}
+
+ON_OFF = [("0", "OFF"), ("1", "ON")]
+RTS_QUALIFIERS = [("1", "Down"), ("7", "Up"), ("4", "My")]
+EDISIO_COMMANDS = [("1", "ON"), ("2", "OFF"), ("3", "TOGGLE"), ("10", "SHUTTER_OPEN")]
+
+
+def _measures(*measures: Tuple[str, Any, str]) -> List[Dict[str, str]]:
+    return [{"type": kind, "value": str(value), "unit": unit} for kind, value, unit in measures]
+
+
+def _oregon(device: int, rng: random.Random, id_phy: str, measures: list) -> Dict[str, Any]:
+    return {
+        "subType": "0",
+        "id_PHY": "0x1A2D",
+        "id_PHYMeaning": id_phy,
+        "adr_channel": str(device),
+        "adr": str(device >> 8),
+        "channel": str(device & 0xFF),
+        "qualifier": str(rng.choice([32, 33])),
+        "lowBatt": str(rng.randint(0, 1)),
+        "measures": measures,
+    }
+
+
+def synthetic_infos(info_type: str, device: int, rng: random.Random) -> Dict[str, Any]:
+    """Return the infos object of one frame."""
+    if info_type == "0":
+        sub_type, _ = rng.choice(ON_OFF)
+        return {"subType": sub_type, "id": str(device)}
+    if info_type == "1":
+        sub_type, meaning = rng.choice(ON_OFF)
+        return {"subType": sub_type, "subTypeMeaning": meaning, "id": str(device)}
+    if info_type == "2":
+        return {
+            "subType": "0",
+            "subTypeMeaning": "Detector/Sensor",
+            "id": str(device),
+            "qualifier": str(rng.choice([0, 4, 8])),
+            "qualifierMeaning": {"flags": ["Alarm"]},
+        }
+    if info_type == "3":
+        qualifier, meaning = rng.choice(RTS_QUALIFIERS)
+        return {
+            "subType": "0",
+            "subTypeMeaning": "Shutter",
+            "id": str(device),
+            "qualifier": qualifier,
+            "qualifierMeaning": meaning,
+        }
+    if info_type == "4":
+        return _oregon(device, rng, "THGR122/228/238/268", _measures(
+            ("temperature", f"{rng.uniform(-10, 35):+.1f}", "Celsius"),
+            ("hygrometry", rng.randint(20, 90), "%"),
+        ))
+    if info_type == "5":
+        return _oregon(device, rng, "BTHR918N", _measures(
+            ("temperature", f"{rng.uniform(-10, 35):+.1f}", "Celsius"),
+            ("hygrometry", rng.randint(20, 90), "%"),
+            ("pressure", rng.randint(980, 1040), "hPa"),
+        ))
+    if info_type == "6":
+        return _oregon(device, rng, "WGR800", _measures(
+            ("speed", f"{rng.uniform(0, 20):.1f}", "m/s"),
+            ("direction", rng.randint(0, 359), "degree"),
+        ))
+    if info_type == "7":
+        return _oregon(device, rng, "UVN800", _measures(("uv", f"{rng.uniform(0, 10):.1f}", "")))
+    if info_type == "8":
+        return _oregon(device, rng, "CM119/CM160", _measures(
+            ("energy", rng.randint(0, 10 ** 6), "wh"),
+            ("power", rng.randint(0, 6000), "W"),
+            ("P1", rng.randint(0, 2000), "W"),
+            ("P2", rng.randint(0, 2000), "W"),
+            ("P3", rng.randint(0, 2000), "W"),
+        ))
+    if info_type == "9":
+        infos = _oregon(device, rng, "PCR800", _measures(
+            ("TotalRain", f"{rng.uniform(0, 500):.1f}", "mm"),
+            ("Rain", f"{rng.uniform(0, 20):.1f}", "mm/h"),
+        ))
+        infos["id_channel"] = infos.pop("adr_channel")
+        return infos
+    if info_type in ("10", "11"):
+        infos = {
+            "subType": "0",
+            "subTypeMeaning": "",
+            "id": str(device),
+            "qualifier": "0",
+            "qualifierMeaning": {"flags": ["LowBatt"]} if info_type == "11" else {},
+            "functionMeaning": "Thermostat",
+            "stateMeaning": rng.choice(["ECO", "CONFORT", "HORS GEL"]),
+            "modeMeaning": "Auto",
+        }
+        for data in ("d0", "d1", "d2", "d3"):
+            infos[data] = str(rng.randint(0, 255))
+        return infos
+    if info_type == "13":
+        return {
+            "subType": "0",
+            "id": str(device),
+            "qualifier": "0",
+            "measures": _measures(
+                ("cnt1", rng.randint(0, 10 ** 7), "Wh"),
+                ("cnt2", rng.randint(0, 10 ** 7), "Wh"),
+                ("power", rng.randint(0, 9000), "W"),
+            ),
+        }
+    if info_type == "15":
+        sub_type, meaning = rng.choice(EDISIO_COMMANDS)
+        return {
+            "subType": sub_type,
+            "subTypeMeaning": meaning,
+            "id": str(device),
+            "qualifier": str(rng.randint(1, 8)),
+            "infoMeaning": rng.choice(["EMITRBTN,3.0V", "EMITSRE,2.9V"]),
+            "add0": "0",
+            "add1": "0",
+        }
+    raise ValueError(f"no synthetic infos for infoType {info_type}")
+
+
+def synthetic_frame(
+    protocol: str, info_type: str, device: int, rng: random.Random = random
+) -> str:
+    """Return one ZIA33 JSON frame, without terminator."""
+    rf_level = rng.randint(-100, -40)
+    frame = {
+        "frame": {
+            "header": {
+                "frameType": "0",
+                "cluster": "0",
+                "dataFlag": "1" if protocol in FREQUENCIES else "0",
+                "rfLevel": str(rf_level),
+                "floorNoise": str(rng.randint(-110, -95)),
+                "rfQuality": str(max(1, min(10, (rf_level + 110) // 7))),
+                "protocol": str(PROTOCOL_NUMBERS[protocol]),
+                "protocolMeaning": protocol,
+                "infoType": info_type,
+                "frequency": FREQUENCIES.get(protocol, "433920"),
+            },
+            "infos": synthetic_infos(info_type, device, rng),
+        }
+    }
+    return "ZIA33" + json.dumps(frame)
+
+
+def synthetic_corpus(
+    devices: int = 4, seed: int = 0
+) -> List[Tuple[str, str, str]]:
+    """Return (protocol, infoType, frame) for every protocol and infotype."""
+    rng = random.Random(seed)
+    return [
+        (protocol, info_type, synthetic_frame(protocol, info_type, device, rng))
+        for protocol, info_types in PROTOCOL_INFOTYPES.items()
+        for info_type in info_types
+        for device in range(1000, 1000 + devices)
+    ]
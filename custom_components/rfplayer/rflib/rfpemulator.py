@@ -0,0 +1,202 @@
+"""Pseudo terminal emulating an RFPlayer gateway.
+
+The emulator opens a pty whose slave path can be given to
+`create_rfplayer_connection` like a real `/dev/ttyUSB*`. It answers
+HELLO, PING and STATUS, records every other command (the gateway sends no
+reply to RF commands, set `ack_commands` for a `ZIA--` line anyway) and
+sends synthetic frames of every protocol at the configured rate:
+
+    python -m rflib.rfpemulator --rate 50 --devices 20
+"""
+
+import argparse
+import asyncio
+from collections import deque
+import logging
+import os
+import random
+import tty
+from typing import Deque, List, Optional, Sequence, Tuple
+
+from .rfpcorpus import PROTOCOL_INFOTYPES, synthetic_frame
+
+log = logging.getLogger(__name__)
+
+HELLO_RESPONSE = "Welcome to Ziblue Dongle RFPLAYER (RFP1000, Firmware V1.37 Mac 0xF6C09FA1)"
+COMMAND_HISTORY = 1024
+
+
+class RfplayerEmulator:
+    """Fake gateway behind a pseudo terminal."""
+
+    def __init__(
+        self,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        rate: float = 10.0,
+        devices: int = 4,
+        protocols: Optional[Sequence[str]] = None,
+        seed: Optional[int] = None,
+        ack_commands: bool = False,
+    ) -> None:
+        """Initialize emulator, `rate` in frames per second, 0 for none."""
+        self.loop = loop or asyncio.get_event_loop()
+        self.rate = rate
+        self.devices = devices
+        self.ack_commands = ack_commands
+        self.sources = [
+            (protocol, info_type)
+            for protocol in (protocols or PROTOCOL_INFOTYPES)
+            for info_type in PROTOCOL_INFOTYPES[protocol]
+        ]  # type: List[Tuple[str, str]]
+        self.random = random.Random(seed)
+        self.frame_format = "JSON"
+        self.commands = deque(maxlen=COMMAND_HISTORY)  # type: Deque[str]
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.path = None  # type: Optional[str]
+        self._master = None  # type: Optional[int]
+        self._slave = None  # type: Optional[int]
+        self._buffer = b""
+        self._traffic = None  # type: Optional[asyncio.Task]
+
+    async def __aenter__(self) -> "RfplayerEmulator":
+        """Start emulator."""
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Stop emulator."""
+        self.stop()
+
+    def start(self) -> str:
+        """Open the pty and start traffic, return the device path."""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+        self.loop.add_reader(self._master, self._read)
+        if self.rate > 0 and self.sources:
+            self._traffic = self.loop.create_task(self._send_traffic())
+        log.info("RFPlayer emulator on %s", self.path)
+        return self.path
+
+    def stop(self) -> None:
+        """Stop traffic and close the pty."""
+        if self._traffic is not None:
+            self._traffic.cancel()
+            self._traffic = None
+        if self._master is not None:
+            self.loop.remove_reader(self._master)
+            os.close(self._master)
+            os.close(self._slave)
+            self._master = self._slave = None
+
+    def write_line(self, line: str) -> bool:
+        """Send one line to the host, False if the pty buffer is full."""
+        try:
+            os.write(self._master, line.encode() + b"\n\r")
+        except (BlockingIOError, OSError):
+            return False
+        return True
+
+    def send_frame(self) -> None:
+        """Send one synthetic frame from a random device."""
+        protocol, info_type = self.random.choice(self.sources)
+        device = 1000 + self.random.randrange(self.devices)
+        if self.write_line(synthetic_frame(protocol, info_type, device, self.random)):
+            self.frames_sent += 1
+        else:
+            self.frames_dropped += 1
+
+    async def _send_traffic(self) -> None:
+        interval = 1 / self.rate
+        next_frame = self.loop.time()
+        while True:
+            self.send_frame()
+            next_frame += interval
+            delay = next_frame - self.loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -1:
+                # host can not keep up, do not burst to catch up
+                next_frame = self.loop.time()
+                await asyncio.sleep(0)
+
+    def _read(self) -> None:
+        try:
+            data = os.read(self._master, 4096)
+        except OSError:
+            return
+        self._buffer += data
+        *lines, self._buffer = self._buffer.replace(b"\r", b"\n").split(b"\n")
+        for line in lines:
+            if line:
+                self.handle_line(line.decode(errors="replace"))
+
+    def handle_line(self, line: str) -> None:
+        """Handle one command line sent by the host."""
+        if not line.startswith("ZIA++"):
+            log.debug("emulator ignoring %s", line)
+            return
+        commands = line[5:].split(".")
+        first = commands[0].split(" ", 1)
+        # `1 FORMAT JSON . RECEIVER + *`: leading sequence number
+        if len(first) == 2 and first[0].isdigit():
+            commands[0] = first[1]
+        for command in commands:
+            command = command.strip()
+            if command:
+                self.handle_command(command)
+
+    def handle_command(self, command: str) -> None:
+        """Answer one gateway command."""
+        words = command.split()
+        keyword = words[0].upper()
+        self.commands.append(command)
+        if keyword == "HELLO":
+            self.write_line("ZIA--" + HELLO_RESPONSE)
+        elif keyword == "PING":
+            self.write_line("ZIA--PONG")
+        elif keyword == "STATUS":
+            self.write_line(
+                f"ZIA--Status: format {self.frame_format}, frames sent {self.frames_sent},"
+                f" commands received {len(self.commands)}"
+            )
+        elif keyword == "FORMAT" and len(words) > 1:
+            self.frame_format = words[1].upper()
+            if self.frame_format != "JSON":
+                log.warning("emulator only sends JSON frames, not %s", self.frame_format)
+        elif self.ack_commands:
+            self.write_line("ZIA--OK " + command)
+
+
+def main() -> None:
+    """Run an emulator until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rate", type=float, default=10.0, help="frames per second")
+    parser.add_argument("--devices", type=int, default=4, help="devices per protocol")
+    parser.add_argument("--protocol", action="append", help="protocol to emulate, repeatable")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--ack-commands", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run() -> None:
+        async with RfplayerEmulator(
+            rate=args.rate,
+            devices=args.devices,
+            protocols=args.protocol,
+            seed=args.seed,
+            ack_commands=args.ack_commands,
+        ) as emulator:
+            print(emulator.path, flush=True)
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
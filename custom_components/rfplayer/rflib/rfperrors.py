@@ -0,0 +1,107 @@
+"""Rate limited reporting of decoding errors.
+
+A device the gateway hears but no decoder handles, or a frame a decoder
+fails on, repeats with every transmission of the device. The first error
+of each (protocol, kind) is logged in full, with its traceback; the next
+ones are only counted and reported by one summary line per
+SUMMARY_INTERVAL. Once started on an event loop, the summary is written
+every interval even if no error follows a burst, and on stop.
+"""
+
+import asyncio
+from datetime import timedelta
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+SUMMARY_INTERVAL = timedelta(minutes=5)
+
+ErrorKey = Tuple[str, str]
+
+
+class ErrorAggregator:
+    """Log the first error of a kind, count and summarize the others."""
+
+    def __init__(self, interval: timedelta = SUMMARY_INTERVAL) -> None:
+        """Initialize without any error seen."""
+        self.interval = interval.total_seconds()
+        self.totals = {}  # type: Dict[ErrorKey, int]
+        self.pending = {}  # type: Dict[ErrorKey, int]
+        self._summarized = time.monotonic()
+        self._timer = None  # type: Optional[asyncio.TimerHandle]
+
+    def report(
+        self,
+        logger: logging.Logger,
+        protocol: str,
+        kind: str,
+        msg: str,
+        *args: Any,
+        exc_info: Optional[BaseException] = None,
+    ) -> None:
+        """Report an error of kind on a frame of protocol.
+
+        msg and args are only formatted, and the traceback of exc_info
+        only printed, the first time (protocol, kind) is reported.
+        """
+        key = (protocol, kind)
+        totals = self.totals
+        if key not in totals:
+            totals[key] = 1
+            logger.error(msg, *args, exc_info=exc_info)
+            return
+        totals[key] += 1
+        self.pending[key] = self.pending.get(key, 0) + 1
+        if time.monotonic() - self._summarized >= self.interval:
+            self.summarize()
+
+    def summarize(self) -> None:
+        """Log errors counted since the previous summary."""
+        now = time.monotonic()
+        elapsed = now - self._summarized
+        self._summarized = now
+        if not self.pending:
+            return
+        log.warning(
+            "%d repeated decoding errors in the last %d s: %s",
+            sum(self.pending.values()),
+            elapsed,
+            ", ".join(
+                f"{protocol} {kind} x{count}"
+                for (protocol, kind), count in self.pending.items()
+            ),
+        )
+        self.pending.clear()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Summarize every interval from loop."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(self.interval, self._summarize_later, loop)
+
+    def _summarize_later(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._timer = None
+        self.summarize()
+        self.start(loop)
+
+    def stop(self) -> None:
+        """Stop the periodic summary and summarize errors still pending."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.summarize()
+
+    def clear(self) -> None:
+        """Forget every error, the next ones are logged in full again."""
+        self.totals.clear()
+        self.pending.clear()
+
+    def as_dict(self) -> Dict[str, int]:
+        """Return number of errors per protocol and kind."""
+        return {f"{protocol} {kind}": count for (protocol, kind), count in self.totals.items()}
+
+
+# Aggregator shared by the parser, the decoders registry and the protocol
+ERRORS = ErrorAggregator()
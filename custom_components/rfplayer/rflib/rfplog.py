@@ -0,0 +1,72 @@
+"""Lazy, sampled debug logging of the receive path.
+
+Debug records of the receive path are written for one frame in
+`sample_every` of each protocol, so debug logging can stay enabled on a
+busy gateway. The protocol takes the decision once per raw frame, from
+the protocol named in the frame (`TRACE.frame`), and frames it rejects
+are never traced (`TRACE.skip`); the records of every stage handling the
+frame (decoders, events, Home Assistant callback) then follow it
+(`TRACE.debug`). Arguments are formatted by logging, only when a record
+is emitted: pass objects, not str() of them, and wrap expensive values
+in `lazy`.
+"""
+
+import logging
+from typing import Any, Callable, Dict
+
+log = logging.getLogger(__package__)
+
+TRACE_SAMPLE_EVERY = 1
+
+
+class lazy:
+    """Argument of a log record computed only when it is formatted."""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func: Callable[..., Any], *args: Any) -> None:
+        """Store the call computing the value."""
+        self.func = func
+        self.args = args
+
+    def __str__(self) -> str:
+        """Compute and format the value."""
+        return str(self.func(*self.args))
+
+
+class FrameTrace:
+    """Sample frames per protocol and log their debug records."""
+
+    def __init__(self, sample_every: int = TRACE_SAMPLE_EVERY) -> None:
+        """Initialize without any frame seen."""
+        self.sample_every = sample_every
+        self.sampled = False
+        self._counts = {}  # type: Dict[str, int]
+
+    def frame(self, protocol: str) -> bool:
+        """Start a frame of protocol, return True if it is traced."""
+        if not log.isEnabledFor(logging.DEBUG):
+            self.sampled = False
+            return False
+        count = self._counts.get(protocol, 0)
+        self._counts[protocol] = count + 1
+        self.sampled = count % self.sample_every == 0
+        return self.sampled
+
+    def skip(self) -> None:
+        """Start a frame that is not traced."""
+        self.sampled = False
+
+    def debug(self, logger: logging.Logger, msg: str, *args: Any) -> None:
+        """Log a debug record if the current frame is traced."""
+        if self.sampled:
+            logger.debug(msg, *args)
+
+    def clear(self) -> None:
+        """Restart sampling of every protocol."""
+        self._counts.clear()
+        self.sampled = False
+
+
+# Trace shared by the parser, the protocol and the Home Assistant side
+TRACE = FrameTrace()
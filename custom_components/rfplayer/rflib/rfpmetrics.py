@@ -0,0 +1,77 @@
+"""Counters of the receive and command pipelines.
+
+Counters are plain attributes incremented where the frame, event or
+command is handled, so counting costs one attribute update. Values that
+are a state rather than a count (queue depths) are gauges: callables
+registered by the owner of the state and read only when the metrics are.
+
+    frames_received        frames split from the serial stream
+    frames_dropped         frames rejected by valid_packet or not utf-8
+    decode_failures        frames a decoder failed on, per protocol
+    events_emitted         events passed to the event callback
+    events_ignored         events matching an ignore pattern
+    events_repeated        events suppressed by the repeat filter
+    unknown_device_events  events of unknown devices, automatic add disabled
+    commands_sent          commands written to a gateway
+    reconnects             connections lost and retried
+"""
+
+from collections import Counter
+from typing import Any, Callable, Dict
+
+COUNTERS = (
+    "frames_received",
+    "frames_dropped",
+    "events_emitted",
+    "events_ignored",
+    "events_repeated",
+    "unknown_device_events",
+    "commands_sent",
+    "reconnects",
+)
+
+# decode_failures key of frames failing before their protocol is known
+UNPARSED_PROTOCOL = "unparsed"
+
+
+class Metrics:
+    """Registry of pipeline counters and gauges."""
+
+    __slots__ = COUNTERS + ("decode_failures", "gauges")
+
+    def __init__(self) -> None:
+        """Initialize counters to zero, without gauges."""
+        self.decode_failures = Counter()  # type: Counter
+        self.gauges = {}  # type: Dict[str, Callable[[], Any]]
+        self.clear()
+
+    def decode_failed(self, protocol: str) -> None:
+        """Count a frame of protocol that failed decoding."""
+        self.decode_failures[protocol] += 1
+
+    def register_gauge(self, name: str, gauge: Callable[[], Any]) -> None:
+        """Register a callable returning the current value of name."""
+        self.gauges[name] = gauge
+
+    def unregister_gauge(self, name: str) -> None:
+        """Remove a gauge."""
+        self.gauges.pop(name, None)
+
+    def clear(self) -> None:
+        """Reset every counter, gauges are kept."""
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.decode_failures.clear()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return counters and current gauge values as a plain dict."""
+        metrics = {name: getattr(self, name) for name in COUNTERS}  # type: Dict[str, Any]
+        metrics["decode_failures"] = dict(self.decode_failures)
+        metrics["decode_failures_total"] = sum(self.decode_failures.values())
+        for name, gauge in self.gauges.items():
+            metrics[name] = gauge()
+        return metrics
+
+
+# Metrics shared by the protocol, the parser and the Home Assistant side
+METRICS = Metrics()
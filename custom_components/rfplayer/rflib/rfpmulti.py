@@ -0,0 +1,297 @@
+"""Receive and send through several gateways as a single one.
+
+Each gateway keeps its own connection and protocol instance. Packets they
+decode go through a `PacketMerger`: copies of the same frame heard by
+several gateways within `DEDUP_WINDOW` are merged and only the copy with
+the best link (rfQuality, then rfLevel) reaches the event pipeline. Link
+quality per device and gateway is kept in a `LinkTable`, used to send each
+RF command through the gateway that hears the target device best.
+"""
+
+import asyncio
+from datetime import timedelta
+import logging
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .rfpcommand import command_target
+from .rfpparser import PACKET_ID_SEP, KnownDevices, PacketType, serialize_packet_id
+from .rfpprotocol import REPEAT_WINDOW, EventHandling, RepeatFilter
+
+log = logging.getLogger(__name__)
+
+DEDUP_WINDOW = timedelta(milliseconds=100)
+
+LINK_MAX_AGE = timedelta(hours=1)
+LINK_TABLE_SIZE = 1024
+
+# Header fields that differ between gateways hearing the same frame
+SIGNAL_FIELDS = frozenset(["rfLevel", "floorNoise", "rfQuality"])
+
+NO_LINK = (-1, -128)
+
+LinkScore = Tuple[int, int]
+
+
+def link_score(packet: PacketType) -> LinkScore:
+    """Return (rfQuality, rfLevel) of a packet, higher is better."""
+    try:
+        return (int(packet.get("rfQuality")), int(packet.get("rfLevel")))
+    except (TypeError, ValueError):
+        return NO_LINK
+
+
+def frame_key(packet: PacketType) -> Hashable:
+    """Return a key identical for copies of one frame."""
+    items = tuple(
+        (field, value) for field, value in packet.items() if field not in SIGNAL_FIELDS
+    )
+    try:
+        hash(items)
+    except TypeError:
+        return repr(items)
+    return items
+
+
+class LinkTable:
+    """Last link score of every device, per gateway."""
+
+    __slots__ = ("max_age", "size", "_links")
+
+    def __init__(self, max_age: timedelta = LINK_MAX_AGE, size: int = LINK_TABLE_SIZE) -> None:
+        """Initialize empty table."""
+        self.max_age = max_age.total_seconds()
+        self.size = size
+        self._links = {}  # type: Dict[str, Dict[str, Tuple[LinkScore, float]]]
+
+    def record(self, device: str, receiver: str, score: LinkScore, now: float) -> None:
+        """Record a packet of device heard by receiver."""
+        links = self._links.pop(device, None)
+        if links is None:
+            links = {}
+            if len(self._links) >= self.size:
+                del self._links[next(iter(self._links))]
+        links[receiver] = (score, now)
+        self._links[device] = links
+
+    def best(self, device: str, receivers: List[str], now: float) -> Optional[str]:
+        """Return the receiver with the best recent link to device."""
+        best = None
+        best_score = NO_LINK
+        for receiver, (score, seen) in self._links.get(device, {}).items():
+            if receiver in receivers and now - seen < self.max_age and score > best_score:
+                best = receiver
+                best_score = score
+        return best
+
+    def get(self, device: str) -> Dict[str, LinkScore]:
+        """Return the link score of device per receiver."""
+        return {
+            receiver: score for receiver, (score, _) in self._links.get(device, {}).items()
+        }
+
+
+class PacketMerger:
+    """Merge copies of one frame heard by several gateways.
+
+    The first copy of a frame opens a `window` during which later copies
+    are only compared; when it closes, the copy with the best link is
+    handed to the protocol that received it, with the arrival time of the
+    first copy.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        links: LinkTable,
+        window: timedelta = DEDUP_WINDOW,
+    ) -> None:
+        """Initialize merger."""
+        self.loop = loop
+        self.links = links
+        self.window = window.total_seconds()
+        self.names = {}  # type: Dict[EventHandling, str]
+        self.merged = 0
+        self.emitted = 0
+        self._pending = {}  # type: Dict[Hashable, list]
+
+    def __call__(self, protocol: EventHandling, packet: PacketType) -> None:
+        """Add one packet received by protocol."""
+        score = link_score(packet)
+        self.links.record(
+            serialize_packet_id(packet),
+            self.names.get(protocol, ""),
+            score,
+            time.monotonic(),
+        )
+        key = frame_key(packet)
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = [
+                packet,
+                protocol,
+                score,
+                self.loop.call_later(self.window, self._flush, key),
+                protocol.arrival,
+            ]
+            return
+        self.merged += 1
+        if score > pending[2]:
+            pending[0:3] = [packet, protocol, score]
+
+    def _flush(self, key: Hashable) -> None:
+        """Hand the best copy of a frame to the event pipeline."""
+        packet, protocol, _, _, arrival = self._pending.pop(key)
+        self.emitted += 1
+        protocol.handle_merged_packet(packet, arrival)
+
+    def flush(self) -> None:
+        """Hand every pending frame to the event pipeline now."""
+        for key in list(self._pending):
+            self._pending[key][3].cancel()
+            self._flush(key)
+
+
+class ReceiverGroup:
+    """Several gateways used as one.
+
+    Gateways share one repeat filter of `repeat_window`, which replaces
+    their own, and one list of known devices so their events form a single
+    pipeline. Packet merging is only enabled with more than one gateway, a
+    single gateway adds no latency. RF commands go to the gateway with the
+    best recent link to the target device, the first gateway when none
+    heard it; other commands go to every gateway.
+    """
+
+    def __init__(
+        self,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        dedup_window: timedelta = DEDUP_WINDOW,
+        link_max_age: timedelta = LINK_MAX_AGE,
+        repeat_window: timedelta = REPEAT_WINDOW,
+    ) -> None:
+        """Initialize empty group."""
+        self.loop = loop or asyncio.get_event_loop()
+        self.receivers = {}  # type: Dict[str, Any]
+        self.repeat_filter = RepeatFilter(repeat_window)
+        self.links = LinkTable(link_max_age)
+        self.merger = PacketMerger(self.loop, self.links, dedup_window)
+        self.routed = {}  # type: Dict[str, int]
+        self._known_devices = None  # type: Optional[KnownDevices]
+
+    def __len__(self) -> int:
+        """Return number of connected gateways."""
+        return len(self.receivers)
+
+    def add(self, name: str, protocol: Any) -> None:
+        """Add a connected gateway."""
+        protocol.repeat_filter = self.repeat_filter
+        protocol.known_devices = self._known_devices
+        self.receivers[name] = protocol
+        self.merger.names[protocol] = name
+        self.routed.setdefault(name, 0)
+        self._update_merger()
+
+    def remove(self, name: str) -> None:
+        """Remove a disconnected gateway."""
+        protocol = self.receivers.pop(name, None)
+        if protocol is None:
+            return
+        self.merger.names.pop(protocol, None)
+        protocol.packet_merger = None
+        self._update_merger()
+
+    def _update_merger(self) -> None:
+        merger = self.merger if len(self.receivers) > 1 else None
+        if merger is None:
+            self.merger.flush()
+        for protocol in self.receivers.values():
+            protocol.packet_merger = merger
+
+    @property
+    def primary(self) -> Any:
+        """Return the first connected gateway."""
+        return next(iter(self.receivers.values()), None)
+
+    @property
+    def command_queue_depth(self) -> int:
+        """Return number of commands not written yet on any gateway.
+
+        Commands wait for their band (transmit scheduler), then for a send
+        slot (command queue), then for the transport (write queue).
+        """
+        return sum(
+            protocol.scheduler.waiting()
+            + len(protocol.command_queue)
+            + len(protocol.write_queue)
+            for protocol in self.receivers.values()
+        )
+
+    @property
+    def known_devices(self) -> Optional[KnownDevices]:
+        """Return devices accepted when automatic add is disabled."""
+        return self._known_devices
+
+    @known_devices.setter
+    def known_devices(self, known_devices: Optional[KnownDevices]) -> None:
+        """Share devices accepted by every gateway."""
+        self._known_devices = known_devices
+        for protocol in self.receivers.values():
+            protocol.known_devices = known_devices
+
+    def route(self, protocol: str, device: str) -> Optional[str]:
+        """Return the name of the gateway to send a command to device."""
+        names = list(self.receivers)
+        if not names:
+            return None
+        best = self.links.best(protocol + PACKET_ID_SEP + device, names, time.monotonic())
+        return best or names[0]
+
+    async def send_command_ack(
+        self,
+        protocol: str,
+        command: str,
+        device_address: str = None,
+        device_id: str = None,
+        timeout: Optional[float] = None,
+        priority: Optional[int] = None,
+    ) -> bool:
+        """Send command through the best gateway, or every gateway."""
+        if not self.receivers:
+            log.warning("no gateway connected to send %s %s", protocol, command)
+            return False
+        target = command_target(protocol, device_address, device_id)
+        if target is None:
+            names = list(self.receivers)
+        else:
+            names = [self.route(*target)]
+        results = await asyncio.gather(
+            *(
+                self.receivers[name].send_command_ack(
+                    protocol,
+                    command,
+                    device_address=device_address,
+                    device_id=device_id,
+                    timeout=timeout,
+                    priority=priority,
+                )
+                for name in names
+            )
+        )
+        for name in names:
+            self.routed[name] += 1
+        return all(results)
+
+    def handle_raw_packet(self, raw_packet: str) -> None:
+        """Inject a raw packet as received by the first gateway."""
+        if self.primary is not None:
+            self.primary.handle_raw_packet(raw_packet)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return group statistics as a plain dict."""
+        return {
+            "receivers": list(self.receivers),
+            "merged": self.merger.merged,
+            "emitted": self.merger.emitted,
+            "routed": dict(self.routed),
+        }
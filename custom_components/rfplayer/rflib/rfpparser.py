@@ -1,12 +1,27 @@
 """Parsers."""
 
+from bisect import bisect_left
+from collections.abc import Mapping
 from enum import Enum
 import json
 import logging
 import re
-from typing import Any, Callable, Dict, Generator, cast
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, Optional, Tuple, cast
 from .protocols import *
-import traceback
+from .rfpbinary import HEX_SYNC, decode_hex_packet
+from .rfperrors import ERRORS
+from .rfpmetrics import METRICS
+from .rfpregistry import DECODERS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 
 log = logging.getLogger(__name__)
 
@@ -111,6 +126,7 @@ PACKET_HEADER_RE = (
         [
             "ZIA--",  # command reply
             "ZIA33",  # json reply
+            HEX_SYNC,  # hex frame
         ]
     )
     + ")"
@@ -129,6 +145,50 @@ class PacketHeader(Enum):
     gateway = "20"
 
 
+JSON_OFFSET = len("ZIA33")
+
+_json_decoder = json.JSONDecoder()
+
+
+def _stdlib_loads(packet: str, offset: int) -> Any:
+    """Parse JSON starting at offset, without copying the frame."""
+    start = json.decoder.WHITESPACE.match(packet, offset).end()
+    return _json_decoder.raw_decode(packet, start)[0]
+
+
+def _orjson_loads(packet: str, offset: int) -> Any:
+    """Parse JSON starting at offset with orjson."""
+    return orjson.loads(packet[offset:])
+
+
+JSON_BACKENDS = {"json": _stdlib_loads}
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = _orjson_loads
+if msgspec is not None:
+    _msgspec_decode = msgspec.json.Decoder().decode
+
+    def _msgspec_loads(packet: str, offset: int) -> Any:
+        """Parse JSON starting at offset with msgspec."""
+        return _msgspec_decode(packet[offset:])
+
+    JSON_BACKENDS["msgspec"] = _msgspec_loads
+
+# Fastest available backend first
+json_backend = next(
+    name for name in ("orjson", "msgspec", "json") if name in JSON_BACKENDS
+)
+load_json = JSON_BACKENDS[json_backend]
+
+
+def set_json_backend(name: str) -> None:
+    """Select the JSON parser used for ZIA33 frames (json, orjson, msgspec)."""
+    global json_backend, load_json
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"JSON backend {name} not available")
+    json_backend = name
+    load_json = JSON_BACKENDS[name]
+
+
 def valid_packet(packet: str) -> bool:
     """Check if packet is valid."""
     return bool(packet_header_re.match(packet))
@@ -144,27 +204,190 @@ def decode_packet(packet: str) -> list:
         data["message"] = packet.replace("ZIA--", "")
         return [data]
 
-    # # Protocols
-    message = json.loads(packet.replace("ZIA33", ""))["frame"]
-    data["protocol"] = message["header"]["protocolMeaning"]
-    #log.debug("Packet : %s",packet)
+    if packet.startswith(HEX_SYNC):
+        return decode_hex_packet(packet, PacketHeader.gateway.name)
 
-    NewMotor=False
+    # # Protocols
+    message = load_json(packet, JSON_OFFSET)["frame"]
+    header = message["header"]
+    data["protocol"] = header["protocolMeaning"]
 
+    decoder = DECODERS.lookup(data["protocol"], header.get("infoType"))
+    if decoder is None:
+        return packets_found
 
     try:
-        packets_found.append(globals()["_".join([data["protocol"],"decode"])](data,message,PacketHeader.gateway.name))
-        NewMotor=True
+        packets_found.append(decoder(message,PacketHeader.gateway.name))
     except Exception as e:
-        log.error("Protocol %s not implemented : %s", str(data["protocol"]),str(e))
-        log.debug("Trace : %s",traceback.format_exc())
-        log.debug("Message : %s", str(message))
+        METRICS.decode_failed(data["protocol"])
+        ERRORS.report(
+            log,
+            data["protocol"],
+            type(e).__name__,
+            "Protocol %s decoding failed : %s, message: %s",
+            data["protocol"],
+            e,
+            message,
+            exc_info=e,
+        )
 
 #    #if packets_found==[None]:
 #    #    log.error("No packets found in %s", str(message))
 #    #log.debug("Packets Found : %s", str(packets_found))
     return packets_found
 
+FRAME_PROTOCOL_RE = r'"protocolMeaning"\s*:\s*"([^"]*)"'
+FRAME_INFOTYPE_RE = r'"infoType"\s*:\s*"?(\d+)'
+FRAME_ID_RE = r'"{}"\s*:\s*"?([^",}}\s]*)'
+
+frame_protocol_re = re.compile(FRAME_PROTOCOL_RE)
+frame_infotype_re = re.compile(FRAME_INFOTYPE_RE)
+
+# Infos field used as device id, "id" for the other infotypes
+INFOTYPE_ID_FIELDS = {
+    "4": "adr_channel",
+    "5": "adr_channel",
+    "6": "adr_channel",
+    "7": "adr_channel",
+    "8": "adr_channel",
+    "9": "id_channel",
+}
+
+frame_id_res = {
+    field: re.compile(FRAME_ID_RE.format(field))
+    for field in set(INFOTYPE_ID_FIELDS.values()) | {"id"}
+}
+
+
+def scan_frame(packet: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Pull protocolMeaning, infoType and device id out of a raw ZIA33 frame.
+
+    Cheap pre-scan used to reject frames before the full JSON decode,
+    returns None if the frame does not look like a ZIA33 device frame.
+    """
+    if not packet.startswith("ZIA33"):
+        return None
+    protocol = frame_protocol_re.search(packet)
+    info_type = frame_infotype_re.search(packet)
+    if protocol is None or info_type is None:
+        return None
+    info_type = info_type.group(1)
+    device_id = frame_id_res[INFOTYPE_ID_FIELDS.get(info_type, "id")].search(
+        packet
+    )
+    return (
+        protocol.group(1),
+        info_type,
+        device_id.group(1) if device_id is not None else None,
+    )
+
+
+def frame_protocol(packet: str) -> str:
+    """Return the protocol named in a raw frame, its header if none."""
+    protocol = frame_protocol_re.search(packet)
+    return protocol.group(1) if protocol is not None else packet[:5]
+
+
+class KnownDevices:
+    """Sorted set of frame ids (protocol_id) of configured devices.
+
+    A frame id matches when a known id starts with it, decoders may append
+    a suffix to the raw id (button letter or number).
+    """
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, frame_ids: Iterable[str] = ()) -> None:
+        """Initialize from frame ids."""
+        self._ids = sorted(set(frame_ids))
+
+    def __len__(self) -> int:
+        """Return number of known frame ids."""
+        return len(self._ids)
+
+    def add(self, frame_id: str) -> None:
+        """Add one frame id."""
+        index = bisect_left(self._ids, frame_id)
+        if index == len(self._ids) or self._ids[index] != frame_id:
+            self._ids.insert(index, frame_id)
+
+    def match(self, frame_id: str) -> bool:
+        """Check if a frame id belongs to a known device."""
+        index = bisect_left(self._ids, frame_id)
+        return index < len(self._ids) and self._ids[index].startswith(frame_id)
+
+
+SIGNAL_FIELDS_RE = r'"(rfLevel|floorNoise|rfQuality)"\s*:\s*("[^"]*"|-?\d+)'
+
+signal_fields_re = re.compile(SIGNAL_FIELDS_RE)
+
+DECODE_CACHE_SIZE = 128
+
+
+def split_signal_fields(packet: str) -> Tuple[str, Dict[str, Any]]:
+    """Split raw frame into a key without signal fields and their values."""
+    parts = signal_fields_re.split(packet)
+    signal = {}
+    for name, value in zip(parts[1::3], parts[2::3]):
+        signal[name] = value[1:-1] if value[0] == '"' else int(value)
+    return "".join(parts[0::3]), signal
+
+
+class DecodeCache:
+    """Bounded LRU of decoded packets in front of decode_packet.
+
+    Frames are keyed on their raw text without the volatile rfLevel,
+    floorNoise and rfQuality header fields. A hit returns copies of the
+    cached packets with the signal fields of the new frame patched in,
+    skipping the JSON parse and the protocol decoders. Frames decoding to
+    nothing are not cached, so each one is counted by METRICS and ERRORS.
+    """
+
+    __slots__ = ("size", "hits", "misses", "_packets")
+
+    def __init__(self, size: int = DECODE_CACHE_SIZE) -> None:
+        """Initialize empty cache."""
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._packets = {}  # type: Dict[str, list]
+
+    def __len__(self) -> int:
+        """Return number of cached frames."""
+        return len(self._packets)
+
+    def decode(self, packet: str) -> list:
+        """Decode packet, from cache when possible."""
+        if not packet.startswith("ZIA33"):
+            return decode_packet(packet)
+        key, signal = split_signal_fields(packet)
+        packets = self._packets
+        templates = packets.pop(key, None)
+        if templates is None:
+            self.misses += 1
+            templates = decode_packet(packet)
+            if not templates:
+                # failed or not implemented: decode again to report it again
+                return templates
+            packets[key] = templates
+            if len(packets) > self.size:
+                del packets[next(iter(packets))]
+            return [dict(template) if template else template for template in templates]
+        self.hits += 1
+        packets[key] = templates
+        decoded = []
+        for template in templates:
+            if template:
+                template = dict(template)
+                template.update(signal)
+            decoded.append(template)
+        return decoded
+
+    def clear(self) -> None:
+        """Drop every cached packet."""
+        self._packets.clear()
+
+
 def encode_packet(packet: PacketType) -> str:
     """Construct packet string from packet dictionary."""
     command = str(packet["command"]).upper()
@@ -225,43 +448,99 @@ def deserialize_packet_id(packet_id: str) -> Dict[str, str]:
     return packet
 
 
-def packet_events(packet: PacketType) -> Generator[PacketType, None, None]:
-    platform=None
-#    log.debug("packet:%s", str(packet))
-    """Handle packet events."""
-    field_abbrev = {
-        v: k
-        for k, v in sorted(
-            PACKET_FIELDS.items(), key=lambda x: (x[1], x[0]), reverse=True
-        )
-    }
+FIELD_ABBREV = {
+    v: k
+    for k, v in sorted(
+        PACKET_FIELDS.items(), key=lambda x: (x[1], x[0]), reverse=True
+    )
+}
 
+EVENT_FIELDS = frozenset(["id", "value", "unit", "platform", "protocol"])
+
+
+class PacketEvent(Mapping):
+    """One measure or command of a packet.
+
+    Read-only mapping with the keys of the former event dict: id, the
+    sensor field itself, value, unit, platform and protocol. Slots keep it
+    smaller and cheaper to build than a dict; use dict(event) to persist it.
+    """
+
+    __slots__ = ("id", "sensor", "value", "unit", "platform", "protocol")
+
+    def __init__(
+        self,
+        id: str,
+        sensor: str,
+        value: Any,
+        unit: Optional[str],
+        platform: Optional[str],
+        protocol: Optional[str],
+    ) -> None:
+        """Initialize event."""
+        self.id = id
+        self.sensor = sensor
+        self.value = value
+        self.unit = unit
+        self.platform = platform
+        self.protocol = protocol
+
+    def __getitem__(self, key: str) -> Any:
+        """Return field like the former event dict."""
+        if key == self.sensor:
+            return self.value
+        if key in EVENT_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        """Check field presence without raising."""
+        return key == self.sensor or key in EVENT_FIELDS
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate keys in the former event dict order."""
+        return iter(("id", self.sensor, "value", "unit", "platform", "protocol"))
+
+    def __len__(self) -> int:
+        """Return number of keys."""
+        return 6
+
+    def __repr__(self) -> str:
+        """Return dict like representation."""
+        return repr(dict(self))
+
+
+def event_frame_id(event: Mapping) -> Optional[str]:
+    """Return the frame id (protocol_id) an event id was built from."""
+    event_id = event.get("id") or ""
+    for key in event:
+        abbrev = FIELD_ABBREV.get(key)
+        if abbrev is None:
+            continue
+        suffix = abbrev + PACKET_ID_SEP + abbrev
+        if event_id.endswith(suffix):
+            return event_id[: -len(suffix)]
+    return None
+
+
+def packet_events(packet: PacketType) -> Generator[PacketEvent, None, None]:
+    """Handle packet events."""
+#    log.debug("packet:%s", str(packet))
     packet_id = serialize_packet_id(packet)
-    
-    events = {f: v for f, v in packet.items() if f in field_abbrev}
-    forceid=None
-    for f, v in packet.items():
-#        log.debug("f:%s,v:%s", f, v)
-        if f == "platform":
-            platform=v
-        if f == "protocol":
-            protocol=v
-        if f == "forceid" :
-            forceid=v
-    for sensor, value in events.items():
+    platform = packet.get("platform")
+    protocol = packet.get("protocol")
+    forceid = packet.get("forceid")
+
+    for sensor, value in packet.items():
+        abbrev = FIELD_ABBREV.get(sensor)
+        if abbrev is None:
+            continue
 #        log.debug("packet_events, sensor:%s,value:%s", sensor, value)
         unit = packet.get(sensor + "_unit", None)
-        
-        if forceid==None:
-            id=packet_id + field_abbrev[sensor] + PACKET_ID_SEP + field_abbrev[sensor]
-        else :
-            id=forceid
-            
-        yield {
-            "id": id,
-            sensor: value,
-            "value":value,
-            "unit": unit,
-            "platform": platform,
-            "protocol": protocol
-        }
+
+        if forceid is None:
+            id = packet_id + abbrev + PACKET_ID_SEP + abbrev
+        else:
+            id = forceid
+
+        yield PacketEvent(id, sensor, value, unit, platform, protocol)
@@ -1,26 +1,406 @@
 """Asyncio protocol implementation of RFplayer."""
 
 import asyncio
+from collections import deque
 from datetime import timedelta
-from fnmatch import fnmatchcase
+from fnmatch import translate
 from functools import partial
+from itertools import count
 import logging
-from typing import Any, Callable, Coroutine, Optional, Sequence, Tuple, Type
+import re
+import time
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Deque,
+    Generator,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
 
 from serial_asyncio import create_serial_connection
 
+from .rfpbinary import (
+    ASCII_QUALIFIER,
+    FRAME_HEADER_SIZE,
+    SYNC,
+    binary_frame_protocol,
+    decode_binary_packet,
+    is_binary_frame,
+)
+from .rfpcapture import FrameRecorder
+from .rfpcommand import (
+    DEFAULT_COMMAND_WINDOW,
+    PRIORITY_MAINTENANCE,
+    STARVATION_TIMEOUT,
+    CommandQueue,
+    CommandStatistics,
+    PendingCommand,
+    TransmitScheduler,
+    command_target,
+    command_keyword,
+    default_priority,
+    expects_response,
+    response_keyword,
+    response_keywords,
+)
+from .protocols import PROTOCOL_SPECS
 from .rfpparser import (
+    PACKET_ID_SEP,
+    DecodeCache,
+    KnownDevices,
+    PacketHeader,
     PacketType,
     decode_packet,
     encode_packet,
+    frame_protocol,
     packet_events,
+    scan_frame,
     valid_packet,
 )
+from .rfperrors import ERRORS
+from .rfplog import TRACE
+from .rfpmetrics import METRICS, UNPARSED_PROTOCOL, Metrics
+from .rfptrace import TRACER, PipelineTracer
 
 log = logging.getLogger(__name__)
 
 TIMEOUT = timedelta(seconds=5)
 
+REPEAT_WINDOW = timedelta(milliseconds=500)
+REPEAT_CACHE_SIZE = 256
+
+IGNORE_CACHE_SIZE = 1024
+
+# Largest single write, queued packets beyond it go in the next write
+WRITE_BATCH_SIZE = 1024
+
+GLOB_MAGIC = frozenset("*?[")
+
+# Protocols whose events get a fixed id, never rejected by the frame pre-filter
+FORCED_ID_PROTOCOLS = frozenset(
+    protocol for protocol, spec in PROTOCOL_SPECS.items() if spec.forceid
+)
+
+FRAME_TERMINATOR = b"\n\r"
+
+FRAME_FORMAT_JSON = "JSON"
+FRAME_FORMAT_HEX = "HEX"
+FRAME_FORMAT_BINARY = "BINARY"
+FRAME_FORMATS = [FRAME_FORMAT_JSON, FRAME_FORMAT_HEX, FRAME_FORMAT_BINARY]
+DEFAULT_FRAME_FORMAT = FRAME_FORMAT_JSON
+
+
+class FrameSplitter:
+    """Split a serial byte stream into frames terminated by `\\n\\r`.
+
+    Incoming chunks are appended to a bytearray and only the bytes not yet
+    scanned are searched for the terminator, so a burst of frames costs
+    linear time. Frames are handed out as memoryview slices of the buffer,
+    released as soon as the consumer asks for the next one.
+
+    With `binary` set, length prefixed binary frames (see rfpbinary) are
+    also cut out of the stream, header included, between ASCII lines.
+    """
+
+    __slots__ = ("_buffer", "_scan", "binary")
+
+    def __init__(self, binary: bool = False) -> None:
+        """Initialize empty buffer."""
+        self._buffer = bytearray()
+        self._scan = 0
+        self.binary = binary
+
+    def __len__(self) -> int:
+        """Return number of buffered bytes not yet framed."""
+        return len(self._buffer)
+
+    def _binary_end(self, start: int) -> int:
+        """Return end of a binary frame at start, 0 if none, -1 if incomplete."""
+        buffer = self._buffer
+        if buffer[start:start + 2] != SYNC:
+            return 0
+        if len(buffer) < start + FRAME_HEADER_SIZE:
+            return -1
+        if buffer[start + 2] == ASCII_QUALIFIER:
+            return 0
+        end = start + FRAME_HEADER_SIZE + (buffer[start + 3] | buffer[start + 4] << 8)
+        return end if end <= len(buffer) else -1
+
+    def feed(self, data: bytes) -> Generator[memoryview, None, None]:
+        """Append data and yield every complete frame (without terminator).
+
+        Frames are consumed as they are yielded: if the consumer raises,
+        the next feed() resumes after the frame it was given.
+        """
+        buffer = self._buffer
+        buffer += data
+        start = 0
+        view = memoryview(buffer)
+        try:
+            while True:
+                if self.binary:
+                    end = self._binary_end(start)
+                    if end < 0:
+                        break
+                    if end:
+                        frame = view[start:end]
+                        start = self._scan = end
+                        try:
+                            yield frame
+                        finally:
+                            frame.release()
+                        continue
+                end = buffer.find(FRAME_TERMINATOR, max(start, self._scan))
+                if end < 0:
+                    # a terminator may straddle two chunks, rescan its first byte
+                    self._scan = max(len(buffer) - 1, start)
+                    break
+                frame = view[start:end]
+                start = self._scan = end + len(FRAME_TERMINATOR)
+                try:
+                    yield frame
+                finally:
+                    frame.release()
+        finally:
+            view.release()
+            if start:
+                del buffer[:start]
+                self._scan -= start
+
+    def clear(self) -> None:
+        """Drop any buffered partial frame."""
+        self._buffer.clear()
+        self._scan = 0
+
+
+class RepeatFilter:
+    """Drop events repeated within a short time window.
+
+    RF remotes and sensors send each frame several times. An event is a
+    repeat when the same (id, value) pair was first seen less than `window`
+    seconds ago. Pairs are kept in an insertion ordered dict used as a
+    bounded LRU. Events of one packet share a timestamp and never suppress
+    each other.
+    """
+
+    __slots__ = ("window", "size", "suppressed", "_seen")
+
+    def __init__(self, window: timedelta = REPEAT_WINDOW, size: int = REPEAT_CACHE_SIZE) -> None:
+        """Initialize filter, a zero window disables it."""
+        self.window = window.total_seconds()
+        self.size = size
+        self.suppressed = 0
+        self._seen = {}  # type: dict
+
+    def __bool__(self) -> bool:
+        """Return True if filtering is enabled."""
+        return self.window > 0 and self.size > 0
+
+    def is_repeat(self, event_id: str, value: Any, now: float) -> bool:
+        """Check and record one event."""
+        key = (event_id, value)
+        seen = self._seen
+        try:
+            first = seen.pop(key, None)
+        except TypeError:
+            # unhashable value (debug payload), never suppressed
+            return False
+        if first is not None and 0 < now - first < self.window:
+            seen[key] = first
+            self.suppressed += 1
+            return True
+        seen[key] = now
+        if len(seen) > self.size:
+            del seen[next(iter(seen))]
+        return False
+
+    def clear(self) -> None:
+        """Forget every recorded event."""
+        self._seen.clear()
+
+
+class IgnoreMatcher:
+    """Match event ids against a list of fnmatch patterns.
+
+    Patterns are compiled once: plain ids go to a set, `prefix*` patterns
+    to a tuple checked with str.startswith, everything else into a single
+    regex. Decisions are memoized per event id in a bounded dict, rebuilt
+    whenever the pattern list changes.
+    """
+
+    __slots__ = ("patterns", "exact", "prefixes", "size", "_regex", "_decisions")
+
+    def __init__(self, patterns: Sequence[str] = (), size: int = IGNORE_CACHE_SIZE) -> None:
+        """Compile patterns."""
+        self.size = size
+        self.patterns = list(patterns)
+        exact = set()
+        prefixes = []
+        others = []
+        for pattern in self.patterns:
+            if not GLOB_MAGIC.intersection(pattern):
+                exact.add(pattern)
+            elif pattern.endswith("*") and not GLOB_MAGIC.intersection(pattern[:-1]):
+                prefixes.append(pattern[:-1])
+            else:
+                others.append(translate(pattern))
+        self.exact = frozenset(exact)
+        self.prefixes = tuple(prefixes)
+        self._regex = re.compile("|".join(others)) if others else None
+        self._decisions = {}  # type: dict
+
+    def __bool__(self) -> bool:
+        """Return True if there is any pattern."""
+        return bool(self.patterns)
+
+    def __call__(self, event_id: str) -> bool:
+        """Check if event id matches any pattern."""
+        decisions = self._decisions
+        decision = decisions.get(event_id)
+        if decision is None:
+            decision = (
+                event_id in self.exact
+                or event_id.startswith(self.prefixes)
+                or (self._regex is not None and self._regex.match(event_id) is not None)
+            )
+            if len(decisions) >= self.size:
+                del decisions[next(iter(decisions))]
+            decisions[event_id] = decision
+        return decision
+
+
+class WriteQueue:
+    """Outbound queue coalescing packets into as few writes as possible.
+
+    Packets queued during one event loop iteration are joined into a single
+    `transport.write`, up to `batch_size` bytes. While the transport has
+    paused writing (its buffer is above the high water mark) packets stay
+    queued and are flushed on resume. Queue depth and the time packets
+    waited before being written are kept to show transmit congestion.
+    """
+
+    __slots__ = (
+        "loop",
+        "batch_size",
+        "transport",
+        "paused",
+        "writes",
+        "packets",
+        "dropped",
+        "pauses",
+        "max_depth",
+        "last_wait",
+        "max_wait",
+        "_wait_sum",
+        "_queue",
+        "_handle",
+    )
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, batch_size: int = WRITE_BATCH_SIZE
+    ) -> None:
+        """Initialize empty queue."""
+        self.loop = loop
+        self.batch_size = batch_size
+        self.transport = None  # type: Optional[asyncio.WriteTransport]
+        self.paused = False
+        self.writes = 0
+        self.packets = 0
+        self.dropped = 0
+        self.pauses = 0
+        self.max_depth = 0
+        self.last_wait = None  # type: Optional[float]
+        self.max_wait = 0.0
+        self._wait_sum = 0.0
+        self._queue = deque()  # type: Deque[Tuple[bytes, float]]
+        self._handle = None  # type: Optional[asyncio.Handle]
+
+    def __len__(self) -> int:
+        """Return number of packets waiting to be written."""
+        return len(self._queue)
+
+    def attach(self, transport: asyncio.BaseTransport) -> None:
+        """Start writing to transport."""
+        self.transport = transport  # type: ignore
+        self.paused = False
+        self._schedule()
+
+    def put(self, data: bytes) -> None:
+        """Queue one encoded packet."""
+        self._queue.append((data, time.monotonic()))
+        if len(self._queue) > self.max_depth:
+            self.max_depth = len(self._queue)
+        self._schedule()
+
+    def pause(self) -> None:
+        """Stop writing until resumed."""
+        self.paused = True
+        self.pauses += 1
+
+    def resume(self) -> None:
+        """Resume writing queued packets."""
+        self.paused = False
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if (
+            self._handle is None
+            and self._queue
+            and not self.paused
+            and self.transport is not None
+        ):
+            self._handle = self.loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        """Write queued packets, one write per batch."""
+        self._handle = None
+        queue = self._queue
+        while queue and not self.paused and self.transport is not None:
+            batch = []
+            size = 0
+            now = time.monotonic()
+            while queue and (not batch or size + len(queue[0][0]) <= self.batch_size):
+                data, queued = queue.popleft()
+                batch.append(data)
+                size += len(data)
+                wait = now - queued
+                self._wait_sum += wait
+                if wait > self.max_wait:
+                    self.max_wait = wait
+                self.last_wait = wait
+            self.writes += 1
+            self.packets += len(batch)
+            # may call pause_writing, ending the loop
+            self.transport.write(b"".join(batch))
+
+    def clear(self) -> None:
+        """Drop queued packets and detach transport."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self.dropped += len(self._queue)
+        self._queue.clear()
+        self.transport = None
+
+    def as_dict(self) -> dict:
+        """Return queue statistics as a plain dict."""
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "paused": self.paused,
+            "pauses": self.pauses,
+            "writes": self.writes,
+            "packets": self.packets,
+            "dropped": self.dropped,
+            "last_wait": self.last_wait,
+            "max_wait": self.max_wait,
+            "average_wait": self._wait_sum / self.packets if self.packets else None,
+        }
+
 
 class ProtocolBase(asyncio.Protocol):
     """Manage low level rfplayer protocol."""
@@ -32,6 +412,11 @@ class ProtocolBase(asyncio.Protocol):
         loop: Optional[asyncio.AbstractEventLoop] = None,
         disconnect_callback: Optional[Callable[[Optional[Exception]], None]] = None,
         init_options: Optional[Sequence[dict]] = None,
+        frame_format: str = DEFAULT_FRAME_FORMAT,
+        write_batch_size: int = WRITE_BATCH_SIZE,
+        recorder: Optional[FrameRecorder] = None,
+        tracer: PipelineTracer = TRACER,
+        metrics: Metrics = METRICS,
         **kwargs: Any,
     ) -> None:
         """Initialize class."""
@@ -40,7 +425,13 @@ class ProtocolBase(asyncio.Protocol):
         else:
             self.loop = asyncio.get_event_loop()
         self.packet = ""
-        self.buffer = ""
+        self.frame_format = frame_format
+        self.buffer = FrameSplitter(binary=frame_format == FRAME_FORMAT_BINARY)
+        self.write_queue = WriteQueue(self.loop, write_batch_size)
+        self.recorder = recorder
+        self.tracer = tracer
+        self.arrival = 0
+        self.metrics = metrics
         self.packet_callback = None  # type: Optional[Callable[[PacketType], None]]
         self.disconnect_callback = disconnect_callback
 
@@ -55,49 +446,88 @@ class ProtocolBase(asyncio.Protocol):
         LBT Default value : 16dBm    Val : 6 à 30 dBm Le Rfplayer attendra ( maxi 3 sec) un silence avant d'envoyer des trames        
         """
         self.transport = transport
-        self.send_raw_packet("ZIA++HELLO")
+        self.write_queue.attach(transport)
+        self.send_startup_packet("ZIA++HELLO")
 ##        self.send_raw_packet("ZIA++FACTORYRESET")
 ##        self.send_raw_packet("ZIA++RECEIVER + *")
 ##        self.send_raw_packet("ZIA++FORMAT JSON")
 ##        self.send_raw_packet("ZIA++STATUS TXT") # si tu envoie la demande de status, il faut autoriser le log ?
         if self.init_options['START_COMMANDS']:
             for command in self.init_options['START_COMMANDS']:
-                self.send_raw_packet("ZIA++"+command)
+                self.send_startup_packet("ZIA++"+command)
+
+    def send_startup_packet(self, packet: str) -> None:
+        """Send a command of the connection setup."""
+        self.send_raw_packet(packet)
  
     def data_received(self, data: bytes) -> None:
         """Add incoming data to buffer."""
+        if not self.tracer.enabled:
+            self.handle_lines(data)
+            return
+        self.arrival = time.monotonic_ns()
         try:
-            decoded_data = data.decode()
-#             log.debug("data:", decoded_data)
-        except UnicodeDecodeError:
-            invalid_data = data.decode(errors="replace")
-            log.warning("Error during decode of data, invalid data: %s", invalid_data)
-        else:
-            log.debug("received data: %s", decoded_data.strip())
-            self.buffer += decoded_data
-            self.handle_lines()
+            self.handle_lines(data)
+        finally:
+            self.arrival = 0
 
-    def handle_lines(self) -> None:
+    def handle_lines(self, data: bytes = b"") -> None:
         """Assemble incoming data into per-line packets."""
-        while "\n\r" in self.buffer:
-            line, self.buffer = self.buffer.split("\n\r", 1)
+        binary = self.buffer.binary
+        recorder = self.recorder
+        tracer = self.tracer if self.tracer.enabled else None
+        metrics = self.metrics
+        for frame in self.buffer.feed(data):
+            metrics.frames_received += 1
+            if recorder is not None:
+                recorder.record(frame)
+            if binary and is_binary_frame(frame):
+                self.handle_binary_packet(frame)
+                continue
+            try:
+                line = str(frame, "utf-8")
+            except UnicodeDecodeError:
+                invalid_data = str(frame, "utf-8", errors="replace")
+                log.warning("Error during decode of data, invalid data: %s", invalid_data)
+                metrics.frames_dropped += 1
+                continue
             if valid_packet(line):
+                if tracer is not None:
+                    tracer.record_arrival("framing", self.arrival)
                 self.handle_raw_packet(line)
             else:
+                metrics.frames_dropped += 1
                 log.warning("dropping invalid data: %s", line) # Voir ZIA66 = reception trame EDISIOFRAME
 
     def handle_raw_packet(self, raw_packet: str) -> None:
         """Handle one raw incoming packet."""
         raise NotImplementedError()
 
+    def handle_binary_packet(self, frame: memoryview) -> None:
+        """Handle one binary incoming frame, only valid during the call."""
+        raise NotImplementedError()
+
     def send_raw_packet(self, packet: str) -> None:
-        """Encode and put packet string onto write buffer."""
+        """Encode and put packet string onto write queue."""
         data = bytes(packet + "\n\r", "utf-8")
-        log.debug("writing data: %s", repr(data))
-        self.transport.write(data)  # type: ignore
+        log.debug("writing data: %r", data)
+        self.write_queue.put(data)
+
+    def pause_writing(self) -> None:
+        """Hold outbound packets while the transport buffer is full."""
+        log.debug("transport paused writing, %d packets queued", len(self.write_queue))
+        self.write_queue.pause()
+
+    def resume_writing(self) -> None:
+        """Flush outbound packets held while paused."""
+        log.debug("transport resumed writing")
+        self.write_queue.resume()
 
     def connection_lost(self, exc: Optional[Exception]) -> None:
         """Log when connection is closed, if needed call callback."""
+        self.write_queue.clear()
+        if self.recorder is not None:
+            self.recorder.flush()
         if exc:
             log.exception("disconnected due to exception")
         else:
@@ -114,31 +544,64 @@ class PacketHandling(ProtocolBase):
         *args: Any,
         packet_callback: Optional[Callable[[PacketType], None]] = None,
         init_options: Optional[Sequence[dict]] = None,
+        decode_cache_size: int = 0,
         **kwargs: Any,
     ) -> None:
         """Add packethandling specific initialization.
         packet_callback: called with every complete/valid packet
         received.
+        decode_cache_size: number of distinct frames kept decoded, 0 (the
+        default) disables the cache, DECODE_CACHE_SIZE is a sensible size.
         """
         log.debug("PacketHandling")
         super().__init__(*args, **kwargs)
         self.init_options = init_options
         if packet_callback:
             self.packet_callback = packet_callback
+        self.decode_cache = DecodeCache(decode_cache_size) if decode_cache_size else None
+        self.decode_packet = self.decode_cache.decode if self.decode_cache is not None else decode_packet
+
+    def accept_raw_packet(self, raw_packet: str) -> bool:
+        """Check if a raw packet is worth decoding."""
+        return True
 
     def handle_raw_packet(self, raw_packet: str) -> None:
         """Parse raw packet string into packet dict."""
+        if not self.accept_raw_packet(raw_packet):
+            TRACE.skip()
+            return
+        TRACE.frame(frame_protocol(raw_packet))
         packets = []
+        started = time.monotonic_ns()
         try:
-            packets = decode_packet(raw_packet)
-        except BaseException:
-            log.exception("failed to parse packet data: %s", raw_packet)
+            packets = self.decode_packet(raw_packet)
+        except BaseException as exc:
+            self.metrics.decode_failed(UNPARSED_PROTOCOL)
+            ERRORS.report(
+                log,
+                UNPARSED_PROTOCOL,
+                type(exc).__name__,
+                "failed to parse packet data: %s",
+                raw_packet,
+                exc_info=exc,
+            )
+        if self.tracer.enabled:
+            self.tracer.record("decode", started)
+        TRACE.debug(log, "received frame: %s", raw_packet)
+        self.handle_packets(packets)
+
+    def handle_binary_packet(self, frame: memoryview) -> None:
+        """Parse binary frame into packet dict."""
+        TRACE.frame(binary_frame_protocol(frame))
+        self.handle_packets(decode_binary_packet(frame, PacketHeader.gateway.name))
 
+    def handle_packets(self, packets: list) -> None:
+        """Dispatch decoded packets to response or packet handling."""
         if packets:
             for packet in packets:
                 if packet != None:
                     #log.debug("decoded packet: %s", packet)
-                    if "ok" in packet:
+                    if "message" in packet:
 #                        # handle response packets internally
                         log.debug("command response: %s", packet)
                         self.handle_response_packet(packet)
@@ -146,7 +609,7 @@ class PacketHandling(ProtocolBase):
                         #log.debug("handle packet: %s", packet)
                         self.handle_packet(packet)
         else:
-            log.warning("no valid packet")
+            log.debug("no valid packet")
 
     def handle_packet(self, packet: PacketType) -> None:
         """Process incoming packet dict and optionally call callback."""
@@ -159,7 +622,6 @@ class PacketHandling(ProtocolBase):
 
     def handle_response_packet(self, packet: PacketType) -> None:
         """Handle response packet."""
-        raise NotImplementedError()
 
     def send_packet(self, fields: PacketType) -> None:
         """Concat fields and send packet to gateway."""
@@ -174,75 +636,107 @@ class PacketHandling(ProtocolBase):
         device_id: str = None,
     ) -> None:
         """Send device command to rfplayer gateway."""
+        packet = self.encode_command(protocol, command, device_address, device_id)
+        if packet is not None:
+            self.send_raw_packet(packet)
+
+    @staticmethod
+    def encode_command(
+        protocol: str,
+        command: str,
+        device_address: str = None,
+        device_id: str = None,
+    ) -> Optional[str]:
+        """Build the raw ZIA++ line for a device command, None if not sendable."""
         if device_id is not None:
  ###     La commande EDISIOFRAME avec ON ou OFF n'existe PAS MAIS ON PEUX ENVOYER avec PROTOCOL et ID [doit être la commande Hexa]
             if protocol == "EDISIOFRAME" : # A VOIR L'ENVOIE DEVRAIT ETRE DANS Commande ? INSTRUITE PLUS BAS !
-                self.send_raw_packet(f"ZIA++{protocol} {device_id}") # EST OK SI ID= commande HEXA !
+                return f"ZIA++{protocol} {device_id}" # EST OK SI ID= commande HEXA !
 
 ## modif envoie cde Protocol avec Jamming avec ID et ( commande ) Util si création !
             elif protocol == "JAMMING" :
                 if command == "ON" :
-                    self.send_raw_packet(f"ZIA++{protocol} {device_id}") # Permet d'avoir un ID qui représente le niveau
+                    return f"ZIA++{protocol} {device_id}" # Permet d'avoir un ID qui représente le niveau
                 elif command == "OFF" :
-                    self.send_raw_packet(f"ZIA++{protocol} 0")
+                    return f"ZIA++{protocol} 0"
                 else:
-                    self.send_raw_packet(f"ZIA++{protocol} {command} {device_id}") # dans le cas d'une commande depuis dévelopeur !
+                    return f"ZIA++{protocol} {command} {device_id}" # dans le cas d'une commande depuis dévelopeur !
 
 ## Peut servir pour le SIMULATE mettre dans Commande avec <delay> de  1 à 255 [secondes] Util si création !
             elif protocol == "JAMMING SIMULATE" :
                 if command == "ON" :
-                    self.send_raw_packet(f"ZIA++{protocol} {device_id}") # Permet d'avoir un ID qui représente le <delay>
+                    return f"ZIA++{protocol} {device_id}" # Permet d'avoir un ID qui représente le <delay>
                 elif command == "OFF" :
-                    self.send_raw_packet(f"ZIA++{protocol}") #Envoie le simulate avec réponse dans 5 sec si JAMMING "ON"
+                    return f"ZIA++{protocol}" #Envoie le simulate avec réponse dans 5 sec si JAMMING "ON"
                 else:
-                    self.send_raw_packet(f"ZIA++{protocol} {command} {device_id}") # dans le cas d'une commande depuis dévelopeur avec commande= SIMULATE !
+                    return f"ZIA++{protocol} {command} {device_id}" # dans le cas d'une commande depuis dévelopeur avec commande= SIMULATE !
 ## Test pour DOMIA ou chacon ID <256
             elif protocol == "DOMIA" or protocol == "CHACON" :
-                    self.send_raw_packet(f"ZIA++{command} {device_id} {protocol}") # Permet d'avoir un ID qui représente le N° du Bp Limité au 256 premier ID (FIRMWARE)
+                    return f"ZIA++{command} {device_id} {protocol}" # Permet d'avoir un ID qui représente le N° du Bp Limité au 256 premier ID (FIRMWARE)
             else :
-                self.send_raw_packet(f"ZIA++{command} ID {device_id} {protocol}")
+                return f"ZIA++{command} ID {device_id} {protocol}"
 
         elif device_address is not None:
             DIM_ADDON=""
             if command == "DIM" :
                 DIM_ADDON="%50"
-            self.send_raw_packet(f"ZIA++{command} {device_address} {protocol} {DIM_ADDON}")
+            return f"ZIA++{command} {device_address} {protocol} {DIM_ADDON}"
 
         elif protocol == "EDISIOFRAME":
-            self.send_raw_packet(f"ZIA++{protocol} {command}")
+            return f"ZIA++{protocol} {command}"
 
 ##bug jamming pas d'ID
 ## modif envoie cde Protocol sans ID si Jamming ( commande ) vient du développeur ! Util si création !
         else:
             if protocol == "JAMMING" :
                 if command == "ON" : #la cde n'existe pas vraiement , mais peut-être utilisé pour !
-                    self.send_raw_packet(f"ZIA++{protocol} 7")
+                    return f"ZIA++{protocol} 7"
                 elif command == "OFF" : #la cde n'existe pas vraiement , mais peut-être utilisé pour !
-                    self.send_raw_packet(f"ZIA++{protocol} 0")
+                    return f"ZIA++{protocol} 0"
                 else:
-                    self.send_raw_packet(f"ZIA++{protocol} {command}") # on peut mettre le niveau de détection de 0 à 10
+                    return f"ZIA++{protocol} {command}" # on peut mettre le niveau de détection de 0 à 10
 
 ## Peut servir pour le SIMULATE mettre dans Commande avec <delay> de  1 à 255 [secondes] Util si création !
 
             elif protocol == "JAMMING SIMULATE" :
                 if command == "ON" :
-                    self.send_raw_packet(f"ZIA++{protocol} 30") # Permet d'avoir un nbr qui représente le <delay> forcé ici 30sec
+                    return f"ZIA++{protocol} 30" # Permet d'avoir un nbr qui représente le <delay> forcé ici 30sec
                 elif command == "OFF" :
-                    self.send_raw_packet(f"ZIA++{protocol}") #Envoie le simulate avec réponse dans 5 sec si JAMMING [NIVEAU] "ON"
+                    return f"ZIA++{protocol}" #Envoie le simulate avec réponse dans 5 sec si JAMMING [NIVEAU] "ON"
 
             else :
-                self.send_raw_packet(f"ZIA++{command} {protocol}") #ATTENTION AU FORMAT DE LA COMMANDE !
+                return f"ZIA++{command} {protocol}" #ATTENTION AU FORMAT DE LA COMMANDE !
 
         """Les cde RECEIVER ET REPEATER peuvent être initiés dans commande avec signe + ou - et la sélection du protocol."""
+        return None
  
 class CommandSerialization(PacketHandling):
-    """Logic for ensuring asynchronous commands are sent in order."""
+    """Logic for ensuring asynchronous commands are sent in order.
+
+    Every command gets a sequence number and a future. Commands the gateway
+    answers (see `RESPONSE_COMMANDS`) stay in flight until the matching
+    `ZIA--` line arrives or `command_timeout` expires; at most
+    `command_window` commands are in flight at the same time. A reply is
+    matched to the oldest command in flight it answers (see
+    `response_keyword`); commands of the connection setup are in flight
+    too, so their replies cannot complete a user command. Commands get
+    their turn by priority class (see `CommandQueue`) and RF commands are
+    spaced by the transmit scheduler so each band stays within its duty
+    cycle. Commands wait for their band before taking a send slot, so a
+    band out of budget does not hold commands of the other band or gateway
+    commands; a command waiting for its band is replaced by a newer one for
+    the same device.
+    """
 
     def __init__(
         self,
         *args: Any,
         packet_callback: Optional[Callable[[PacketType], None]] = None,
         init_options: Optional[Sequence[dict]] = None,
+        command_window: int = DEFAULT_COMMAND_WINDOW,
+        command_timeout: timedelta = TIMEOUT,
+        transmit_scheduler: Optional[TransmitScheduler] = None,
+        starvation_timeout: timedelta = STARVATION_TIMEOUT,
         **kwargs: Any,
     ) -> None:
         """Add packethandling specific initialization."""
@@ -251,14 +745,48 @@ class CommandSerialization(PacketHandling):
         self.init_options = init_options
         if packet_callback:
             self.packet_callback = packet_callback
-        self._event = asyncio.Event()
-        self._lock = asyncio.Lock()
+        self._last_ack = None  # type: Optional[PacketType]
+        self.command_queue = CommandQueue(self.loop, command_window, starvation_timeout)
+        self._in_flight = deque()  # type: Deque[PendingCommand]
+        self._sequence = count(1)
+        self.command_timeout = command_timeout.total_seconds()
+        self.command_stats = CommandStatistics()
+        self.scheduler = transmit_scheduler or TransmitScheduler()
+
+    def send_startup_packet(self, packet: str) -> None:
+        """Send a setup command, its replies expected like a user command's."""
+        super().send_startup_packet(packet)
+        now = time.monotonic()
+        for keyword in response_keywords(packet):
+            pending = PendingCommand(
+                next(self._sequence),
+                packet,
+                self.loop.create_future(),
+                PRIORITY_MAINTENANCE,
+                response=keyword,
+            )
+            pending.sent = now
+            pending.deadline = now + self.command_timeout
+            self._in_flight.append(pending)
 
     def handle_response_packet(self, packet: PacketType) -> None:
-        """Handle response packet."""
+        """Match response packet with the oldest command in flight it answers."""
         log.debug("handle_response_packet")
         self._last_ack = packet
-        self._event.set()
+        now = time.monotonic()
+        in_flight = self._in_flight
+        for command in [command for command in in_flight if command.deadline < now]:
+            in_flight.remove(command)
+            command.resolve(False)
+        keyword = response_keyword(packet["message"])
+        for command in in_flight:
+            if command.response == keyword:
+                in_flight.remove(command)
+                self.command_stats.record_ack(now - command.sent)
+                command.resolve(True)
+                return
+        self.command_stats.unsolicited += 1
+        log.debug("unsolicited response: %s", packet)
 
     async def send_command_ack(
         self,
@@ -266,13 +794,68 @@ class CommandSerialization(PacketHandling):
         command: str,
         device_address: str = None,
         device_id: str = None,
+        timeout: Optional[float] = None,
+        priority: Optional[int] = None,
     ) -> bool:
         """Send command, wait for gateway to repond."""
-        async with self._lock:
-            self.send_command(protocol, command, device_address, device_id)
-            self._event.clear()
-#            # await self._event.wait()
-        return True
+        packet = self.encode_command(protocol, command, device_address, device_id)
+        if packet is None:
+            log.warning("no command to send for %s %s", protocol, command)
+            self.command_stats.failed += 1
+            return False
+        pending = PendingCommand(
+            next(self._sequence),
+            packet,
+            self.loop.create_future(),
+            default_priority(protocol) if priority is None else priority,
+            command_target(protocol, device_address, device_id),
+        )
+        # wait for the band first: only commands of a band out of budget wait
+        reservation = await self.scheduler.wait(protocol, pending.priority, pending.target)
+        if reservation is not None and reservation.replaced:
+            log.debug("command %s replaced by a newer one", pending)
+            return True
+        if reservation is not None and reservation.delay > 0:
+            log.debug(
+                "command %s delayed %.3fs by transmit scheduler", pending, reservation.delay
+            )
+        try:
+            acquired = await self.command_queue.acquire(pending)
+        except asyncio.CancelledError:
+            self.scheduler.release(reservation)
+            raise
+        if not acquired:
+            log.debug("command %s replaced by a newer one", pending)
+            self.scheduler.release(reservation)
+            return True
+        try:
+            self.send_raw_packet(packet)
+            pending.sent = time.monotonic()
+            self.command_stats.sent += 1
+            self.metrics.commands_sent += 1
+            if not expects_response(packet):
+                pending.resolve(True)
+                return True
+            timeout = self.command_timeout if timeout is None else timeout
+            pending.response = command_keyword(packet)
+            pending.deadline = pending.sent + timeout
+            self._in_flight.append(pending)
+            try:
+                return await asyncio.wait_for(pending.future, timeout)
+            except asyncio.TimeoutError:
+                log.warning("no response for command %s", pending)
+                self.command_stats.timeouts += 1
+                if pending in self._in_flight:
+                    self._in_flight.remove(pending)
+                return False
+        finally:
+            self.command_queue.release()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        """Fail commands still waiting for a response."""
+        while self._in_flight:
+            self._in_flight.popleft().resolve(False)
+        super().connection_lost(exc)
 
 
 class EventHandling(PacketHandling):
@@ -291,12 +874,19 @@ class EventHandling(PacketHandling):
         event_callback: Optional[Callable[[PacketType], None]] = None,
         ignore: Optional[Sequence[str]] = None,
         init_options: Optional[Sequence[dict]] = None,
+        repeat_window: timedelta = REPEAT_WINDOW,
+        repeat_cache_size: int = REPEAT_CACHE_SIZE,
         **kwargs: Any,
     ) -> None:
         """Add eventhandling specific initialization."""
         super().__init__(*args, **kwargs)
         self.event_callback = event_callback
         self.init_options = init_options
+        self.repeat_filter = RepeatFilter(repeat_window, repeat_cache_size)
+        self.known_devices = None  # type: Optional[KnownDevices]
+        self.frames_prefiltered = 0
+        # set when receiving through several gateways, see rfpmulti
+        self.packet_merger = None  # type: Optional[Callable[[EventHandling, PacketType], None]]
 #        # suppress printing of packets
         log.debug("EventHandling")
         if not kwargs.get("packet_callback"):
@@ -307,17 +897,63 @@ class EventHandling(PacketHandling):
         else:
             self.ignore = []
 
-    def _handle_packet(self, packet: PacketType) -> None:
+    def accept_raw_packet(self, raw_packet: str) -> bool:
+        """Reject frames of ignored or unknown devices before decoding them.
+
+        Only frames all of whose events would be dropped are rejected: the
+        device matches a `prefix*` ignore pattern, or `known_devices` is set
+        (automatic add disabled) and the device is not in it.
+        """
+        prefixes = self._ignore.prefixes
+        known_devices = self.known_devices
+        if not prefixes and known_devices is None:
+            return True
+        scanned = scan_frame(raw_packet)
+        if scanned is None:
+            return True
+        protocol, _, device_id = scanned
+        if device_id is None or protocol in FORCED_ID_PROTOCOLS:
+            return True
+        frame_id = protocol + PACKET_ID_SEP + device_id
+        if (prefixes and frame_id.startswith(prefixes)) or (
+            known_devices is not None and not known_devices.match(frame_id)
+        ):
+            self.frames_prefiltered += 1
+            return False
+        return True
+
+    def _handle_packet(self, packet: PacketType, arrival: int = 0) -> None:
         """Event specific packet handling logic."""
-        events = packet_events(packet)
+        tracer = self.tracer if self.tracer.enabled else None
+        if tracer is not None:
+            started = time.monotonic_ns()
+            events = list(packet_events(packet))
+            tracer.record("packet_events", started)
+        else:
+            events = packet_events(packet)
+        repeat_filter = self.repeat_filter if self.repeat_filter else None
+        metrics = self.metrics
+        now = time.monotonic()
 
         for event in events:
+            if repeat_filter and repeat_filter.is_repeat(event["id"], event["value"], now):
+                TRACE.debug(log, "repeated event with id: %s", event["id"])
+                metrics.events_repeated += 1
+                continue
             if self.ignore_event(event["id"]):
-                log.debug("ignoring event with id: %s", event)
+                TRACE.debug(log, "ignoring event with id: %s", event)
+                metrics.events_ignored += 1
                 continue
-            log.debug("got event: %s", event)
+            TRACE.debug(log, "got event: %s", event)
+            metrics.events_emitted += 1
             if self.event_callback:
-                self.event_callback(event)
+                if tracer is not None:
+                    started = time.monotonic_ns()
+                    self.event_callback(event)
+                    tracer.record("event_callback", started)
+                    tracer.record_arrival("end_to_end", arrival)
+                else:
+                    self.event_callback(event)
             else:
                 self.handle_event(event)
 
@@ -344,15 +980,30 @@ class EventHandling(PacketHandling):
 
     def handle_packet(self, packet: PacketType) -> None:
         """Apply event specific handling and pass on to packet handling."""
-        self._handle_packet(packet)
+        if self.packet_merger is not None:
+            self.packet_merger(self, packet)
+        else:
+            self.handle_merged_packet(packet, self.arrival)
+
+    def handle_merged_packet(self, packet: PacketType, arrival: int = 0) -> None:
+        """Handle a packet once merged, arrival is its first copy's (ns)."""
+        self._handle_packet(packet, arrival)
         super().handle_packet(packet)
 
+    @property
+    def ignore(self) -> Sequence[str]:
+        """Return patterns of event ids to ignore."""
+        return self._ignore.patterns
+
+    @ignore.setter
+    def ignore(self, patterns: Sequence[str]) -> None:
+        """Compile patterns of event ids to ignore."""
+        self._ignore = IgnoreMatcher(patterns)
+
     def ignore_event(self, event_id: str) -> bool:
         """Verify event id against list of events to ignore."""
-        for ignore in self.ignore:
-            if fnmatchcase(event_id, ignore):
-                log.debug("ignore_event")
-                return True
+        if self._ignore(event_id):
+            return True
         return False
 
 
@@ -369,7 +1020,14 @@ def create_rfplayer_connection(
     disconnect_callback: Optional[Callable[[Optional[Exception]], None]] = None,
     ignore: Optional[Sequence[str]] = None,
     loop: Optional[asyncio.AbstractEventLoop] = None,
-    init_options: Optional[Sequence[dict]] = None
+    init_options: Optional[Sequence[dict]] = None,
+    command_window: int = DEFAULT_COMMAND_WINDOW,
+    command_timeout: timedelta = TIMEOUT,
+    starvation_timeout: timedelta = STARVATION_TIMEOUT,
+    repeat_window: timedelta = REPEAT_WINDOW,
+    decode_cache_size: int = 0,
+    frame_format: str = DEFAULT_FRAME_FORMAT,
+    recorder: Optional[FrameRecorder] = None,
 ) -> "Coroutine[Any, Any, Tuple[asyncio.BaseTransport, ProtocolBase]]":
     """Create Rflink manager class, returns transport coroutine."""
     if loop is None:
@@ -383,6 +1041,13 @@ def create_rfplayer_connection(
         disconnect_callback=disconnect_callback,
         ignore=ignore if ignore else [],
         init_options=init_options,
+        command_window=command_window,
+        command_timeout=command_timeout,
+        starvation_timeout=starvation_timeout,
+        repeat_window=repeat_window,
+        decode_cache_size=decode_cache_size,
+        frame_format=frame_format,
+        recorder=recorder,
     )
 
     # setup serial connection
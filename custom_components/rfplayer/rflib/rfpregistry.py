@@ -0,0 +1,89 @@
+"""Decoder registry mapping (protocolMeaning, infoType) to decoder callables."""
+
+from functools import partial
+import logging
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from .infotypes import INFOTYPE_DECODERS
+from .rfperrors import ERRORS
+from .protocols import PROTOCOL_SPECS, ProtocolSpec, decode_frame
+
+log = logging.getLogger(__name__)
+
+DecoderKey = Tuple[str, str]
+Decoder = Callable[..., Optional[dict]]
+
+
+class DecoderRegistry:
+    """Table of prebuilt frame decoders.
+
+    Each entry binds a protocol spec to its infotype decoder once, so
+    decoding a frame is a single dict lookup. Keys without a decoder are
+    remembered and reported through ERRORS, in full only the first time
+    they are seen.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty registry."""
+        self._decoders: Dict[DecoderKey, Decoder] = {}
+        self._unknown: Set[DecoderKey] = set()
+
+    def __contains__(self, key: DecoderKey) -> bool:
+        """Check if a decoder is registered for key."""
+        return key in self._decoders
+
+    def register(self, protocol: str, info_type: str, decoder: Decoder) -> None:
+        """Register a decoder called as decoder(message, node)."""
+        key = (protocol, info_type)
+        self._decoders[key] = decoder
+        self._unknown.discard(key)
+
+    def register_protocol(
+        self,
+        protocol: str,
+        spec: ProtocolSpec,
+        info_types: Optional[Iterable[str]] = None,
+    ) -> None:
+        """Register a protocol spec for every (or the given) infotype."""
+        for info_type in info_types or INFOTYPE_DECODERS:
+            self.register(
+                protocol,
+                info_type,
+                partial(decode_frame, spec, INFOTYPE_DECODERS[info_type]),
+            )
+
+    def unregister(self, protocol: str, info_type: str) -> None:
+        """Remove a decoder."""
+        self._decoders.pop((protocol, info_type), None)
+
+    def lookup(self, protocol: str, info_type: str) -> Optional[Decoder]:
+        """Return the decoder for a frame, None if not implemented."""
+        key = (protocol, info_type)
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            self._unknown.add(key)
+            ERRORS.report(
+                log,
+                protocol,
+                f"infoType {info_type} not implemented",
+                "Protocol %s (infoType %s) not implemented",
+                protocol,
+                info_type,
+            )
+        return decoder
+
+    @property
+    def unknown(self) -> Set[DecoderKey]:
+        """Return keys seen without a decoder."""
+        return set(self._unknown)
+
+
+DECODERS = DecoderRegistry()
+
+for _protocol, _spec in PROTOCOL_SPECS.items():
+    DECODERS.register_protocol(_protocol, _spec)
+
+
+def register_decoder(protocol: str, info_type: str, decoder: Decoder) -> None:
+    """Register an additional decoder in the default registry."""
+    DECODERS.register(protocol, info_type, decoder)
@@ -0,0 +1,188 @@
+"""Replay captured traffic into a protocol instance.
+
+Frames of a capture (see rfpcapture) are fed to `data_received` at their
+original pace, `speed` times faster, or as fast as possible, without a
+gateway. Reports sustained frames per second, time spent per pipeline
+stage and frames that produced no packet:
+
+    python -m rflib.rfpreplay /path/to/capture --speed 0
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from .rfpbinary import is_binary_frame
+from .rfpcapture import CaptureReader
+from .rfpprotocol import FRAME_TERMINATOR, RfplayerProtocol
+
+log = logging.getLogger(__name__)
+
+# Frames fed between two yields to the loop when replaying as fast as possible
+REPLAY_BATCH = 64
+
+# A frame fed later than this behind its replay time is counted late
+LATE_THRESHOLD = 0.05
+
+STAGES = ("read", "feed", "decode", "events")
+
+
+class StageTimer:
+    """Count and duration of one pipeline stage."""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        """Initialize counters."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float) -> None:
+        """Account one run of the stage."""
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return stage timings in microseconds."""
+        return {
+            "count": self.count,
+            "total_us": self.total * 1e6,
+            "mean_us": self.total / self.count * 1e6 if self.count else None,
+            "max_us": self.max * 1e6,
+        }
+
+
+class ReplayStatistics:
+    """Throughput, stage timings and drops of one replay."""
+
+    def __init__(self) -> None:
+        """Initialize counters."""
+        self.frames = 0
+        self.decoded = 0
+        self.events = 0
+        self.late = 0
+        self.elapsed = 0.0
+        self.captured = 0.0
+        self.stages = {stage: StageTimer() for stage in STAGES}
+
+    @property
+    def dropped(self) -> int:
+        """Return frames that produced no packet."""
+        return self.frames - self.decoded
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return statistics as a plain dict."""
+        return {
+            "frames": self.frames,
+            "decoded": self.decoded,
+            "dropped": self.dropped,
+            "events": self.events,
+            "late": self.late,
+            "elapsed": self.elapsed,
+            "captured": self.captured,
+            "frames_per_second": self.frames / self.elapsed if self.elapsed else None,
+            "stages": {stage: timer.as_dict() for stage, timer in self.stages.items()},
+        }
+
+
+def instrument(protocol: RfplayerProtocol, stats: ReplayStatistics) -> None:
+    """Time the decode and event stages of a protocol instance."""
+    decode = protocol.decode_packet
+    decode_timer = stats.stages["decode"]
+
+    def timed_decode(packet: str) -> list:
+        started = time.perf_counter()
+        packets = decode(packet)
+        decode_timer.add(time.perf_counter() - started)
+        if packets:
+            stats.decoded += 1
+        return packets
+
+    protocol.decode_packet = timed_decode
+
+    callback = protocol.event_callback
+    events_timer = stats.stages["events"]
+
+    def timed_callback(event: Any) -> None:
+        stats.events += 1
+        if callback is not None:
+            started = time.perf_counter()
+            callback(event)
+            events_timer.add(time.perf_counter() - started)
+
+    protocol.event_callback = timed_callback
+
+
+async def replay(
+    protocol: RfplayerProtocol,
+    reader: CaptureReader,
+    speed: Optional[float] = 1.0,
+    start: Optional[float] = None,
+) -> ReplayStatistics:
+    """Feed captured frames to protocol, `speed` 0 or None for no pacing."""
+    stats = ReplayStatistics()
+    instrument(protocol, stats)
+    read_timer = stats.stages["read"]
+    feed_timer = stats.stages["feed"]
+    paced = bool(speed)
+    first = None
+    started = time.monotonic()
+    records = reader.read(start)
+    while True:
+        read_started = time.perf_counter()
+        record = next(records, None)
+        read_timer.add(time.perf_counter() - read_started)
+        if record is None:
+            break
+        timestamp, frame = record
+        if first is None:
+            first = timestamp
+        if paced:
+            delay = started + (timestamp - first) / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -LATE_THRESHOLD:
+                stats.late += 1
+        elif not stats.frames % REPLAY_BATCH:
+            await asyncio.sleep(0)
+        data = bytes(frame) if is_binary_frame(frame) else bytes(frame) + FRAME_TERMINATOR
+        feed_started = time.perf_counter()
+        protocol.data_received(data)
+        feed_timer.add(time.perf_counter() - feed_started)
+        stats.frames += 1
+        stats.captured = timestamp - first
+    stats.elapsed = time.monotonic() - started
+    return stats
+
+
+def main() -> None:
+    """Replay a capture into a protocol without gateway, print statistics."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("capture", help="capture base path, without segment suffix")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="replay speed, 0 for no pacing"
+    )
+    parser.add_argument("--start", type=float, help="monotonic timestamp to start at")
+    parser.add_argument("--frame-format", default="JSON", help="JSON, HEX or BINARY")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    async def run() -> ReplayStatistics:
+        protocol = RfplayerProtocol(
+            loop=asyncio.get_running_loop(),
+            event_callback=lambda event: None,
+            frame_format=args.frame_format,
+        )
+        return await replay(protocol, CaptureReader(args.capture), args.speed, args.start)
+
+    print(json.dumps(asyncio.run(run()).as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Latency tracing of the receive pipeline, serial bytes to entity state.
+
+`data_received` stamps each chunk of serial data with `time.monotonic_ns()`
+as the arrival time of the frames it holds. The arrival time is kept by
+the protocol receiving the data, and goes with a packet held by the packet
+merger, so gateways do not share it. Each stage then records its
+duration, and the last one the time since arrival, into fixed bucket
+histograms: recording is a bisect and two increments, percentiles are
+read from the bucket counts. Tracing is disabled unless enabled, and
+frames injected without arrival time only record stage durations.
+
+Stages, in pipeline order:
+
+    framing         arrival to handle_raw_packet (splitting, utf-8)
+    decode          decode_packet
+    packet_events   packet to events
+    event_callback  HA event_callback, per event
+    dispatch        async_dispatcher_send to the entity
+    entity          entity handle_event_callback
+    state_write     async_write_ha_state
+    end_to_end      arrival to event_callback returned, entity state written
+"""
+
+from bisect import bisect_left
+import time
+from typing import Any, Dict, List
+
+STAGES = (
+    "framing",
+    "decode",
+    "packet_events",
+    "event_callback",
+    "dispatch",
+    "entity",
+    "state_write",
+    "end_to_end",
+)
+
+# Bucket upper bounds in ns, 4 per octave from 1 us to about 67 s
+BUCKET_BOUNDS = [int(1000 * 2 ** (step / 4)) for step in range(4 * 26 + 1)]
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    """Fixed bucket histogram of durations in nanoseconds."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        """Initialize empty histogram."""
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, duration: int) -> None:
+        """Add one duration."""
+        self.counts[bisect_left(BUCKET_BOUNDS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, percent: float) -> int:
+        """Return the bucket bound below which percent of durations fall."""
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def clear(self) -> None:
+        """Forget every duration."""
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = self.total = self.max = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return count, mean, percentiles and max in microseconds."""
+        figures = {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1000 if self.count else None,
+        }  # type: Dict[str, Any]
+        for percent in PERCENTILES:
+            figures[f"p{percent}_us"] = self.percentile(percent) / 1000
+        figures["max_us"] = self.max / 1000
+        return figures
+
+
+class PipelineTracer:
+    """Per stage latency histograms of the receive pipeline."""
+
+    def __init__(self, enabled: bool = False, stages: List[str] = STAGES) -> None:
+        """Initialize one histogram per stage."""
+        self.enabled = enabled
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+
+    def record(self, stage: str, started: int) -> None:
+        """Record the duration of a stage started at `started` ns."""
+        self.histograms[stage].record(time.monotonic_ns() - started)
+
+    def record_arrival(self, stage: str, arrival: int) -> None:
+        """Record the time elapsed since data arrived at `arrival` ns, if known."""
+        if arrival:
+            self.histograms[stage].record(time.monotonic_ns() - arrival)
+
+    def clear(self) -> None:
+        """Forget every recorded duration."""
+        for histogram in self.histograms.values():
+            histogram.clear()
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Return figures of every stage."""
+        return {stage: histogram.as_dict() for stage, histogram in self.histograms.items()}
+
+
+# Tracer shared by the protocol and the Home Assistant side
+TRACER = PipelineTracer()
@@ -1,20 +1,25 @@
 """Support for Rfplayer sensors."""
+from datetime import timedelta
 import logging
 
-from homeassistant.const import (
-    CONF_DEVICES,CONF_DEVICES)
+from homeassistant.core import callback
 from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.event import async_track_time_interval
 
 from . import RfplayerDevice
 from .const import (
     CONF_AUTOMATIC_ADD,
+    CONF_DIAGNOSTIC_SENSORS,
     DATA_DEVICE_REGISTER,
+    DATA_DEVICE_STORE,
     DATA_ENTITY_LOOKUP,
+    DEFAULT_METRICS_INTERVAL,
     DOMAIN,
     EVENT_KEY_ID,
     EVENT_KEY_SENSOR,
     EVENT_KEY_UNIT,
 )
+from .rflib.rfpmetrics import METRICS
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +30,18 @@ SENSOR_ICONS = {
     "power": "mdi:transmission-tower", 
 }
 
+METRIC_SENSORS = {
+    "frames_received": "Frames received",
+    "frames_dropped": "Frames dropped",
+    "decode_failures_total": "Decode failures",
+    "events_emitted": "Events emitted",
+    "events_ignored": "Events ignored",
+    "unknown_device_events": "Unknown device events",
+    "commands_sent": "Commands sent",
+    "command_queue_depth": "Command queue depth",
+    "reconnects": "Reconnects",
+}
+
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up the Rfplayer platform."""
@@ -35,9 +52,10 @@ async def async_setup_entry(hass, entry, async_add_entities):
     # add jamming entity
     #async_add_entities([RfplayerJammingSensor()])
 
-    if CONF_DEVICES in config:
+    device_store = hass.data[DOMAIN][DATA_DEVICE_STORE]
+    if device_store.devices:
         items_to_delete=[]
-        for device_id, device_info in config[CONF_DEVICES].items():
+        for device_id, device_info in device_store.devices.items():
             if EVENT_KEY_SENSOR in device_info:
                 if((device_info.get("protocol")!=None) and (device_info.get("platform")=="sensor")):
                     await add_new_device(device_info)
@@ -46,7 +64,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
                     items_to_delete.append(device_id)
 
         for item in items_to_delete:
-            config[CONF_DEVICES].pop(item)
+            device_store.async_remove(item)
 
     async def add_new_device(device_info):
         """Check if device is known, otherwise create device entity."""
@@ -68,6 +86,29 @@ async def async_setup_entry(hass, entry, async_add_entities):
     if options.get(CONF_AUTOMATIC_ADD, config[CONF_AUTOMATIC_ADD]):
         hass.data[DOMAIN][DATA_DEVICE_REGISTER][EVENT_KEY_SENSOR] = add_new_device
 
+    if options.get(CONF_DIAGNOSTIC_SENSORS, False):
+        metrics = METRICS.as_dict()
+        metric_sensors = [
+            RfplayerMetricSensor(metric, name, metrics[metric])
+            for metric, name in METRIC_SENSORS.items()
+        ]
+        async_add_entities(metric_sensors)
+
+        @callback
+        def update_metric_sensors(now):
+            """Refresh diagnostic sensors from the metrics."""
+            metrics = METRICS.as_dict()
+            for sensor in metric_sensors:
+                sensor.update_metric(metrics)
+
+        entry.async_on_unload(
+            async_track_time_interval(
+                hass,
+                update_metric_sensors,
+                timedelta(seconds=DEFAULT_METRICS_INTERVAL),
+            )
+        )
+
 
 class RfplayerSensor(RfplayerDevice):
     """Representation of a Rfplayer sensor."""
@@ -144,3 +185,36 @@ class RfplayerJammingSensor(RfplayerDevice):
         if device:
             device_registry.async_remove_device(device)
         """
+
+
+class RfplayerMetricSensor(RfplayerDevice):
+    """Representation of a Rfplayer pipeline counter."""
+
+    def __init__(self, metric, name, value):
+        """Handle metric specific args and super init."""
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        self._metric = metric
+        super().__init__("METRICS", device_id=metric, name=name)
+        self._state = value
+
+    @callback
+    def update_metric(self, metrics):
+        """Update value from a metrics snapshot."""
+        value = metrics[self._metric]
+        if value != self._state:
+            self._state = value
+            if self.hass is not None:
+                self.async_write_ha_state()
+
+    def _handle_event(self, event):
+        """Metrics are not updated from events."""
+
+    @property
+    def available(self):
+        """Return True, metrics are available without gateway."""
+        return True
+
+    @property
+    def state(self):
+        """Return value."""
+        return self._state
@@ -0,0 +1,80 @@
+"""Persistence of the Rfplayer devices."""
+import logging
+
+from homeassistant.const import CONF_DEVICES
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+
+from .const import DEVICES_SAVE_DELAY, DEVICES_STORAGE_KEY, DEVICES_STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RfplayerDeviceStore:
+    """Devices of a config entry, kept in their own storage file.
+
+    Adding or removing a device updates the devices in place. The first
+    change schedules a save DEVICES_SAVE_DELAY seconds later and the next
+    ones are written with it, so a burst of discovered devices is written
+    once, at most every DEVICES_SAVE_DELAY seconds. Pending changes are
+    written when Home Assistant stops or the entry is unloaded, and the
+    storage file is removed with the entry.
+    """
+
+    def __init__(self, hass, entry):
+        """Initialize the store of entry."""
+        self._hass = hass
+        self._entry = entry
+        self._store = Store(
+            hass, DEVICES_STORAGE_VERSION, DEVICES_STORAGE_KEY.format(entry.entry_id)
+        )
+        self.devices = {}
+        self._save_scheduled = False
+
+    async def async_load(self):
+        """Load devices, moving those still in the config entry to the store."""
+        data = await self._store.async_load()
+        if data is not None:
+            self.devices = data[CONF_DEVICES]
+            return
+        self.devices = dict(self._entry.data.get(CONF_DEVICES, {}))
+        await self._store.async_save(self._data_to_save())
+        if self.devices:
+            _LOGGER.info("Moved %d devices from config entry to storage", len(self.devices))
+            data = dict(self._entry.data)
+            data[CONF_DEVICES] = {}
+            self._hass.config_entries.async_update_entry(entry=self._entry, data=data)
+
+    @callback
+    def async_add(self, device_id, device):
+        """Add or replace a device."""
+        self.devices[device_id] = dict(device)
+        self._async_schedule_save()
+
+    @callback
+    def async_remove(self, device_id):
+        """Remove a device."""
+        if self.devices.pop(device_id, None) is not None:
+            self._async_schedule_save()
+
+    async def async_flush(self):
+        """Write pending changes now instead of after the delay."""
+        if self._save_scheduled:
+            await self._store.async_save(self._data_to_save())
+
+    async def async_remove_storage(self):
+        """Remove the storage file."""
+        await self._store.async_remove()
+
+    @callback
+    def _async_schedule_save(self):
+        """Schedule a save unless one is pending."""
+        if not self._save_scheduled:
+            self._save_scheduled = True
+            self._store.async_delay_save(self._data_to_save, DEVICES_SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        """Return data of the store."""
+        self._save_scheduled = False
+        return {CONF_DEVICES: self.devices}
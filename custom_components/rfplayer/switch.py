@@ -2,7 +2,7 @@
 import logging
 
 from homeassistant.components.switch import SwitchEntity
-from homeassistant.const import CONF_DEVICE_ID, CONF_DEVICES, CONF_PROTOCOL
+from homeassistant.const import CONF_DEVICE_ID, CONF_PROTOCOL
 from homeassistant.core import callback
 
 from . import DATA_DEVICE_REGISTER, EVENT_KEY_COMMAND, RfplayerDevice
@@ -12,6 +12,7 @@ from .const import (
     CONF_AUTOMATIC_ADD,
     CONF_DEVICE_ADDRESS,
     CONF_ENTITY_TYPE,
+    DATA_DEVICE_STORE,
     DATA_ENTITY_LOOKUP,
     DOMAIN,
     EVENT_KEY_ID,
@@ -42,9 +43,10 @@ async def async_setup_entry(hass, entry, async_add_entities):
         except Exception as err:
             _LOGGER.error("Switch %s creation error: %s",device_info.get(CONF_DEVICE_ID),str(err))
 
-    if CONF_DEVICES in config:
+    device_store = hass.data[DOMAIN][DATA_DEVICE_STORE]
+    if device_store.devices:
         items_to_delete=[]
-        for device_id, device_info in config[CONF_DEVICES].items():
+        for device_id, device_info in device_store.devices.items():
             if EVENT_KEY_COMMAND in device_info:
                 if((device_info.get("protocol")!=None) and (device_info.get("platform")=="switch")):
                     await add_new_device(device_info)
@@ -52,7 +54,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
                     _LOGGER.warning("Switch entity not created %s - %s", device_id, device_info)
                     items_to_delete.append(device_id)
         for item in items_to_delete:
-            config[CONF_DEVICES].pop(item)
+            device_store.async_remove(item)
 
     if options.get(CONF_AUTOMATIC_ADD, config[CONF_AUTOMATIC_ADD]):
         hass.data[DOMAIN][DATA_DEVICE_REGISTER][EVENT_KEY_COMMAND] = add_new_device
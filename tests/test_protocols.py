@@ -0,0 +1,72 @@
+"""Tests of the declarative protocol decoders, rflib.protocols."""
+
+from rflib.infotypes import INFOTYPE_DECODERS
+from rflib.protocols import PROTOCOL_SPECS, ProtocolSpec, decode_frame
+
+
+def frame(protocol, info_type, infos):
+    """Return a JSON frame message."""
+    return {
+        "header": {
+            "frameType": "0",
+            "dataFlag": "0",
+            "rfLevel": "-70",
+            "floorNoise": "-100",
+            "rfQuality": "7",
+            "protocolMeaning": protocol,
+            "infoType": info_type,
+            "frequency": "433920",
+        },
+        "infos": infos,
+    }
+
+
+def decode(protocol, info_type, infos):
+    """Decode a frame with the spec of protocol."""
+    return decode_frame(
+        PROTOCOL_SPECS[protocol],
+        INFOTYPE_DECODERS[info_type],
+        frame(protocol, info_type, infos),
+        "gateway",
+    )
+
+
+def test_spec_sets_header_and_platform():
+    """A default spec copies the header and sets the sensor platform."""
+    packet = decode("X10", "1", {"subType": "1", "subTypeMeaning": "ON", "id": "42"})
+    assert packet["node"] == "gateway"
+    assert packet["protocol"] == "X10"
+    assert packet["rfLevel"] == "-70"
+    assert packet["platform"] == "sensor"
+    assert packet["id"] == "42"
+    assert packet["command"] == "ON"
+    assert "forceid" not in packet
+
+
+def test_empty_id_needs_allow_empty_id():
+    """Frames with id 0 are dropped unless the spec allows them."""
+    infos = {"subType": "1", "id": "0"}
+    assert decode("X10", "0", infos) is None
+    packet = decode("JAMMING", "0", infos)
+    assert packet["forceid"] == "jamming_detection"
+
+
+def test_post_hook_completes_packet():
+    """RTS shutters become covers through the post hook of their spec."""
+    packet = decode(
+        "RTS",
+        "3",
+        {"subType": "0", "subTypeMeaning": "Shutter", "id": "14813191", "qualifier": "1"},
+    )
+    assert packet["platform"] == "cover"
+    assert packet["cover"] == packet["qualifier"]
+
+
+def test_custom_spec():
+    """A spec without platform leaves it out, forceid is applied."""
+    spec = ProtocolSpec(platform=None, forceid="forced")
+    packet = decode_frame(
+        spec, INFOTYPE_DECODERS["0"], frame("FOO", "0", {"subType": "1", "id": "7"}), "gateway"
+    )
+    assert "platform" not in packet
+    assert packet["forceid"] == "forced"
@@ -0,0 +1,29 @@
+"""Tests of rflib.rfpbinary."""
+
+from rflib.rfpbinary import _infos_structs, decode_binary_packet, frame_header, rf_header
+from rflib.rfpmetrics import METRICS
+from rflib.rfpregistry import DECODERS
+
+
+def binary_frame(protocol, info_type, words):
+    """Build a binary frame of protocol number and infoType."""
+    payload = rf_header.pack(0, 0, 0, -60, -100, 8, protocol, info_type)
+    payload += _infos_structs[str(info_type)].pack(*words)
+    return memoryview(frame_header.pack(b"ZI", 0x11, len(payload)) + payload)
+
+
+def test_decoder_error_is_contained():
+    """A decoder raising on a binary frame yields no packet, and is counted."""
+
+    def failing_decoder(message, node):
+        raise KeyError("qualifier")
+
+    decoder = DECODERS.lookup("X10", "0")
+    DECODERS.register("X10", "0", failing_decoder)
+    METRICS.clear()
+    try:
+        assert decode_binary_packet(binary_frame(1, 0, [0, 12]), "gateway") == []
+    finally:
+        DECODERS.register("X10", "0", decoder)
+    assert METRICS.decode_failures["X10"] == 1
+    assert decode_binary_packet(binary_frame(1, 0, [0, 12]), "gateway")
@@ -0,0 +1,24 @@
+"""Tests of the raw frame capture, rflib.rfpcapture."""
+
+from rflib.rfpcapture import CODEC_ZLIB, CaptureReader, FrameRecorder, capture_segments
+
+
+def test_recorder_writes_in_background(tmp_path):
+    """Frames recorded are read back once the capture is closed."""
+    base = str(tmp_path / "capture")
+    recorder = FrameRecorder(
+        base, CODEC_ZLIB, segment_size=256, max_segments=2, block_records=4
+    )
+    frames = [b"ZIA33{\"frame\": %d}" % number for number in range(40)]
+    timestamps = [number / 100 for number in range(40)]
+    for timestamp, frame in zip(timestamps, frames):
+        recorder.record(frame, timestamp)
+    recorder.close()
+    recorder.record(b"after close", 1.0)
+
+    segments = capture_segments(base)
+    assert len(segments) == 2
+    assert recorder.blocks == 10
+    records = [(timestamp, bytes(frame)) for timestamp, frame in CaptureReader(base)]
+    assert records
+    assert records == list(zip(timestamps, frames))[-len(records):]
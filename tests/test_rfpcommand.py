@@ -0,0 +1,132 @@
+"""Tests of the command pipeline, rflib.rfpcommand."""
+
+import asyncio
+from datetime import timedelta
+
+from rflib.rfpcommand import (
+    BAND_868,
+    PRIORITY_AUTOMATION,
+    PRIORITY_INTERACTIVE,
+    TransmitScheduler,
+)
+from rflib.rfpprotocol import RfplayerProtocol
+
+
+class FakeTransport:
+    """Transport keeping written data."""
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    def is_closing(self):
+        return False
+
+
+def connected_protocol(loop, window):
+    """Return a protocol whose 868 MHz band allows one command per window."""
+    protocol = RfplayerProtocol(
+        loop=loop,
+        init_options={"START_COMMANDS": []},
+        transmit_scheduler=TransmitScheduler(window=timedelta(seconds=window)),
+    )
+    protocol.connection_made(FakeTransport())
+    return protocol
+
+
+def written(protocol):
+    """Return commands written to the gateway, setup excluded."""
+    return [
+        data.decode().strip()
+        for data in protocol.transport.written
+        for data in data.split(b"\n\r")
+        if data and data != b"ZIA++HELLO"
+    ]
+
+
+def send(protocol, protocol_name, device_id, priority=None, command="ON"):
+    """Start sending a command."""
+    return asyncio.get_running_loop().create_task(
+        protocol.send_command_ack(
+            protocol_name, command, device_id=device_id, priority=priority
+        )
+    )
+
+
+def test_saturated_band_does_not_hold_other_commands():
+    """433 MHz and gateway commands go out while 868 MHz is out of budget."""
+
+    async def run():
+        protocol = connected_protocol(asyncio.get_running_loop(), window=1)
+        assert await send(protocol, "EDISIO", "1")
+        limited = send(protocol, "EDISIO", "2")
+        await asyncio.sleep(0.01)
+        rts = send(protocol, "RTS", "3")
+        assert await asyncio.wait_for(rts, 0.2)
+        assert not limited.done()
+        assert await limited
+        assert written(protocol) == [
+            "ZIA++ON ID 1 EDISIO",
+            "ZIA++ON ID 3 RTS",
+            "ZIA++ON ID 2 EDISIO",
+        ]
+
+    asyncio.run(run())
+
+
+def test_interactive_command_overtakes_background_command():
+    """On a band out of budget, the interactive command is sent first."""
+
+    async def run():
+        protocol = connected_protocol(asyncio.get_running_loop(), window=0.3)
+        assert await send(protocol, "EDISIO", "1")
+        background = send(protocol, "EDISIO", "2", PRIORITY_AUTOMATION)
+        await asyncio.sleep(0.01)
+        interactive = send(protocol, "EDISIO", "3", PRIORITY_INTERACTIVE)
+        assert await interactive
+        assert not background.done()
+        assert await background
+        assert written(protocol) == [
+            "ZIA++ON ID 1 EDISIO",
+            "ZIA++ON ID 3 EDISIO",
+            "ZIA++ON ID 2 EDISIO",
+        ]
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_reserves_nothing():
+    """A command cancelled while waiting for its band uses no airtime."""
+
+    async def run():
+        protocol = connected_protocol(asyncio.get_running_loop(), window=1)
+        assert await send(protocol, "EDISIO", "1")
+        limited = send(protocol, "EDISIO", "2")
+        await asyncio.sleep(0.01)
+        limited.cancel()
+        await asyncio.gather(limited, return_exceptions=True)
+        band = protocol.scheduler.bands[BAND_868]
+        assert band.transmissions == 1
+        assert not protocol.scheduler._waiters[BAND_868]
+
+    asyncio.run(run())
+
+
+def test_latest_command_for_a_device_wins():
+    """Of two commands waiting for a band, only the newer one is sent."""
+
+    async def run():
+        protocol = connected_protocol(asyncio.get_running_loop(), window=0.3)
+        assert await send(protocol, "EDISIO", "1")
+        older = send(protocol, "EDISIO", "2", command="ON")
+        await asyncio.sleep(0.01)
+        newer = send(protocol, "EDISIO", "2", command="OFF")
+        assert await asyncio.wait_for(older, 0.1)
+        assert await newer
+        assert protocol.scheduler.coalesced == 1
+        assert protocol.scheduler.bands[BAND_868].transmissions == 2
+        assert written(protocol) == ["ZIA++ON ID 1 EDISIO", "ZIA++OFF ID 2 EDISIO"]
+
+    asyncio.run(run())
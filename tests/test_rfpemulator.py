@@ -0,0 +1,86 @@
+"""Tests of the fake RFPlayer, rflib.rfpemulator."""
+
+import asyncio
+
+from rflib.rfpcorpus import synthetic_corpus
+from rflib.rfpemulator import HELLO_RESPONSE, RfplayerEmulator
+from rflib.rfpparser import decode_packet
+from rflib.rfpprotocol import create_rfplayer_connection
+
+
+def emulator(loop, **kwargs):
+    """Return an emulator keeping the lines it sends instead of writing them."""
+    fake = RfplayerEmulator(loop, rate=0, **kwargs)
+    fake.sent = []
+    fake.write_line = lambda line: fake.sent.append(line) or True
+    return fake
+
+
+def test_emulator_answers_gateway_commands():
+    """HELLO, PING and STATUS are answered, RF commands only recorded."""
+    fake = emulator(asyncio.new_event_loop())
+    fake.handle_line("ZIA++1 FORMAT HEX . RECEIVER + *")
+    fake.handle_line("ZIA++HELLO")
+    fake.handle_line("ZIA++PING")
+    fake.handle_line("ZIA++ON X10 ID 42")
+    fake.handle_line("ZIA++STATUS")
+    fake.handle_line("garbage")
+    assert list(fake.commands) == [
+        "FORMAT HEX",
+        "RECEIVER + *",
+        "HELLO",
+        "PING",
+        "ON X10 ID 42",
+        "STATUS",
+    ]
+    assert fake.frame_format == "HEX"
+    assert fake.sent == [
+        "ZIA--" + HELLO_RESPONSE,
+        "ZIA--PONG",
+        "ZIA--Status: format HEX, frames sent 0, commands received 6",
+    ]
+    fake.loop.close()
+
+
+def test_emulator_acks_commands_on_request():
+    """With ack_commands, RF commands get a ZIA-- line."""
+    fake = emulator(asyncio.new_event_loop(), ack_commands=True)
+    fake.handle_line("ZIA++ON X10 ID 42")
+    assert fake.sent == ["ZIA--OK ON X10 ID 42"]
+    fake.loop.close()
+
+
+def test_synthetic_frames_decode():
+    """Every synthetic frame of every protocol decodes to a packet."""
+    for protocol, info_type, frame in synthetic_corpus(devices=1):
+        packets = decode_packet(frame)
+        assert packets and packets[0] is not None, (protocol, info_type)
+        assert packets[0]["protocol"] == protocol
+
+
+def test_protocol_connected_to_emulator():
+    """A protocol opened on the emulator pty gets its frames and replies."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        events = []
+        async with RfplayerEmulator(loop, rate=200, seed=1) as fake:
+            transport, protocol = await create_rfplayer_connection(
+                fake.path,
+                event_callback=events.append,
+                loop=loop,
+                init_options={"START_COMMANDS": ["1 FORMAT JSON . RECEIVER + *"]},
+            )
+            try:
+                for _ in range(100):
+                    await asyncio.sleep(0.01)
+                    if events and "RECEIVER + *" in fake.commands:
+                        break
+                assert await protocol.send_command_ack("", "STATUS", timeout=2)
+            finally:
+                transport.close()
+        assert list(fake.commands) == ["HELLO", "FORMAT JSON", "RECEIVER + *", "STATUS"]
+        assert protocol.command_stats.unsolicited == 0
+        assert events and fake.frames_sent > 0
+
+    asyncio.run(run())
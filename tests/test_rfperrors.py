@@ -0,0 +1,33 @@
+"""Tests of the decoding error reports, rflib.rfperrors."""
+
+import asyncio
+from datetime import timedelta
+import logging
+
+from rflib.rfperrors import ErrorAggregator
+
+log = logging.getLogger(__name__)
+
+
+def test_summary_written_after_a_burst(caplog):
+    """Errors counted during a burst are summarized without a later error."""
+
+    async def run():
+        errors = ErrorAggregator(timedelta(seconds=0.05))
+        errors.start(asyncio.get_running_loop())
+        for _ in range(3):
+            errors.report(log, "FOO", "KeyError", "decoding failed")
+        await asyncio.sleep(0.12)
+        errors.report(log, "BAR", "KeyError", "decoding failed")
+        errors.report(log, "BAR", "KeyError", "decoding failed")
+        errors.stop()
+
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(run())
+    summaries = [
+        record.getMessage() for record in caplog.records if record.levelno == logging.WARNING
+    ]
+    assert len(summaries) == 2
+    assert summaries[0].startswith("2 repeated decoding errors")
+    assert summaries[0].endswith("FOO KeyError x2")
+    assert summaries[1].endswith("BAR KeyError x1")
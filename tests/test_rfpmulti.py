@@ -0,0 +1,136 @@
+"""Tests of receiving and sending through several gateways, rflib.rfpmulti."""
+
+import asyncio
+from datetime import timedelta
+
+from rflib.rfpcommand import BAND_433
+from rflib.rfpmulti import ReceiverGroup
+from rflib.rfpprotocol import RfplayerProtocol
+
+X10_FRAME = (
+    b'ZIA33{"frame":{"header":{"frameType":"0","dataFlag":"0","rfLevel":"-70",'
+    b'"floorNoise":"-100","rfQuality":"7","protocol":"1","protocolMeaning":"X10",'
+    b'"infoType":"1","frequency":"433920"},'
+    b'"infos":{"subType":"1","subTypeMeaning":"ON","id":"42"}}}\n\r'
+)
+
+
+class FakeTransport:
+    """Transport keeping written data."""
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    def is_closing(self):
+        return False
+
+
+def gateway(loop, events=None):
+    """Return a connected protocol."""
+    protocol = RfplayerProtocol(
+        loop=loop,
+        init_options={"START_COMMANDS": []},
+        event_callback=None if events is None else events.append,
+    )
+    protocol.connection_made(FakeTransport())
+    return protocol
+
+
+def test_queue_depth_counts_commands_waiting_for_their_band():
+    """Commands held by the transmit scheduler are part of the queue depth."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        group = ReceiverGroup(loop)
+        group.add("usb0", gateway(loop))
+        tasks = [
+            loop.create_task(group.send_command_ack("RTS", "ON", device_id=str(device)))
+            for device in range(20)
+        ]
+        await asyncio.sleep(0.05)
+        scheduler = group.receivers["usb0"].scheduler
+        assert scheduler.waiting(BAND_433) == 19
+        assert scheduler.as_dict()[BAND_433]["waiting"] == 19
+        assert group.command_queue_depth == 19
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert group.command_queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_group_uses_its_repeat_window():
+    """Gateways of a group filter repeats with the window given to the group."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        group = ReceiverGroup(loop, repeat_window=timedelta(0))
+        events = []
+        group.add("usb0", gateway(loop, events))
+        assert group.receivers["usb0"].repeat_filter.window == 0
+        for _ in range(2):
+            group.receivers["usb0"].data_received(X10_FRAME)
+        assert len(events) == 4
+
+    asyncio.run(run())
+
+
+def test_copies_heard_by_two_gateways_are_merged():
+    """Only the copy with the best link reaches the event pipeline."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        group = ReceiverGroup(loop, dedup_window=timedelta(milliseconds=10))
+        weak, strong = [], []
+        group.add("usb0", gateway(loop, weak))
+        group.add("usb1", gateway(loop, strong))
+        group.receivers["usb0"].data_received(X10_FRAME)
+        group.receivers["usb1"].data_received(
+            X10_FRAME.replace(b'"rfQuality":"7"', b'"rfQuality":"9"')
+        )
+        assert weak == strong == []
+        await asyncio.sleep(0.05)
+        assert weak == []
+        assert [event["id"] for event in strong] == ["X10_42typ_typ", "X10_42cmd_cmd"]
+        assert (group.merger.merged, group.merger.emitted) == (1, 1)
+        return group
+
+    group = asyncio.run(run())
+    assert group.links.get("X10_42") == {"usb0": (7, -70), "usb1": (9, -70)}
+
+
+def test_commands_are_routed_to_the_best_link():
+    """RF commands go to the gateway hearing the device best, else the first."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        group = ReceiverGroup(loop, dedup_window=timedelta(0))
+        group.add("usb0", gateway(loop))
+        group.add("usb1", gateway(loop))
+        group.receivers["usb1"].data_received(X10_FRAME)
+        await asyncio.sleep(0)
+        assert group.route("X10", "42") == "usb1"
+        assert group.route("X10", "43") == "usb0"
+        group.remove("usb1")
+        assert group.route("X10", "42") == "usb0"
+
+    asyncio.run(run())
+
+
+def test_single_gateway_is_not_delayed():
+    """With one gateway packets skip the merger."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        group = ReceiverGroup(loop)
+        events = []
+        group.add("usb0", gateway(loop, events))
+        group.receivers["usb0"].data_received(X10_FRAME)
+        assert len(events) == 2
+        assert group.merger.emitted == 0
+
+    asyncio.run(run())
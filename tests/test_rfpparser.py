@@ -0,0 +1,163 @@
+"""Tests of rflib.rfpparser."""
+
+import pytest
+
+from rflib.rfperrors import ERRORS
+from rflib.rfpmetrics import METRICS
+from rflib import rfpparser
+from rflib.rfpparser import (
+    JSON_BACKENDS,
+    DecodeCache,
+    PacketEvent,
+    decode_packet,
+    event_frame_id,
+    packet_events,
+    set_json_backend,
+)
+
+UNKNOWN_FRAME = (
+    'ZIA33{"frame":{"header":{"protocolMeaning":"UNKNOWN","infoType":"99"},"infos":{}}}'
+)
+SIGNAL = ("rfLevel", "floorNoise", "rfQuality")
+BROKEN_FRAME = (
+    'ZIA33{"frame":{"header":{"protocolMeaning":"OREGON","infoType":"4"},"infos":{}}}'
+)
+
+X10_FRAME = (
+    'ZIA33{"frame":{"header":{"frameType":"0","dataFlag":"0","rfLevel":"-70",'
+    '"floorNoise":"-100","rfQuality":"7","protocol":"1","protocolMeaning":"X10",'
+    '"infoType":"1","frequency":"433920"},'
+    '"infos":{"subType":"1","subTypeMeaning":"ON","id":"42"}}}'
+)
+OREGON_FRAME = (
+    'ZIA33 {"frame":{"header":{"frameType":"0","dataFlag":"0","rfLevel":"-62",'
+    '"floorNoise":"-100","rfQuality":"8","protocol":"5","protocolMeaning":"OREGON",'
+    '"infoType":"4","frequency":"433920"},'
+    '"infos":{"subType":"0","id_PHY":"0x1A2D","id_PHYMeaning":"THGR122/NX",'
+    '"adr_channel":"22274","adr":"87","channel":"2","qualifier":"32","lowBatt":"0",'
+    '"measures":[{"type":"temperature","value":"+21.3","unit":"Celsius"},'
+    '{"type":"hygrometry","value":"58","unit":"%"}]}}}'
+)
+
+
+@pytest.fixture
+def restore_json_backend():
+    """Restore the JSON backend selected at import."""
+    backend = rfpparser.json_backend
+    yield
+    set_json_backend(backend)
+
+
+@pytest.mark.parametrize("backend", sorted(JSON_BACKENDS))
+def test_json_backends_decode_alike(backend, restore_json_backend):
+    """Every available backend decodes frames like the standard library."""
+    set_json_backend("json")
+    expected = [decode_packet(frame) for frame in (X10_FRAME, OREGON_FRAME)]
+    set_json_backend(backend)
+    assert rfpparser.json_backend == backend
+    assert [decode_packet(frame) for frame in (X10_FRAME, OREGON_FRAME)] == expected
+    assert expected[1][0]["temperature"] == "+21.3"
+
+
+def test_unavailable_json_backend(restore_json_backend):
+    """Selecting a missing backend fails and keeps the current one."""
+    backend = rfpparser.json_backend
+    with pytest.raises(ValueError):
+        set_json_backend("simplejson")
+    assert rfpparser.json_backend == backend
+
+
+def test_decode_cache_counts_every_failed_frame():
+    """Frames decoding to nothing are decoded, and counted, every time."""
+    cache = DecodeCache()
+    METRICS.clear()
+    ERRORS.clear()
+    for _ in range(3):
+        assert cache.decode(UNKNOWN_FRAME) == []
+        assert cache.decode(BROKEN_FRAME) == []
+    assert len(cache) == 0
+    assert METRICS.decode_failures["OREGON"] == 3
+    assert ERRORS.as_dict()["UNKNOWN infoType 99 not implemented"] == 3
+
+
+def test_decode_cache_hit_updates_signal_fields():
+    """A cached frame is returned with the signal fields of the new frame."""
+    cache = DecodeCache()
+    frame = X10_FRAME
+    first = cache.decode(frame)
+    again = cache.decode(
+        frame.replace('"-70"', '"-55"')
+        .replace('"-100"', '"-98"')
+        .replace('"rfQuality":"7"', '"rfQuality":"9"')
+    )
+    assert cache.hits == 1
+    assert (first[0]["rfLevel"], first[0]["floorNoise"], first[0]["rfQuality"]) == (
+        "-70",
+        "-100",
+        "7",
+    )
+    assert (again[0]["rfLevel"], again[0]["floorNoise"], again[0]["rfQuality"]) == (
+        "-55",
+        "-98",
+        "9",
+    )
+    assert {key: value for key, value in again[0].items() if key not in SIGNAL} == {
+        key: value for key, value in first[0].items() if key not in SIGNAL
+    }
+
+
+def test_packet_events_are_event_mappings():
+    """Each measure of a packet is one event with the former dict keys."""
+    packet = {
+        "node": "gateway",
+        "protocol": "OREGON",
+        "id": "22274",
+        "platform": "sensor",
+        "temperature": "+21.3",
+        "temperature_unit": "°C",
+        "hygrometry": "58",
+        "hygrometry_unit": "%",
+    }
+    events = list(packet_events(packet))
+    assert [dict(event) for event in events] == [
+        {
+            "id": "OREGON_22274temperature_temperature",
+            "temperature": "+21.3",
+            "value": "+21.3",
+            "unit": "°C",
+            "platform": "sensor",
+            "protocol": "OREGON",
+        },
+        {
+            "id": "OREGON_22274hygrometry_hygrometry",
+            "hygrometry": "58",
+            "value": "58",
+            "unit": "%",
+            "platform": "sensor",
+            "protocol": "OREGON",
+        },
+    ]
+    assert all(isinstance(event, PacketEvent) for event in events)
+    assert [event_frame_id(event) for event in events] == ["OREGON_22274"] * 2
+
+
+def test_packet_event_mapping():
+    """Missing keys raise KeyError and are not contained."""
+    event = PacketEvent("X10_42cmd_cmd", "command", "ON", None, "sensor", "X10")
+    assert event["command"] == "ON"
+    assert "command" in event and "cover" not in event
+    assert event.get("cover") is None
+    with pytest.raises(KeyError):
+        event["cover"]
+    assert len(event) == 6
+
+
+def test_forced_event_id():
+    """A forceid replaces the id of every event."""
+    packet = {
+        "protocol": "JAMMING",
+        "id": "0",
+        "forceid": "jamming_detection",
+        "command": 1,
+    }
+    assert [event["id"] for event in packet_events(packet)] == ["jamming_detection"]
@@ -0,0 +1,322 @@
+"""Tests of rflib.rfpprotocol."""
+
+import asyncio
+from datetime import timedelta
+import logging
+
+import pytest
+
+from rflib.rfplog import TRACE
+from rflib.rfpmulti import ReceiverGroup
+from rflib.rfpparser import KnownDevices
+from rflib.rfpprotocol import (
+    FrameSplitter,
+    IgnoreMatcher,
+    RepeatFilter,
+    RfplayerProtocol,
+    WriteQueue,
+)
+from rflib.rfptrace import PipelineTracer
+
+X10_FRAME = (
+    b'ZIA33{"frame":{"header":{"frameType":"0","dataFlag":"0","rfLevel":"-70",'
+    b'"floorNoise":"-100","rfQuality":"7","protocol":"1","protocolMeaning":"X10",'
+    b'"infoType":"1","frequency":"433920"},'
+    b'"infos":{"subType":"1","subTypeMeaning":"ON","id":"42"}}}\n\r'
+)
+
+
+def test_frame_splitter_chunks():
+    """Frames and terminators split across chunks are reassembled."""
+    splitter = FrameSplitter()
+    frames = [bytes(frame) for frame in splitter.feed(b"ZIA--one\n")]
+    frames += [bytes(frame) for frame in splitter.feed(b"\rZIA--two\n\rZIA")]
+    assert frames == [b"ZIA--one", b"ZIA--two"]
+    assert len(splitter) == 3
+
+
+def test_frame_splitter_consumer_raises():
+    """A frame the consumer failed on is dropped, later frames are kept."""
+    splitter = FrameSplitter()
+    with pytest.raises(ValueError):
+        for frame in splitter.feed(b"BAD\n\rok2\n\rok3"):
+            if bytes(frame) == b"BAD":
+                raise ValueError(frame)
+    frames = [bytes(frame) for frame in splitter.feed(b"\n\r")]
+    assert frames == [b"ok2", b"ok3"]
+    assert len(splitter) == 0
+
+
+def test_frame_splitter_binary_frames():
+    """Length prefixed frames are cut whole, even holding the terminator."""
+    payload = b"\x00\x00\x00\x0a\x0d\x07\x01\x01\n\r"
+    binary = b"ZI\x11" + len(payload).to_bytes(2, "little") + payload
+    stream = b"ZIA--one\n\r" + binary + b"ZIA--two\n\r"
+    splitter = FrameSplitter(binary=True)
+    frames = []
+    for position in range(0, len(stream), 4):
+        frames += [bytes(frame) for frame in splitter.feed(stream[position:position + 4])]
+    assert frames == [b"ZIA--one", binary, b"ZIA--two"]
+    assert len(splitter) == 0
+
+
+def test_repeat_filter_window():
+    """Repeats are suppressed inside the window only."""
+    repeats = RepeatFilter(timedelta(seconds=1))
+    assert not repeats.is_repeat("X10_42", "ON", 10.0)
+    assert not repeats.is_repeat("X10_42cmd", "ON", 10.0)
+    assert repeats.is_repeat("X10_42", "ON", 10.5)
+    assert not repeats.is_repeat("X10_42", "OFF", 10.6)
+    assert not repeats.is_repeat("X10_42", "ON", 11.2)
+    assert repeats.suppressed == 1
+
+
+def test_repeat_filter_disabled_by_zero_window():
+    """A zero window disables the filter."""
+    assert not RepeatFilter(timedelta(0))
+    assert RepeatFilter()
+
+
+def test_ignore_matcher_patterns():
+    """Exact ids, prefixes and other globs all match like fnmatch."""
+    matcher = IgnoreMatcher(["X10_42cmd_cmd", "OREGON_*", "RTS_1?typ_*"])
+    assert matcher.exact == {"X10_42cmd_cmd"}
+    assert matcher.prefixes == ("OREGON_",)
+    assert matcher("X10_42cmd_cmd")
+    assert not matcher("X10_42typ_typ")
+    assert matcher("OREGON_22274temperature_temperature")
+    assert matcher("RTS_12typ_typ")
+    assert not matcher("RTS_123typ_typ")
+    assert not IgnoreMatcher()
+    assert not IgnoreMatcher()("X10_42cmd_cmd")
+
+
+def test_ignore_matcher_decisions_are_bounded():
+    """Memoized decisions never exceed the cache size."""
+    matcher = IgnoreMatcher(["X10_*"], size=2)
+    for event_id in ("X10_1", "X10_2", "RTS_3"):
+        matcher(event_id)
+    assert list(matcher._decisions) == ["X10_2", "RTS_3"]
+    assert matcher("X10_1")
+
+
+def test_ignored_prefix_rejects_frame_before_decoding():
+    """A `prefix*` pattern covering the device drops the raw frame."""
+
+    async def run():
+        events = []
+        protocol = RfplayerProtocol(
+            loop=asyncio.get_running_loop(),
+            event_callback=events.append,
+            ignore=["X10_42*"],
+        )
+        protocol.handle_raw_packet(X10_FRAME.decode().strip())
+        assert protocol.frames_prefiltered == 1
+        assert events == []
+
+        protocol.ignore = ["X10_42cmd*"]
+        protocol.handle_raw_packet(X10_FRAME.decode().strip())
+        assert protocol.frames_prefiltered == 1
+        assert [event["id"] for event in events] == ["X10_42typ_typ"]
+
+    asyncio.run(run())
+
+
+class FakeTransport:
+    """Transport keeping written data."""
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    def is_closing(self):
+        return False
+
+
+def test_write_queue_batches_one_iteration():
+    """Packets queued in one loop iteration go out in batch sized writes."""
+
+    async def run():
+        queue = WriteQueue(asyncio.get_running_loop(), batch_size=16)
+        transport = FakeTransport()
+        queue.put(b"ZIA++A\r")
+        queue.attach(transport)
+        queue.put(b"ZIA++B\r")
+        queue.put(b"ZIA++C\r")
+        assert transport.written == []
+        await asyncio.sleep(0)
+        return queue, transport
+
+    queue, transport = asyncio.run(run())
+    assert transport.written == [b"ZIA++A\rZIA++B\r", b"ZIA++C\r"]
+    assert (queue.writes, queue.packets, queue.max_depth) == (2, 3, 3)
+
+
+def test_write_queue_holds_packets_while_paused():
+    """Nothing is written between pause and resume; clear drops the rest."""
+
+    async def run():
+        queue = WriteQueue(asyncio.get_running_loop())
+        transport = FakeTransport()
+        queue.attach(transport)
+        queue.pause()
+        queue.put(b"ZIA++A\r")
+        await asyncio.sleep(0)
+        assert transport.written == [] and len(queue) == 1
+        queue.resume()
+        await asyncio.sleep(0)
+        assert transport.written == [b"ZIA++A\r"]
+        queue.pause()
+        queue.put(b"ZIA++B\r")
+        queue.clear()
+        return queue
+
+    queue = asyncio.run(run())
+    stats = queue.as_dict()
+    assert (stats["pauses"], stats["dropped"], stats["depth"]) == (2, 1, 0)
+    assert queue.transport is None
+
+
+def connected_protocol(loop, start_commands=()):
+    """Return a protocol connected to a fake transport."""
+    protocol = RfplayerProtocol(
+        loop=loop, init_options={"START_COMMANDS": list(start_commands)}
+    )
+    protocol.connection_made(FakeTransport())
+    return protocol
+
+
+def test_startup_replies_do_not_complete_user_commands():
+    """HELLO and STATUS replies of the setup are not taken for a PING reply."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        protocol = connected_protocol(loop, ["1 FORMAT JSON . RECEIVER + *. STATUS"])
+        ping = loop.create_task(protocol.send_command_ack("", "PING", timeout=1))
+        await asyncio.sleep(0)
+        protocol.handle_raw_packet("ZIA--Welcome to Ziblue Dongle RFPLAYER")
+        protocol.handle_raw_packet("ZIA--Status: format JSON")
+        await asyncio.sleep(0)
+        assert not ping.done()
+        protocol.handle_raw_packet("ZIA--PONG")
+        assert await ping
+        assert protocol.command_stats.acknowledged == 3
+        assert protocol.command_stats.unsolicited == 0
+
+    asyncio.run(run())
+
+
+def test_unsolicited_reply_does_not_shift_matching():
+    """A reply nobody waits for is counted, the next commands still match."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        protocol = connected_protocol(loop)
+        protocol.handle_raw_packet("ZIA--Welcome to Ziblue Dongle RFPLAYER")
+        protocol.handle_raw_packet("ZIA--PONG")
+        assert protocol.command_stats.unsolicited == 1
+        ping = loop.create_task(protocol.send_command_ack("", "PING", timeout=1))
+        await asyncio.sleep(0)
+        protocol.handle_raw_packet("ZIA--PONG")
+        assert await ping
+
+    asyncio.run(run())
+
+
+def test_unknown_reply_does_not_complete_status():
+    """A ZIA-- line that is not STATUS output leaves STATUS in flight."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        protocol = connected_protocol(loop)
+        status = loop.create_task(protocol.send_command_ack("", "STATUS", timeout=1))
+        await asyncio.sleep(0)
+        protocol.handle_raw_packet("ZIA--OK RECEIVER + *")
+        await asyncio.sleep(0)
+        assert not status.done()
+        assert protocol.command_stats.unsolicited == 1
+        protocol.handle_raw_packet('ZIA--{"systemStatus":{"info":[]}}')
+        assert await status
+
+    asyncio.run(run())
+
+
+def tracing_protocol(loop, tracer, events):
+    """Return a connected protocol tracing into tracer."""
+    protocol = RfplayerProtocol(
+        loop=loop,
+        init_options={"START_COMMANDS": []},
+        event_callback=events.append,
+        tracer=tracer,
+    )
+    protocol.connection_made(FakeTransport())
+    return protocol
+
+
+def test_arrival_time_is_kept_per_gateway():
+    """Frames injected without arrival do not use the time of another frame."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        tracer = PipelineTracer(enabled=True)
+        events = []
+        first = tracing_protocol(loop, tracer, events)
+        second = tracing_protocol(loop, tracer, events)
+        first.data_received(X10_FRAME)
+        second.handle_raw_packet(X10_FRAME.decode().strip())
+        assert len(events) == 4
+        assert tracer.histograms["event_callback"].count == 4
+        assert tracer.histograms["end_to_end"].count == 2
+        assert first.arrival == second.arrival == 0
+
+    asyncio.run(run())
+
+
+def test_merged_packet_keeps_first_arrival():
+    """A packet held by the merger is traced from its first copy arrival."""
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        tracer = PipelineTracer(enabled=True)
+        events = []
+        group = ReceiverGroup(loop)
+        group.add("first", tracing_protocol(loop, tracer, events))
+        group.add("second", tracing_protocol(loop, tracer, events))
+        group.receivers["first"].data_received(X10_FRAME)
+        group.receivers["second"].data_received(X10_FRAME)
+        assert not events
+        await asyncio.sleep(0.05)
+        group.merger.flush()
+        assert len(events) == 2
+        end_to_end = tracer.histograms["end_to_end"]
+        assert end_to_end.count == 2
+        assert end_to_end.max >= 50_000_000 * 0.9
+
+    asyncio.run(run())
+
+
+def test_sampling_decided_per_raw_frame(caplog):
+    """Replies and rejected frames do not follow the previous frame."""
+    caplog.set_level(logging.DEBUG, logger="rflib")
+    TRACE.clear()
+    TRACE.sample_every = 2
+    try:
+        protocol = RfplayerProtocol(
+            loop=asyncio.new_event_loop(), init_options={"START_COMMANDS": []}
+        )
+        x10 = X10_FRAME.decode().strip()
+        protocol.handle_raw_packet(x10)
+        assert TRACE.sampled
+        protocol.handle_raw_packet(x10)
+        assert not TRACE.sampled
+        protocol.handle_raw_packet("ZIA--PONG")
+        assert TRACE.sampled
+        protocol.known_devices = KnownDevices(["RTS_1"])
+        protocol.handle_raw_packet(x10)
+        assert not TRACE.sampled
+    finally:
+        protocol.loop.close()
+        TRACE.sample_every = 1
+        TRACE.clear()
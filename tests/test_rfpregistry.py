@@ -0,0 +1,68 @@
+"""Tests of the decoder registry, rflib.rfpregistry."""
+
+from rflib.infotypes import INFOTYPE_DECODERS
+from rflib.protocols import PROTOCOL_SPECS
+from rflib.rfperrors import ERRORS
+from rflib.rfpparser import decode_packet
+from rflib.rfpregistry import DECODERS, DecoderRegistry
+
+X10_FRAME = (
+    'ZIA33{"frame":{"header":{"frameType":"0","dataFlag":"0","rfLevel":"-70",'
+    '"floorNoise":"-100","rfQuality":"7","protocol":"1","protocolMeaning":"X10",'
+    '"infoType":"1","frequency":"433920"},'
+    '"infos":{"subType":"1","subTypeMeaning":"ON","id":"42"}}}'
+)
+
+
+def test_every_protocol_infotype_is_registered():
+    """The default registry holds a decoder per protocol spec and infotype."""
+    for protocol in PROTOCOL_SPECS:
+        for info_type in INFOTYPE_DECODERS:
+            assert (protocol, info_type) in DECODERS
+
+
+def test_lookup_unknown_key():
+    """A key without decoder returns None and is remembered."""
+    registry = DecoderRegistry()
+    ERRORS.clear()
+    assert registry.lookup("FOO", "1") is None
+    assert registry.unknown == {("FOO", "1")}
+    assert ERRORS.as_dict() == {"FOO infoType 1 not implemented": 1}
+
+
+def test_register_and_unregister():
+    """A registered decoder is returned by lookup until unregistered."""
+    registry = DecoderRegistry()
+    registry.lookup("FOO", "1")
+
+    def decoder(message, node):
+        return {"node": node, "protocol": "FOO"}
+
+    registry.register("FOO", "1", decoder)
+    assert registry.lookup("FOO", "1") is decoder
+    assert registry.unknown == set()
+    registry.unregister("FOO", "1")
+    assert ("FOO", "1") not in registry
+
+
+def test_frame_dispatched_to_its_decoder():
+    """decode_packet goes through the registry entry of the frame."""
+    assert decode_packet(X10_FRAME) == [
+        DECODERS.lookup("X10", "1")(
+            {
+                "header": {
+                    "frameType": "0",
+                    "dataFlag": "0",
+                    "rfLevel": "-70",
+                    "floorNoise": "-100",
+                    "rfQuality": "7",
+                    "protocol": "1",
+                    "protocolMeaning": "X10",
+                    "infoType": "1",
+                    "frequency": "433920",
+                },
+                "infos": {"subType": "1", "subTypeMeaning": "ON", "id": "42"},
+            },
+            "gateway",
+        )
+    ]
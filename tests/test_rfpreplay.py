@@ -0,0 +1,80 @@
+"""Tests of replaying captured traffic, rflib.rfpreplay."""
+
+import asyncio
+
+from rflib.rfpcapture import CaptureReader, FrameRecorder
+from rflib.rfpprotocol import RfplayerProtocol
+from rflib.rfpreplay import replay
+
+X10_FRAME = (
+    b'ZIA33{"frame":{"header":{"frameType":"0","dataFlag":"0","rfLevel":"-70",'
+    b'"floorNoise":"-100","rfQuality":"7","protocol":"1","protocolMeaning":"X10",'
+    b'"infoType":"1","frequency":"433920"},'
+    b'"infos":{"subType":"1","subTypeMeaning":"ON","id":"%d"}}}'
+)
+UNKNOWN_FRAME = (
+    b'ZIA33{"frame":{"header":{"protocolMeaning":"UNKNOWN","infoType":"99"},'
+    b'"infos":{}}}'
+)
+
+
+def record_capture(base, frames):
+    """Write (timestamp, frame) records to a capture."""
+    recorder = FrameRecorder(base, block_records=2)
+    for timestamp, frame in frames:
+        recorder.record(frame, timestamp)
+    recorder.close()
+
+
+def replay_capture(base, speed, start=None):
+    """Replay a capture into a new protocol, return statistics and events."""
+    events = []
+
+    async def run():
+        protocol = RfplayerProtocol(
+            loop=asyncio.get_running_loop(), event_callback=events.append
+        )
+        return await replay(protocol, CaptureReader(base), speed, start)
+
+    return asyncio.run(run()), events
+
+
+def test_replay_as_fast_as_possible(tmp_path):
+    """Every captured frame is decoded again, undecodable ones are counted."""
+    base = str(tmp_path / "capture")
+    frames = [(100.0 + number, X10_FRAME % (number + 1)) for number in range(5)]
+    frames.append((105.0, UNKNOWN_FRAME))
+    record_capture(base, frames)
+
+    stats, events = replay_capture(base, speed=0)
+    assert (stats.frames, stats.decoded, stats.dropped) == (6, 5, 1)
+    assert stats.events == len(events) == 10
+    assert stats.captured == 5.0
+    assert stats.elapsed < 5.0
+    assert events[0]["id"] == "X10_1typ_typ"
+    assert stats.as_dict()["stages"]["decode"]["count"] == 6
+
+
+def test_replay_keeps_the_captured_pace(tmp_path):
+    """A scaled replay takes the captured duration divided by speed."""
+    base = str(tmp_path / "capture")
+    record_capture(
+        base, [(10.0 + number / 10, X10_FRAME % (number + 1)) for number in range(3)]
+    )
+
+    stats, events = replay_capture(base, speed=2)
+    assert stats.frames == 3
+    assert 0.09 <= stats.elapsed < 0.5
+    assert len(events) == 6
+
+
+def test_replay_from_start_timestamp(tmp_path):
+    """Blocks ending before start are skipped."""
+    base = str(tmp_path / "capture")
+    record_capture(
+        base, [(float(number), X10_FRAME % (number + 1)) for number in range(6)]
+    )
+
+    stats, events = replay_capture(base, speed=0, start=2.0)
+    assert stats.frames == 4
+    assert events[0]["id"] == "X10_3typ_typ"
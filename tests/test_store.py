@@ -0,0 +1,163 @@
+"""Tests of the device store of the integration, needing Home Assistant."""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from custom_components import rfplayer  # noqa: E402
+from custom_components.rfplayer import store  # noqa: E402
+from custom_components.rfplayer.const import (  # noqa: E402
+    DATA_CAPTURES,
+    DATA_DEVICE_STORE,
+    DEVICES_SAVE_DELAY,
+    DOMAIN,
+    RFPLAYER_PROTOCOL,
+)
+
+DEVICE = {"platform": "switch", "protocol": "X10", "device_id": "42"}
+
+
+class FakeStore:
+    """Storage keeping saved data in memory."""
+
+    def __init__(self, hass, version, key):
+        self.key = key
+        self.data = None
+        self.saves = 0
+        self.delayed = None
+        self.removed = False
+
+    async def async_load(self):
+        return self.data
+
+    async def async_save(self, data):
+        self.data = data
+        self.saves += 1
+
+    def async_delay_save(self, data_func, delay):
+        self.delayed = (data_func, delay)
+
+    async def async_remove(self):
+        self.removed = True
+        self.data = None
+
+
+class FakeConfigEntries:
+    """Config entries recording updates and unloads."""
+
+    def __init__(self):
+        self.updates = []
+
+    def async_update_entry(self, entry, data):
+        self.updates.append(data)
+        entry.data = data
+
+    async def async_unload_platforms(self, entry, platforms):
+        return True
+
+
+@pytest.fixture
+def hass(monkeypatch):
+    """Return a minimal hass with an in-memory storage."""
+    monkeypatch.setattr(store, "Store", FakeStore)
+
+    async def async_add_executor_job(target, *args):
+        return target(*args)
+
+    return SimpleNamespace(
+        data={},
+        config_entries=FakeConfigEntries(),
+        services=SimpleNamespace(async_remove=lambda domain, service: None),
+        async_add_executor_job=async_add_executor_job,
+    )
+
+
+def config_entry(devices=None):
+    """Return a config entry with devices in its data."""
+    data = {"port": "/dev/ttyUSB0"}
+    if devices is not None:
+        data["devices"] = devices
+    return SimpleNamespace(entry_id="abc", data=data)
+
+
+def test_devices_are_moved_from_the_entry(hass):
+    """Devices of an older entry are saved to storage and removed from it."""
+    entry = config_entry({"X10_42": DEVICE})
+    devices = store.RfplayerDeviceStore(hass, entry)
+    asyncio.run(devices.async_load())
+    assert devices.devices == {"X10_42": DEVICE}
+    assert devices._store.key == "rfplayer.abc.devices"
+    assert devices._store.data == {"devices": {"X10_42": DEVICE}}
+    assert hass.config_entries.updates == [{"port": "/dev/ttyUSB0", "devices": {}}]
+
+    again = store.RfplayerDeviceStore(hass, entry)
+    again._store = devices._store
+    asyncio.run(again.async_load())
+    assert again.devices == {"X10_42": DEVICE}
+    assert len(hass.config_entries.updates) == 1
+
+
+def test_changes_are_saved_once_after_the_delay(hass):
+    """A burst of changes schedules a single delayed save."""
+    devices = store.RfplayerDeviceStore(hass, config_entry())
+    asyncio.run(devices.async_load())
+    assert hass.config_entries.updates == []
+    devices.async_add("X10_42", DEVICE)
+    data_func, delay = devices._store.delayed
+    devices._store.delayed = None
+    devices.async_add("X10_43", DEVICE)
+    devices.async_remove("X10_42")
+    devices.async_remove("X10_44")
+    assert devices._store.delayed is None
+    assert delay == DEVICES_SAVE_DELAY
+    assert data_func() == {"devices": {"X10_43": DEVICE}}
+
+    devices.async_add("X10_45", DEVICE)
+    assert devices._store.delayed is not None
+
+
+def test_unload_writes_pending_devices(hass):
+    """Devices not saved yet are written when the entry is unloaded."""
+    entry = config_entry()
+    devices = store.RfplayerDeviceStore(hass, entry)
+    asyncio.run(devices.async_load())
+    saves = devices._store.saves
+    devices.async_add("X10_42", DEVICE)
+    transport = SimpleNamespace(closed=False)
+    transport.close = lambda: setattr(transport, "closed", True)
+    hass.data[DOMAIN] = {
+        RFPLAYER_PROTOCOL: SimpleNamespace(
+            receivers={"usb0": SimpleNamespace(transport=transport)}
+        ),
+        DATA_DEVICE_STORE: devices,
+        DATA_CAPTURES: {},
+    }
+    assert asyncio.run(rfplayer.async_unload_entry(hass, entry))
+    assert transport.closed
+    assert DOMAIN not in hass.data
+    assert devices._store.saves == saves + 1
+    assert devices._store.data == {"devices": {"X10_42": DEVICE}}
+
+    asyncio.run(devices.async_flush())
+    assert devices._store.saves == saves + 1
+
+
+def test_storage_is_removed_with_the_entry(hass):
+    """Deleting the entry removes its storage file."""
+    entry = config_entry()
+    removed = []
+
+    async def async_remove(self):
+        removed.append(self.key)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(FakeStore, "async_remove", async_remove)
+        asyncio.run(rfplayer.async_remove_entry(hass, entry))
+    assert removed == ["rfplayer.abc.devices"]